@@ -1,8 +1,19 @@
 #!/usr/bin/env python
 
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
 from voxlib import __version__ as version, __author__ as author
 
+
+class build_library(build_ext):
+    """
+    'triangleCube.c' is loaded with ctypes, it is a plain shared library without a python module init function
+    """
+
+    def get_export_symbols(self, ext):
+        return ext.export_symbols
+
+
 setup(
     name='voxlib',
     version=version,
@@ -11,4 +22,8 @@ setup(
     author_email='',
     url='',
     packages=find_packages(exclude=('unittest', '__pycache__')),
+    # optional, without a compiler the slower python implementation is used, see 'get_backend'
+    ext_modules=[Extension(
+        'voxlib.voxelintersect.triangleCube', sources=['voxlib/voxelintersect/triangleCube.c'], optional=True)],
+    cmdclass={'build_ext': build_library},
     )
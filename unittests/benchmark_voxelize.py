@@ -0,0 +1,22 @@
+"""
+    Benchmarks for pytest-benchmark, not collected with the unit tests, run them with
+    'python -m pytest benchmark_voxelize.py --benchmark-json=results.json'.
+    'python -m voxlib.benchmark' runs the same cases without pytest.
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from voxlib.benchmark import meshes, engines, get_available_backends, iter_cases  # noqa: E402
+
+cases = list(iter_cases(list(meshes), [32, 128, 512], list(engines), get_available_backends()))
+
+
+@pytest.mark.parametrize('mesh, resolution, engine, backend', cases)
+def test_voxelize(benchmark, mesh, resolution, engine, backend):
+    vertices = meshes[mesh]()
+    function = engines[engine]
+    function(vertices[:1], 8, backend=backend)
+    benchmark.extra_info['triangles'] = len(vertices)
+    positions = benchmark(function, vertices, resolution, backend=backend)
+    benchmark.extra_info['voxels'] = len(positions)
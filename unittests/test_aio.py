@@ -0,0 +1,57 @@
+import unittest
+import asyncio
+import numpy as np
+from voxlib.aio import AsyncVoxelizer, voxelize_async
+from voxlib.voxelize import voxelize
+
+
+class AsyncVoxelizerTest(unittest.TestCase):
+    input_file_paths = [
+        "./input/cube.stl",
+        "./input/cube_diagonals.stl",
+    ]
+
+    def test_voxelize_async(self):
+        file_path = self.input_file_paths[1]
+        positions = asyncio.run(voxelize_async(file_path, 11))
+        self.assertEqual(positions.dtype, np.int32)
+        self.assertEqual(len(positions), len(set(voxelize(file_path, 11, progress_bar=False))))
+        self.assertEqual(set(map(tuple, positions.tolist())), set(voxelize(file_path, 11, progress_bar=False)))
+
+    def test_jobs(self):
+        async def run():
+            async with AsyncVoxelizer(workers=2, max_jobs=1, max_queued=1, max_pending=1, chunk_size=2) as voxelizer:
+                chunks = [chunk async for chunk in voxelizer.iter_chunks(self.input_file_paths[1], 11)]
+                self.assertGreater(len(chunks), 1)
+
+                # one job runs, one waits, a third one does not fit into the queue
+                jobs = [asyncio.ensure_future(voxelizer.voxelize(file_path, 11)) for file_path in self.input_file_paths]
+                await asyncio.sleep(0)
+                with self.assertRaises(asyncio.QueueFull):
+                    await voxelizer.voxelize(self.input_file_paths[0], 11)
+                results = await asyncio.gather(*jobs)
+                self.assertEqual(len(results[0]), 602)
+
+                # a cancelled job gives its slot to the next one
+                started = asyncio.Event()
+
+                async def consume():
+                    async for chunk in voxelizer.iter_chunks(self.input_file_paths[1], 64):
+                        started.set()
+                        await asyncio.sleep(3600)
+
+                job = asyncio.ensure_future(consume())
+                await started.wait()
+                job.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await job
+                filled = await voxelizer.voxelize(self.input_file_paths[0], 11, fill=True)
+                self.assertEqual(len(filled), 11 ** 3)
+            return np.concatenate(chunks)
+
+        positions = asyncio.run(run())
+        self.assertEqual(set(map(tuple, positions.tolist())), set(voxelize(self.input_file_paths[1], 11)))
+
+
+if __name__ == '__main__':
+    unittest.main()
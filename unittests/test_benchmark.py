@@ -0,0 +1,28 @@
+import unittest
+import numpy as np
+from voxlib.benchmark import meshes, run_benchmarks, iter_cases, compare, format_result
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_meshes(self):
+        for name, function in meshes.items():
+            vertices = function()
+            self.assertEqual(vertices.shape[1:], (3, 3), name)
+        self.assertEqual(len(meshes['icosphere']()), 20 * 4 ** 3)
+        self.assertTrue(np.allclose(np.linalg.norm(meshes['icosphere'](), axis=2), 1))
+
+    def test_run(self):
+        cases = list(iter_cases(['huge'], [8, 512], ['array', 'depth_first'], ['python'], python_max_resolution=256))
+        self.assertEqual(len(cases), 2)
+        report = run_benchmarks(cases, repeat=1, isolate=False)
+        self.assertEqual([result['engine'] for result in report['results']], ['array', 'depth_first'])
+        self.assertGreater(report['results'][0]['tests_per_voxel'], 1)
+        self.assertIsNone(report['results'][1]['tests_per_voxel'])
+        ratios = compare(report, report)
+        self.assertEqual([ratio for result, ratio in ratios], [1., 1.])
+        self.assertTrue(format_result(report['results'][0]).strip().startswith('huge'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from unittest import mock
+from voxlib.cache import VoxelCache
+from voxlib.grid import VoxelGrid
+from voxlib.voxelize import voxelize_grid
+
+
+class VoxelCacheTest(unittest.TestCase):
+    file_path = "./input/cube_diagonals.stl"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_voxelize_grid(self):
+        cache = VoxelCache(self.directory)
+        grid = voxelize_grid(self.file_path, 11, cache=cache)
+        self.assertEqual(len(cache.get_entries()), 1)
+        cached_grid = voxelize_grid(self.file_path, 11, cache=cache)
+        self.assertIsInstance(cached_grid.data, np.memmap)
+        self.assertTrue(np.array_equal(cached_grid.data, grid.data))
+        self.assertTrue(np.array_equal(cached_grid.data, voxelize_grid(self.file_path, 11).data))
+        voxelize_grid(self.file_path, 12, cache=cache)
+        voxelize_grid(self.file_path, 11, mode='6-separating', cache=cache)
+        self.assertEqual(len(cache.get_entries()), 3)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+    def test_key(self):
+        key = VoxelCache.get_key(self.file_path, resolution=11)
+        self.assertEqual(VoxelCache.get_key(self.file_path, resolution=11), key)
+        self.assertNotEqual(VoxelCache.get_key(self.file_path, resolution=12), key)
+        self.assertNotEqual(VoxelCache.get_key("./input/cube.stl", resolution=11), key)
+
+    def test_evict(self):
+        cache = VoxelCache(self.directory, max_size=2500)
+        for index in range(4):
+            cache.get_or_create(str(index), lambda file_path: VoxelGrid.create_file(file_path, (10, 10, 80)))
+            os.utime(cache.get_path(str(index)), (index, index))
+        self.assertEqual([key for key, last_use, size in cache.get_entries()], ['2', '3'])
+        self.assertIsNone(cache.get('0'))
+        # reading an entry makes it the most recently used one
+        self.assertIsNotNone(cache.get('2'))
+        cache.get_or_create('4', lambda file_path: VoxelGrid.create_file(file_path, (10, 10, 80)))
+        self.assertEqual(sorted(key for key, last_use, size in cache.get_entries()), ['2', '4'])
+
+    def test_failed_create(self):
+        cache = VoxelCache(self.directory)
+
+        def create(file_path):
+            raise ValueError(file_path)
+        self.assertRaises(ValueError, cache.get_or_create, 'key', create)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_read_only_entry(self):
+        cache = VoxelCache(self.directory)
+        cache.get_or_create('key', lambda file_path: VoxelGrid.create_file(file_path, (10, 10, 10)))
+        # entries of other users cannot be touched, they are still hits
+        with mock.patch('os.utime', side_effect=PermissionError):
+            self.assertIsNotNone(cache.get('key'))
+
+    def test_temporary_files(self):
+        cache = VoxelCache(self.directory)
+        stale_path = os.path.join(self.directory, 'stale' + cache.temporary_suffix)
+        young_path = os.path.join(self.directory, 'young' + cache.temporary_suffix)
+        for file_path in (stale_path, young_path):
+            open(file_path, 'wb').close()
+        os.utime(stale_path, (0, 0))
+        cache.evict()
+        self.assertEqual(os.listdir(self.directory), ['young' + cache.temporary_suffix])
+        cache.remove_temporary_files(max_age=-1)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import io
+import numpy as np
+from voxlib.grid import VoxelGrid, bit_counts, count_bits
+from voxlib.export import write_text, write_npy, write_rle, write_binvox, read_binvox
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.grid = VoxelGrid((7, 9, 12), offset=(-3, -4, -6), packed=True)
+        self.grid.add(np.column_stack([random.randint(0, size, 300) for size in self.grid.shape]))
+
+    def test_positions(self):
+        positions = self.grid.get_positions()
+        file_handler = io.BytesIO()
+        write_npy(positions, file_handler)
+        file_handler.seek(0)
+        array = np.load(file_handler)
+        self.assertEqual(array.dtype, np.dtype('<i4'))
+        self.assertTrue(np.array_equal(array, positions))
+        file_handler = io.BytesIO()
+        write_text(positions, file_handler, chunk_size=50)
+        self.assertTrue(np.array_equal(np.loadtxt(io.BytesIO(file_handler.getvalue()), dtype=int), positions))
+
+    def test_rle(self):
+        file_handler = io.BytesIO()
+        write_rle(self.grid, file_handler)
+        file_handler.seek(0)
+        runs = np.load(file_handler)
+        dense = np.zeros(self.grid.shape, dtype=bool)
+        for x, y, z, length in runs:
+            dense[x, y, z:z + length] = True
+        self.assertTrue(np.array_equal(dense, self.grid.to_dense()))
+
+    def test_binvox(self):
+        file_handler = io.BytesIO()
+        write_binvox(self.grid, file_handler)
+        file_handler.seek(0)
+        dense = read_binvox(file_handler)
+        self.assertEqual(dense.shape, (12, 12, 12))
+        self.assertTrue(np.array_equal(dense[:7, :9, :12], self.grid.to_dense()))
+        self.assertEqual(int(dense.sum()), self.grid.count())
+
+    def test_count(self):
+        self.assertEqual(self.grid.count(), int(self.grid.to_dense().sum()))
+        data = np.arange(256, dtype=np.uint8)
+        self.assertEqual(count_bits(data), 8 * 128)
+        self.assertEqual(int(bit_counts[data].sum()), 8 * 128)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from voxlib.incremental import IncrementalVoxelizer, ReferenceCounts, encode_positions, decode_keys
+from voxlib.mesh import scale_and_shift_vertices
+from voxlib.voxelize import voxelize_array, get_intersecting_voxels_batch, read_vertices
+
+
+class IncrementalVoxelizerTest(unittest.TestCase):
+    file_path = "./input/cube_diagonals.stl"
+
+    def setUp(self):
+        self.vertices = read_vertices(self.file_path)
+        self.voxelizer = IncrementalVoxelizer(self.vertices, 16)
+
+    def get_expected(self, vertices):
+        vertices = scale_and_shift_vertices(vertices, self.voxelizer.scale, self.voxelizer.shift)
+        return get_intersecting_voxels_batch(vertices) - self.voxelizer.center
+
+    def test_initial(self):
+        self.assertTrue(np.array_equal(self.voxelizer.get_positions(), voxelize_array(self.vertices, 16)))
+
+    def test_update(self):
+        before = set(map(tuple, self.voxelizer.get_positions().tolist()))
+        removed = [0, 5, 6]
+        added = self.vertices[removed] + [0.1, 0.2, 0]
+        indexes, appeared, disappeared = self.voxelizer.update(removed=removed, added=added)
+        self.assertTrue(np.array_equal(indexes, [len(self.vertices), len(self.vertices) + 1, len(self.vertices) + 2]))
+        vertices = np.concatenate((np.delete(self.vertices, removed, axis=0), added))
+        after = self.voxelizer.get_positions()
+        self.assertTrue(np.array_equal(after, self.get_expected(vertices)))
+        after = set(map(tuple, after.tolist()))
+        self.assertEqual(set(map(tuple, appeared.tolist())), after - before)
+        self.assertEqual(set(map(tuple, disappeared.tolist())), before - after)
+
+        # moving them back restores the initial voxels
+        appeared, disappeared = self.voxelizer.replace(indexes, self.vertices[removed])
+        self.assertEqual(set(map(tuple, self.voxelizer.get_positions().tolist())), before)
+        self.assertEqual(set(map(tuple, appeared.tolist())), before - after)
+        self.assertRaises(AssertionError, self.voxelizer.update, removed=[0])
+
+    def test_remove_all(self):
+        self.voxelizer.update(removed=np.arange(len(self.vertices)))
+        self.assertEqual(len(self.voxelizer), 0)
+        self.assertEqual(len(self.voxelizer.get_vertices()), 0)
+
+
+class ReferenceCountsTest(unittest.TestCase):
+
+    def test_update(self):
+        random = np.random.RandomState(0)
+        positions = random.randint(-30, 30, (5000, 3))
+        keys = encode_positions(positions)
+        self.assertTrue(np.array_equal(decode_keys(keys), positions))
+        counts = ReferenceCounts(keys[:1000])
+        for start in range(1000, 5000, 500):
+            counts.update(keys[start:start + 500], 1)
+        appeared, disappeared = counts.update(keys[:2500], -1)
+        self.assertEqual(len(appeared), 0)
+        expected = np.unique(keys[2500:])
+        self.assertTrue(np.array_equal(counts.get_keys(), expected))
+        self.assertTrue(np.array_equal(disappeared, np.setdiff1d(np.unique(keys[:2500]), expected)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+from voxlib.common.progressbar import Progress, get_progress
+from voxlib.voxelize import voxelize
+
+
+class ProgressTest(unittest.TestCase):
+    file_path = "./input/cube_diagonals.stl"
+
+    def test_throttle(self):
+        calls = []
+        progress = Progress(lambda iteration, total, prefix='': calls.append((iteration, total)), interval=3600)
+        progress.start(10**6)
+        for done in range(1, 10**6 + 1):
+            if done >= progress.due:
+                progress.update(done)
+        # only the last update is reported within the interval
+        self.assertEqual(calls, [(10**6, 10**6)])
+
+        calls = []
+        progress.interval = 0
+        progress.start(10**6)
+        for done in range(1, 10**6 + 1):
+            if done >= progress.due:
+                progress.update(done)
+        self.assertEqual(len(calls), 1000)
+        self.assertEqual(calls[-1], (10**6, 10**6))
+
+    def test_silent(self):
+        progress = get_progress(False)
+        progress.start(100)
+        self.assertEqual(progress.due, float('inf'))
+        self.assertIs(get_progress(progress), progress)
+
+    def test_voxelize(self):
+        calls = []
+        positions = set(voxelize(self.file_path, 11, progress_bar=lambda *args, **kwargs: calls.append(args)))
+        self.assertEqual(positions, set(voxelize(self.file_path, 11, progress_bar=False)))
+        self.assertEqual(calls[-1][0], calls[-1][1])
+        # finished chunks of worker processes add up to all triangles
+        calls = []
+        list(voxelize(self.file_path, 11, workers=2, progress_bar=Progress(
+            lambda *args, **kwargs: calls.append(args), 0)))
+        self.assertTrue(np.all(np.diff([call[0] for call in calls]) > 0))
+        self.assertEqual(calls[-1][0], calls[-1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from voxlib.sparse import BrickMap
+
+
+class BrickMapTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.positions = np.unique(random.randint(-40, 40, (3000, 3)), axis=0)
+
+    def test_add_contains(self):
+        brick_map = BrickMap(buffer_size=100)
+        brick_map.add(self.positions[:1000])
+        brick_map.add(self.positions[1000:])
+        self.assertEqual(len(brick_map), len(self.positions))
+        self.assertTrue(brick_map.contains(self.positions).all())
+        self.assertFalse(brick_map.contains(self.positions + [0, 0, 100]).any())
+        self.assertTrue(tuple(self.positions[0]) in brick_map)
+        self.assertEqual(set(brick_map), set(map(tuple, self.positions.tolist())))
+
+    def test_runs(self):
+        # queries between additions leave new bricks in runs
+        brick_map = BrickMap(buffer_size=10)
+        for start in range(0, len(self.positions), 50):
+            chunk = self.positions[start:start + 50]
+            self.assertFalse(brick_map.contains(chunk).any())
+            brick_map.add(chunk)
+            self.assertTrue(brick_map.contains(self.positions[:start + 50]).all())
+        self.assertEqual(len(brick_map), len(self.positions))
+        self.assertTrue(np.array_equal(np.unique(brick_map.keys), brick_map.keys))
+        self.assertEqual(set(brick_map), set(map(tuple, self.positions.tolist())))
+
+    def test_union(self):
+        brick_map_a = BrickMap()
+        brick_map_a.add(self.positions[::2])
+        brick_map_b = BrickMap(brick_size=16)
+        brick_map_b.add(self.positions[1::2])
+        brick_map = brick_map_a | brick_map_b
+        self.assertEqual(len(brick_map), len(self.positions))
+        self.assertEqual(len(brick_map_a), len(self.positions[::2]))
+
+    def test_downsample(self):
+        brick_map = BrickMap(brick_size=4)
+        brick_map.add(self.positions)
+        expected = np.unique(self.positions >> 1, axis=0)
+        coarse = brick_map.downsample()
+        self.assertTrue(np.array_equal(np.unique(coarse.get_positions(), axis=0), expected))
+        self.assertEqual(len(coarse.downsample()), len(np.unique(self.positions >> 2, axis=0)))
+
+    def test_dense(self):
+        brick_map = BrickMap()
+        brick_map.add(self.positions)
+        dense, offset = brick_map.to_dense()
+        self.assertEqual(int(dense.sum()), len(self.positions))
+        self.assertTrue(np.array_equal(offset, self.positions.min(axis=0)))
+        brick_map = BrickMap.from_dense(dense, offset, brick_size=4)
+        self.assertTrue(np.array_equal(np.unique(brick_map.get_positions(), axis=0), self.positions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import numpy as np
+from ctypes import byref
+from voxlib.voxelintersect.triangle import Triangle, t_c_intersection, INSIDE, PreparedTriangle
+from voxlib.voxelintersect.triangle import triangle_lib, vertexes_to_c_triangle, vertexes_to_c_prepared_triangle, Point3d
+from voxlib.voxelintersect.batch import t_c_intersection_batch, t_c_intersection_centers, t_c_intersection_cells
+from voxlib.voxelintersect.separating import prepare_triangles, get_overlaps, get_overlaps_c
+
+
+def scalar_intersections(triangles):
+    result = []
+    for vertex_1, vertex_2, vertex_3 in triangles:
+        triangle = Triangle()
+        triangle.set(vertex_1, vertex_2, vertex_3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result.append(t_c_intersection(triangle) == INSIDE)
+    return np.array(result)
+
+
+class BatchIntersectionTest(unittest.TestCase):
+
+    def test_t_c_intersection_batch(self):
+        random = np.random.RandomState(0)
+        for scale in (0.6, 1.0, 2.0, 5.0):
+            triangles = random.uniform(-scale, scale, (2000, 3, 3))
+            # grid aligned vertexes hit the boundary cases of the plane tests
+            triangles[:500] = np.round(triangles[:500] * 2) / 2
+            self.assertTrue(np.array_equal(t_c_intersection_batch(triangles), scalar_intersections(triangles)))
+
+    def test_t_c_intersection_centers(self):
+        random = np.random.RandomState(1)
+        triangle = random.uniform(0, 4, (3, 3))
+        centers = np.argwhere(np.ones((5, 5, 5))) + 0.5
+        mask = t_c_intersection_centers(triangle, centers)
+        self.assertTrue(np.array_equal(mask, scalar_intersections(triangle[None, :, :] - centers[:, None, :])))
+        self.assertTrue(mask.any())
+
+    def test_t_c_intersection_cells(self):
+        random = np.random.RandomState(5)
+        vertices = random.uniform(0, 4, (200, 3, 3))
+        triangle_index = np.repeat(np.arange(len(vertices)), 125)
+        positions = np.tile(np.argwhere(np.ones((5, 5, 5))), (len(vertices), 1))
+        expected = t_c_intersection_batch(vertices[triangle_index] - (positions + 0.5)[:, None, :])
+        self.assertTrue(np.array_equal(t_c_intersection_cells(vertices, triangle_index, positions), expected))
+        # candidates do not need to be sorted by triangle
+        order = random.permutation(len(positions))
+        self.assertTrue(np.array_equal(
+            t_c_intersection_cells(vertices, triangle_index[order], positions[order]), expected[order]))
+
+
+class PreparedTriangleTest(unittest.TestCase):
+
+    def get_cases(self):
+        random = np.random.RandomState(4)
+        triangles = random.uniform(0, 4, (100, 3, 3))
+        centers = np.argwhere(np.ones((6, 6, 6))) - 0.5
+        return triangles, centers
+
+    def test_prepared_triangle(self):
+        triangles, centers = self.get_cases()
+        for triangle in triangles:
+            prepared = PreparedTriangle(*triangle)
+            result = [prepared.t_c_intersection(tuple(center)) == INSIDE for center in centers]
+            expected = scalar_intersections(triangle[None, :, :] - centers[:, None, :])
+            self.assertTrue(np.array_equal(result, expected))
+
+    @unittest.skipIf(triangle_lib is None, "no compiled library")
+    def test_c_prepared_triangle(self):
+        triangles, centers = self.get_cases()
+        for triangle in triangles:
+            prepared = vertexes_to_c_prepared_triangle(*triangle)
+            for center in centers:
+                moved = triangle - center
+                self.assertEqual(
+                    triangle_lib.t_c_intersection_prepared(byref(prepared), Point3d(*center)),
+                    triangle_lib.t_c_intersection(vertexes_to_c_triangle(*moved)))
+
+
+class SeparatingTest(unittest.TestCase):
+
+    def get_candidates(self, triangles):
+        lower = np.floor(triangles.min(axis=1)).astype(np.int64)
+        triangle_index = np.repeat(np.arange(len(triangles)), 27)
+        offsets = np.tile(np.argwhere(np.ones((3, 3, 3))), (len(triangles), 1))
+        return triangle_index, lower[triangle_index] + offsets
+
+    def test_overlaps(self):
+        random = np.random.RandomState(2)
+        triangles = random.uniform(0, 2.9, (500, 3, 3))
+        triangle_index, positions = self.get_candidates(triangles)
+        conservative = t_c_intersection_batch(triangles[triangle_index] - (positions + 0.5)[:, None, :])
+        separating_26 = get_overlaps(prepare_triangles(triangles), triangle_index, positions)
+        separating_6 = get_overlaps(prepare_triangles(triangles, '6-separating'), triangle_index, positions)
+        self.assertTrue(np.array_equal(separating_26, conservative))
+        self.assertTrue(np.all(separating_26[separating_6]))
+        self.assertLess(separating_6.sum(), separating_26.sum())
+
+    @unittest.skipIf(triangle_lib is None, "no compiled library")
+    def test_overlaps_c(self):
+        random = np.random.RandomState(4)
+        triangles = random.uniform(0, 2.9, (500, 3, 3))
+        # vertexes on voxel faces and edges
+        triangles[:250] = np.round(triangles[:250] * 4) / 4
+        triangle_index, positions = self.get_candidates(triangles)
+        for mode in ('26-separating', '6-separating'):
+            expected = get_overlaps(prepare_triangles(triangles, mode), triangle_index, positions)
+            self.assertTrue(np.array_equal(get_overlaps_c(triangles, triangle_index, positions, mode), expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,20 @@
 import unittest
 import os
-from voxlib.voxelize import voxelize, get_intersecting_voxels_depth_first, scale_and_shift_triangle
+import subprocess
+import sys
+from importlib.util import find_spec
+import tempfile
+import numpy as np
+from voxlib.mesh import stl_record_type, get_scale_and_shift, scale_and_shift_vertices
+from voxlib.grid import VoxelGrid
+from voxlib.voxelize import voxelize, voxelize_array, voxelize_grid, voxelize_stl, voxelize_file, voxelize_lod
+from voxlib.voxelize import voxelize_chunks
+from voxlib.voxelize import read_vertices, BoundaryBox
+from voxlib.stats import VoxelizeStats
+from voxlib.voxelize import get_intersecting_voxels_depth_first, get_intersecting_voxels_batch
+from voxlib.voxelize import get_intersecting_voxels_depth_first_batch, classify_triangles, voxelization_modes
+from voxlib.voxelize import voxelization_methods
+from voxlib.voxelintersect.triangle import triangle_lib
 
 
 class PerimeterTest(unittest.TestCase):
@@ -36,11 +50,268 @@ class PerimeterTest(unittest.TestCase):
         print(len(voxels))
         self.assertEqual(len(voxels), 730)
 
+    def test_voxelize_array(self):
+        expected_counts = [[602], [874, 890], [730]]
+        for file_path, counts in zip(self.input_file_paths, expected_counts):
+            voxels = voxelize_array(read_vertices(file_path), 11)
+            self.assertEqual(voxels.shape[1], 3)
+            self.assertTrue(len(voxels) in counts, file_path)
+            self.assertEqual(len(set(map(tuple, voxels.tolist()))), len(voxels))
+
+    def test_voxelize_sweep(self):
+        expected_counts = [[602], [874, 890], [730]]
+        for file_path, counts in zip(self.input_file_paths, expected_counts):
+            vertices = read_vertices(file_path)
+            positions = set(map(tuple, voxelize_array(vertices, 11).tolist()))
+            self.assertEqual(set(map(tuple, voxelize_array(vertices, 11, method='sweep').tolist())), positions)
+            self.assertTrue(len(set(voxelize(file_path, 11, method='sweep'))) in counts, file_path)
+        # triangles of all sizes in general position
+        random = np.random.RandomState(0)
+        for scale in (1.0, 4.0, 30.0):
+            vertices = random.uniform(0, scale, (50, 3, 3))
+            self.assertTrue(np.array_equal(
+                get_intersecting_voxels_batch(vertices, method='sweep'), get_intersecting_voxels_batch(vertices)))
+
+    def test_methods(self):
+        file_path = self.input_file_paths[2]
+        vertices = read_vertices(file_path)
+        positions = set(voxelize(file_path, 11))
+        # every entry point accepts the same methods
+        for method in voxelization_methods:
+            self.assertEqual(set(voxelize(file_path, 11, method=method)), positions, method)
+            self.assertEqual(set(map(tuple, voxelize_array(vertices, 11, method=method).tolist())), positions, method)
+            self.assertEqual(
+                voxelize_array(vertices, 11, output='packed', workers=2, method=method).count(), len(positions), method)
+
+    def test_modes(self):
+        file_path = self.input_file_paths[2]
+        vertices = read_vertices(file_path)
+        counts = []
+        for mode in voxelization_modes:
+            positions = set(voxelize(file_path, 11, mode=mode))
+            self.assertEqual(set(map(tuple, voxelize_array(vertices, 11, mode=mode).tolist())), positions)
+            counts.append(len(positions))
+        self.assertEqual(counts, [730, 593, 421])
+
+    def test_classify_triangles(self):
+        random = np.random.RandomState(0)
+        vertices = random.uniform(0, 0.5, (300, 3, 3)) + random.randint(0, 8, (300, 1, 3))
+        vertices[100:200, :, 0] *= 4
+        vertices[200:] *= 4
+        single, thin, general = classify_triangles(vertices)
+        self.assertEqual(len(single) + len(thin) + len(general), len(vertices))
+        self.assertTrue(set(range(100)) <= set(single.tolist()))
+        expected = set()
+        for vertex_1, vertex_2, vertex_3 in vertices:
+            expected.update(get_intersecting_voxels_depth_first(vertex_1, vertex_2, vertex_3))
+        self.assertEqual(set(map(tuple, get_intersecting_voxels_depth_first_batch(vertices).tolist())), expected)
+
+    @unittest.skipIf(find_spec('numba') is None, "numba is not installed")
+    def test_numba_backend(self):
+        expected_counts = [[602], [874], [730]]
+        for file_path, counts in zip(self.input_file_paths, expected_counts):
+            vertices = read_vertices(file_path)
+            positions = set(voxelize(file_path, 11, backend='numba'))
+            self.assertTrue(len(positions) in counts, file_path)
+            self.assertEqual(set(map(tuple, voxelize_array(vertices, 11, backend='numba').tolist())), positions)
+        if triangle_lib is None:
+            return
+        # same results as the library
+        random = np.random.RandomState(1)
+        vertices = random.uniform(0, 6, (300, 3, 3))
+        vertices[:100] = np.round(vertices[:100] * 2) / 2
+        self.assertTrue(np.array_equal(
+            get_intersecting_voxels_depth_first_batch(vertices, backend='numba'),
+            get_intersecting_voxels_depth_first_batch(vertices, backend='c')))
+        self.assertTrue(np.array_equal(
+            get_intersecting_voxels_batch(vertices, backend='numba'),
+            get_intersecting_voxels_batch(vertices, backend='c')))
+
+    @unittest.skipIf(find_spec('numba') is None, "numba is not installed")
+    def test_numba_backend_workers(self):
+        # worker processes started after the numba threads must not keep the interpreter from exiting
+        script = (
+            "from voxlib.voxelize import voxelize_array, read_vertices\n"
+            "if __name__ == '__main__':\n"
+            "    vertices = read_vertices({!r})\n"
+            "    voxelize_array(vertices, 11, backend='numba')\n"
+            "    voxelize_array(vertices, 11, workers=2)\n").format(self.input_file_paths[1])
+        with tempfile.TemporaryDirectory() as directory:
+            script_path = os.path.join(directory, 'numba_workers.py')
+            with open(script_path, 'w') as file_handler:
+                file_handler.write(script)
+            environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            subprocess.run([sys.executable, script_path], env=environment, timeout=120, check=True)
+
+    def test_voxelize_grid(self):
+        file_path = self.input_file_paths[1]
+        positions = set(map(tuple, voxelize_array(read_vertices(file_path), 11).tolist()))
+        for packed in (False, True):
+            grid = voxelize_grid(file_path, 11, packed=packed)
+            self.assertEqual(grid.count(), len(positions))
+            self.assertEqual(set(map(tuple, grid.get_positions().tolist())), positions)
+            self.assertTrue(grid.contains(grid.get_indices()).all())
+
+    def test_grid_file(self):
+        file_path = self.input_file_paths[0]
+        grid = voxelize_grid(file_path, 11)
+        output_path = tempfile.mktemp(suffix='.grid')
+        try:
+            voxelize_grid(file_path, 11, output_path=output_path)
+            grid_file = VoxelGrid.load(output_path)
+            self.assertTrue(np.array_equal(grid_file.data, grid.data))
+            self.assertTrue(np.array_equal(grid_file.offset, grid.offset))
+            self.assertEqual(grid_file.resolution, 11)
+            self.assertEqual(grid_file.scale, grid.scale)
+            del grid_file
+        finally:
+            os.remove(output_path)
+
+    def test_voxelize_sparse(self):
+        file_path = self.input_file_paths[2]
+        positions = set(voxelize(file_path, 11))
+        self.assertEqual(set(voxelize(file_path, 11, sparse=True)), positions)
+        brick_map = voxelize_array(read_vertices(file_path), 11, output='sparse')
+        self.assertEqual(set(brick_map), positions)
+
+    def test_voxelize_stl(self):
+        vertices = read_vertices(self.input_file_paths[1])
+        records = np.zeros(len(vertices), dtype=stl_record_type)
+        records['vertices'] = vertices
+        file_descriptor, file_path = tempfile.mkstemp(suffix='.stl')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file_handler:
+                file_handler.write(b'\0' * 80)
+                file_handler.write(np.uint32(len(records)).tobytes())
+                file_handler.write(records.tobytes())
+            grid = voxelize_grid(file_path, 11)
+            positions = voxelize_stl(file_path, 11, output='positions', chunk_size=5)
+        finally:
+            os.remove(file_path)
+        self.assertTrue(np.array_equal(positions, voxelize_array(vertices, 11)))
+        self.assertTrue(np.array_equal(grid.get_positions(), positions))
+
+    def test_random_mesh(self):
+        # vertex 0 of the cube fixtures is at the minimum of the mesh, random triangles are not
+        vertices = np.random.RandomState(2).uniform(-5, 5, (40, 3, 3))
+        file_descriptor, file_path = tempfile.mkstemp(suffix='.stl')
+        try:
+            with os.fdopen(file_descriptor, 'w') as file_handler:
+                file_handler.write("solid random\n")
+                for triangle in vertices:
+                    file_handler.write("facet normal 0 0 0\nouter loop\n")
+                    for vertex in triangle:
+                        file_handler.write("vertex {!r} {!r} {!r}\n".format(*vertex.tolist()))
+                    file_handler.write("endloop\nendfacet\n")
+                file_handler.write("endsolid random\n")
+            positions = set(voxelize(file_path, 32))
+            file_positions = voxelize_file(file_path, 32)
+        finally:
+            os.remove(file_path)
+        self.assertEqual(set(map(tuple, file_positions.tolist())), positions)
+        self.assertEqual(set(map(tuple, voxelize_array(vertices, 32).tolist())), positions)
+
+    def test_voxelize_lod(self):
+        file_path = self.input_file_paths[1]
+        vertices = read_vertices(file_path)
+        levels = voxelize_lod(file_path, (8, 16, 32))
+        self.assertEqual(set(levels[32]), set(map(tuple, voxelize_array(vertices, 32).tolist())))
+        exact_levels = voxelize_lod(file_path, (8, 32), exact=True)
+        self.assertEqual(sorted(exact_levels), [8, 32])
+        # the coarse levels are the voxels of the mesh scaled to a quarter of the finest level
+        scale, shift, triangle_count = get_scale_and_shift(vertices, 32)
+        vertices = scale_and_shift_vertices(vertices, scale / 4, shift)
+        bounding_box = BoundaryBox()
+        bounding_box.from_vertex_array(vertices)
+        positions = get_intersecting_voxels_batch(vertices) - bounding_box.get_center()
+        self.assertEqual(set(exact_levels[8]), set(map(tuple, positions.tolist())))
+        self.assertEqual(set(levels[8]), set(exact_levels[8]))
+
+    def test_fill(self):
+        file_path = self.input_file_paths[0]
+        self.assertEqual(len(set(voxelize(file_path, 11, fill=True))), 11 ** 3)
+        vertices = read_vertices(file_path)
+        for fill in ('parity', 'winding'):
+            self.assertEqual(voxelize_array(vertices, 11, output='packed', fill=fill).count(), 11 ** 3)
+
+    def test_fill_holes(self):
+        vertices = read_vertices(self.input_file_paths[0])
+        cube = set(map(tuple, voxelize_array(vertices, 21, fill='parity').tolist()))
+        self.assertEqual(len(cube), 21 ** 3)
+        surface = set(map(tuple, voxelize_array(vertices, 21).tolist()))
+        for index in range(len(vertices)):
+            holed = np.delete(vertices, index, axis=0)
+            hole = surface - set(map(tuple, voxelize_array(holed, 21).tolist()))
+            # only the voxels of the missing triangle are left out
+            filled = set(map(tuple, voxelize_array(holed, 21, fill='winding').tolist()))
+            self.assertTrue(cube - hole <= filled <= cube)
+        # rays along z leak through the missing triangle of the face at z = 0
+        self.assertEqual(voxelize_array(holed, 21, output='packed', fill='parity').count(), 5138)
+        self.assertEqual(voxelize_array(holed, 21, output='packed', fill='winding').count(), 21 ** 3)
+
+    def test_workers(self):
+        file_path = self.input_file_paths[1]
+        self.assertEqual(set(voxelize(file_path, 11, workers=2)), set(voxelize(file_path, 11)))
+        vertices = read_vertices(file_path)
+        self.assertTrue((voxelize_array(vertices, 11, workers=3) == voxelize_array(vertices, 11)).all())
+        for output in ('grid', 'packed'):
+            grid = voxelize_array(vertices, 11, output=output, workers=3)
+            self.assertTrue((grid.data == voxelize_array(vertices, 11, output=output).data).all())
+        # workers write into shared memory, which stays mapped as long as the data is used
+        data = voxelize_array(vertices, 11, output='packed', workers=3).data[1:]
+        self.assertTrue((data == voxelize_array(vertices, 11, output='packed').data[1:]).all())
+
+    def test_voxelize_chunks(self):
+        file_path = self.input_file_paths[1]
+        positions = set(map(tuple, voxelize_array(read_vertices(file_path), 11).tolist()))
+        for options in ({}, {'sparse': True}, {'workers': 2}, {'method': 'sweep'}):
+            chunks = list(voxelize_chunks(file_path, 11, chunk_size=5, **options))
+            self.assertGreater(len(chunks), 1)
+            self.assertTrue(all(chunk.dtype == np.int32 and chunk.shape[1] == 3 for chunk in chunks))
+            # every voxel once
+            voxels = np.concatenate(chunks)
+            self.assertEqual(len(voxels), len(positions))
+            self.assertEqual(set(map(tuple, voxels.tolist())), positions)
+        voxels = np.concatenate(list(voxelize_chunks(self.input_file_paths[0], 11, fill=True)))
+        self.assertEqual(len(voxels), 11 ** 3)
+
+    def test_stats(self):
+        file_path = self.input_file_paths[1]
+        stats = VoxelizeStats()
+        voxels = set(voxelize(file_path, 11, backend='python', stats=stats))
+        self.assertEqual(voxels, set(voxelize(file_path, 11, backend='python')))
+        self.assertGreaterEqual(stats.counts['hits'], len(voxels))
+        self.assertGreater(stats.counts['candidates'], stats.counts['hits'])
+        self.assertGreater(stats.counts['expansions'], 0)
+        self.assertEqual(stats.counts['fallbacks'], stats.counts['candidates'])
+        self.assertGreater(stats.seconds['intersect'], 0)
+
+        # counters of worker processes are added up
+        vertices = read_vertices(file_path)
+        stats = VoxelizeStats()
+        voxelize_array(vertices, 11, stats=stats)
+        worker_stats = VoxelizeStats()
+        voxelize_array(vertices, 11, workers=2, stats=worker_stats)
+        self.assertEqual(worker_stats.counts, stats.counts)
+        self.assertIn('candidates', stats.format())
+
+    def test_scale_and_shift(self):
+        vertices = np.array([[[0, 5, 1], [2, -1, 3], [1, 1, -4]], [[-2, 0, 0], [0, 9, 0], [0, 0, 1]]], dtype=np.float64)
+        scale, shift, triangle_count = get_scale_and_shift(vertices, 11)
+        self.assertEqual(triangle_count, 2)
+        self.assertTrue(np.array_equal(shift, [2, 1, 4]))
+        self.assertEqual(scale, 1.)
+        scaled = scale_and_shift_vertices(vertices, scale, shift)
+        self.assertTrue(np.array_equal(scaled.min(axis=(0, 1)), [0, 0, 0]))
+        self.assertEqual(vertices[0, 0, 0], 0)
+        self.assertIs(scale_and_shift_vertices(scaled, scale, -shift, copy=False), scaled)
+        self.assertTrue(np.array_equal(scaled, vertices))
+
     def test_get_intersecting_voxels_depth_first(self):
         scale = 0.2171953325381205
         shift = [103.419, 65.4, 68.2169]
         triangle = ((-39.3653, 8.43406, 86.9206), (-66.9773, -5.08748, 86.9206), (-39.3653, -8.43406, 86.9206))
-        (vertex_1, vertex_2, vertex_3) = scale_and_shift_triangle(triangle, scale, shift)
+        (vertex_1, vertex_2, vertex_3) = scale_and_shift_vertices(np.array([triangle]), scale, shift)[0]
         new_set = get_intersecting_voxels_depth_first(vertex_1, vertex_2, vertex_3)
         center = (
             int((vertex_1[0] + vertex_2[0] + vertex_3[0]) / 3.),
@@ -0,0 +1,177 @@
+import asyncio
+import collections
+import numpy as np
+
+from .common.progressbar import get_progress
+from .parallel import get_executor, get_worker_count
+from .voxelintersect.triangle import get_backend
+from .voxelize import VoxelChunkFilter, read_scaled_mesh, get_chunk_function, get_filled_positions, merge_positions
+
+"""
+    Voxelization for asyncio code, the event loop is never blocked by reading or voxelizing a mesh.
+"""
+
+
+class AsyncVoxelizer(object):
+    """
+    Voxelize mesh files in a pool of worker processes shared by all jobs.
+    At most 'max_jobs' jobs run at once, up to 'max_queued' more wait for a free slot.
+    The triangles of a job are submitted 'chunk_size' at a time, and only while fewer than 'max_pending' of its
+    chunks are waiting for the caller, so a slow caller holds back the workers instead of piling up voxels.
+    Cancelling a job or leaving its iteration cancels the chunks not started yet,
+    the workers stop after the chunks they are working on.
+
+        async with AsyncVoxelizer(workers=4) as voxelizer:
+            async for positions in voxelizer.iter_chunks(file_path, 256):
+                ...
+
+    @type workers: int
+    @type max_jobs: int
+    @type max_queued: int | None
+    @type max_pending: int
+    @type chunk_size: int
+    """
+
+    def __init__(self, workers=None, max_jobs=None, max_queued=None, max_pending=None, chunk_size=2**12):
+        """
+        @param workers: number of processes, 0 or None for all cores
+        @type workers: int | None
+        @param max_jobs: jobs voxelized at once, by default one per worker
+        @type max_jobs: int | None
+        @param max_queued: jobs waiting for a free slot, more raise asyncio.QueueFull, None for no limit
+        @type max_queued: int | None
+        @param max_pending: chunks of a job voxelized ahead of the caller, by default two per worker
+        @type max_pending: int | None
+        @param chunk_size: number of triangles voxelized at a time
+        @type chunk_size: int
+        """
+        self.workers = get_worker_count(workers)
+        self.max_jobs = max_jobs or self.workers
+        self.max_queued = max_queued
+        self.max_pending = max_pending or 2 * self.workers
+        self.chunk_size = chunk_size
+        self._executor = get_executor(self.workers)
+        # created in the event loop of the first job
+        self._slots = None
+        self._queued = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Shut the worker processes down once their current chunks are done
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _acquire(self):
+        """
+        Wait for a free job slot
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_jobs)
+        if self._slots.locked() and self.max_queued is not None and self._queued >= self.max_queued:
+            raise asyncio.QueueFull("{} jobs are waiting already".format(self._queued))
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+    async def iter_chunks(
+            self, file_path, resolution, sparse=False, fill=False, method='depth_first', mode='conservative',
+            backend=None, progress_bar=False):
+        """
+        Voxel positions of a mesh file, chunk by chunk as workers finish them, see 'voxelize_chunks'.
+        Leave the iteration early with 'contextlib.aclosing' to free the job slot right away.
+
+        @type file_path: str
+        @type resolution: int
+        @param sparse: remember voxels in a BrickMap instead of a bit packed grid, see 'VoxelChunkFilter'
+        @type sparse: bool
+        @param fill: also yield voxels inside the mesh, see 'voxelize'
+        @type fill: bool | str
+        @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+        @type method: str
+        @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+        @type mode: str
+        @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+        @type backend: str | None
+        @param progress_bar: False for no progress, None for a progress bar on stderr, see 'voxelize'
+        @type progress_bar: Progress | callable | bool | None
+
+        @return: voxel positions of shape (K, 3), every voxel once
+        @rtype: collections.AsyncIterable[numpy.ndarray]
+        """
+        function = get_chunk_function(method, mode, get_backend(backend))
+        progress = get_progress(progress_bar, prefix="Voxelize: ")
+        loop = asyncio.get_running_loop()
+        await self._acquire()
+        pending = collections.deque()
+        try:
+            vertices, bounding_box = await loop.run_in_executor(
+                self._executor, read_scaled_mesh, file_path, resolution)
+            progress.start(len(vertices))
+            chunk_filter = None if fill else VoxelChunkFilter(bounding_box, sparse)
+            surface = []
+            submitted = 0
+            while pending or submitted < len(vertices):
+                while len(pending) < self.max_pending and submitted < len(vertices):
+                    chunk = vertices[submitted:submitted + self.chunk_size]
+                    pending.append((len(chunk), loop.run_in_executor(self._executor, function, chunk)))
+                    submitted += len(chunk)
+                triangle_count, future = pending.popleft()
+                positions = await future
+                progress.add(triangle_count)
+                if fill:
+                    surface.append(positions)
+                    continue
+                positions = chunk_filter.filter(positions)
+                if len(positions):
+                    yield positions
+            if fill:
+                positions = await loop.run_in_executor(
+                    self._executor, get_filled_positions, merge_positions(surface), vertices, bounding_box, fill)
+                center = np.array(bounding_box.get_center())
+                for start in range(0, len(positions), 2**20):
+                    yield (positions[start:start + 2**20] - center).astype(np.int32)
+        finally:
+            for triangle_count, future in pending:
+                future.cancel()
+            self._slots.release()
+
+    async def voxelize(self, file_path, resolution, **options):
+        """
+        All voxel positions of a mesh file, see 'iter_chunks' for the options
+
+        @type file_path: str
+        @type resolution: int
+
+        @return: voxel positions of shape (K, 3)
+        @rtype: numpy.ndarray
+        """
+        chunks = [chunk async for chunk in self.iter_chunks(file_path, resolution, **options)]
+        if not chunks:
+            return np.empty((0, 3), dtype=np.int32)
+        return np.concatenate(chunks)
+
+
+async def voxelize_async(file_path, resolution, voxelizer=None, **options):
+    """
+    All voxel positions of a mesh file, computed in worker processes, see 'AsyncVoxelizer.iter_chunks' for the options
+
+    @type file_path: str
+    @type resolution: int
+    @param voxelizer: pool of worker processes, by default one with a single worker is started for this call
+    @type voxelizer: AsyncVoxelizer | None
+
+    @return: voxel positions of shape (K, 3)
+    @rtype: numpy.ndarray
+    """
+    if voxelizer is not None:
+        return await voxelizer.voxelize(file_path, resolution, **options)
+    async with AsyncVoxelizer(workers=1) as voxelizer:
+        return await voxelizer.voxelize(file_path, resolution, **options)
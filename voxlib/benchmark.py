@@ -0,0 +1,323 @@
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import numpy as np
+from importlib.util import find_spec
+
+from . import __version__
+from .mesh import get_scale_and_shift, scale_and_shift_vertices
+from .voxelintersect.triangle import triangle_lib
+from .voxelize import voxelize_array, get_intersecting_voxels_depth_first_batch, iter_candidate_voxels
+from .parallel import get_executor
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+"""
+    Throughput of the voxelization engines on procedurally generated meshes.
+    Run 'python -m voxlib.benchmark --help', results can be written as JSON and compared against a baseline.
+"""
+
+
+def get_icosphere(subdivisions=3):
+    """
+    Sphere of 20 * 4^subdivisions triangles of about equal size
+
+    @type subdivisions: int
+    @rtype: numpy.ndarray
+    """
+    t = (1 + 5 ** .5) / 2
+    points = np.array([
+        (-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t),
+        (0, -1, -t), (0, 1, -t), (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)], dtype=np.float64)
+    faces = np.array([
+        (0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4), (11, 10, 2), (10, 7, 6),
+        (7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9), (4, 9, 5), (2, 4, 11), (6, 2, 10),
+        (8, 6, 7), (9, 8, 1)])
+    vertices = points[faces]
+    for _ in range(subdivisions):
+        a, b, c = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+        ab, bc, ca = (a + b) / 2, (b + c) / 2, (c + a) / 2
+        vertices = np.concatenate([
+            np.stack(triangle, axis=1) for triangle in ((a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca))])
+    return vertices / np.linalg.norm(vertices, axis=2, keepdims=True)
+
+
+def get_triangle_soup(count=20000, size=.05, seed=0):
+    """
+    Randomly placed and oriented triangles in a unit cube
+
+    @type count: int
+    @param size: largest distance of a vertex from the first one
+    @type size: float
+    @type seed: int
+    @rtype: numpy.ndarray
+    """
+    random = np.random.RandomState(seed)
+    return random.uniform(0, 1, (count, 1, 3)) + random.uniform(-size, size, (count, 3, 3))
+
+
+def get_slivers(count=2000, seed=0):
+    """
+    Long and very thin triangles crossing a unit cube
+
+    @type count: int
+    @type seed: int
+    @rtype: numpy.ndarray
+    """
+    random = np.random.RandomState(seed)
+    start = random.uniform(0, 1, (count, 3))
+    end = random.uniform(0, 1, (count, 3))
+    third = start + (end - start) * random.uniform(0, 1, (count, 1)) + random.uniform(-1e-3, 1e-3, (count, 3))
+    return np.stack((start, end, third), axis=1)
+
+
+def get_huge_triangles():
+    """
+    Two triangles spanning the diagonals of a unit cube
+
+    @rtype: numpy.ndarray
+    """
+    return np.array([
+        [(0, 0, 0), (1, 1, 0), (1, 1, 1)],
+        [(1, 0, 0), (0, 1, 1), (0, 0, 1)]], dtype=np.float64)
+
+
+meshes = {
+    'icosphere': get_icosphere,
+    'soup': get_triangle_soup,
+    'slivers': get_slivers,
+    'huge': get_huge_triangles,
+    }
+
+
+def voxelize_depth_first(vertices, resolution, backend=None):
+    """
+    Flood fill of each triangle, like 'voxelize' in a single process
+
+    @type vertices: numpy.ndarray
+    @type resolution: int
+    @type backend: str | None
+    @rtype: numpy.ndarray
+    """
+    scale, shift, triangle_count = get_scale_and_shift(vertices, resolution)
+    return get_intersecting_voxels_depth_first_batch(scale_and_shift_vertices(vertices, scale, shift), backend=backend)
+
+
+engines = {
+    'depth_first': voxelize_depth_first,
+    'array': voxelize_array,
+    'sweep': lambda vertices, resolution, backend=None: voxelize_array(
+        vertices, resolution, method='sweep', backend=backend),
+    }
+
+
+def get_available_backends():
+    """
+    @rtype: list[str]
+    """
+    available = ['python']
+    if triangle_lib is not None:
+        available.insert(0, 'c')
+    if find_spec('numba') is not None:
+        available.append('numba')
+    return available
+
+
+def get_peak_memory():
+    """
+    Largest resident set size of this process so far in MB
+
+    @rtype: float | None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 2.**20 if sys.platform == 'darwin' else peak / 2.**10
+
+
+def count_candidates(vertices, resolution):
+    """
+    Number of voxels tested by the array engine
+
+    @type vertices: numpy.ndarray
+    @type resolution: int
+    @rtype: int
+    """
+    scale, shift, triangle_count = get_scale_and_shift(vertices, resolution)
+    vertices = scale_and_shift_vertices(vertices, scale, shift)
+    return sum(len(triangle_index) for triangle_index, positions in iter_candidate_voxels(vertices))
+
+
+def run_case(mesh, resolution, engine, backend, repeat=3):
+    """
+    Time one engine on one mesh, the best of 'repeat' runs
+
+    @type mesh: str
+    @type resolution: int
+    @type engine: str
+    @type backend: str
+    @type repeat: int
+
+    @rtype: dict
+    """
+    vertices = meshes[mesh]()
+    function = engines[engine]
+    # compiles numba kernels and loads the library before timing
+    function(vertices[:1], 8, backend=backend)
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        positions = function(vertices, resolution, backend=backend)
+        seconds = min(seconds, time.perf_counter() - start)
+    voxel_count = len(positions)
+    tests_per_voxel = None
+    if engine == 'array' and voxel_count:
+        tests_per_voxel = count_candidates(vertices, resolution) / float(voxel_count)
+    return {
+        'mesh': mesh,
+        'triangles': len(vertices),
+        'resolution': resolution,
+        'engine': engine,
+        'backend': backend,
+        'seconds': seconds,
+        'voxels': voxel_count,
+        'triangles_per_second': len(vertices) / seconds,
+        'voxels_per_second': voxel_count / seconds,
+        'tests_per_voxel': tests_per_voxel,
+        'peak_memory_mb': get_peak_memory(),
+        }
+
+
+def iter_cases(mesh_names, resolutions, engine_names, backend_names, python_max_resolution=256):
+    """
+    Cases of a benchmark run, the pure python test is slow and skipped above 'python_max_resolution'
+
+    @type mesh_names: list[str]
+    @type resolutions: list[int]
+    @type engine_names: list[str]
+    @type backend_names: list[str]
+    @type python_max_resolution: int | None
+
+    @rtype: collections.Iterable[(str, int, str, str)]
+    """
+    for mesh, resolution, engine, backend in itertools.product(mesh_names, resolutions, engine_names, backend_names):
+        if backend == 'python' and python_max_resolution and resolution > python_max_resolution:
+            continue
+        yield mesh, resolution, engine, backend
+
+
+def run_benchmarks(cases, repeat=3, isolate=True, log=None):
+    """
+    Run benchmark cases.
+    Isolated cases run in a fresh process each, so the peak memory is that of the case alone.
+
+    @type cases: collections.Iterable[(str, int, str, str)]
+    @type repeat: int
+    @type isolate: bool
+    @param log: called with the result of every case
+    @type log: callable | None
+
+    @rtype: dict
+    """
+    results = []
+    for mesh, resolution, engine, backend in cases:
+        if isolate:
+            with get_executor(1) as executor:
+                result = executor.submit(run_case, mesh, resolution, engine, backend, repeat).result()
+        else:
+            result = run_case(mesh, resolution, engine, backend, repeat)
+        results.append(result)
+        if log:
+            log(result)
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+        }
+
+
+def compare(report, baseline):
+    """
+    Time of each case relative to the same case of a baseline report
+
+    @type report: dict
+    @type baseline: dict
+
+    @return: case and ratio of seconds, above 1 is slower than the baseline
+    @rtype: list[(dict, float)]
+    """
+    def get_case(result):
+        return result['mesh'], result['triangles'], result['resolution'], result['engine'], result['backend']
+
+    baseline_seconds = {get_case(result): result['seconds'] for result in baseline['results']}
+    ratios = []
+    for result in report['results']:
+        if get_case(result) in baseline_seconds:
+            ratios.append((result, result['seconds'] / baseline_seconds[get_case(result)]))
+    return ratios
+
+
+def format_result(result):
+    """
+    @type result: dict
+    @rtype: str
+    """
+    tests_per_voxel = '-' if result['tests_per_voxel'] is None else '{:.2f}'.format(result['tests_per_voxel'])
+    peak_memory = '-' if result['peak_memory_mb'] is None else '{:.0f}'.format(result['peak_memory_mb'])
+    return "{mesh:>10} {resolution:>5} {engine:>12} {backend:>7} {seconds:>9.3f} {triangles_per_second:>12.0f} " \
+           "{voxels_per_second:>12.0f} {tests:>6} {memory:>6}".format(tests=tests_per_voxel, memory=peak_memory, **result)
+
+
+def main(argv=None):
+    """
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(description='voxelization benchmark on generated meshes')
+    parser.add_argument('--meshes', nargs='+', default=list(meshes), choices=list(meshes))
+    parser.add_argument('--resolutions', nargs='+', type=int, default=[32, 128, 512])
+    parser.add_argument('--engines', nargs='+', default=list(engines), choices=list(engines))
+    parser.add_argument('--backends', nargs='+', default=get_available_backends(), choices=['c', 'numba', 'python'])
+    parser.add_argument('--repeat', type=int, default=3, help='best of this many runs')
+    parser.add_argument(
+        '--python-max-resolution', type=int, default=256, help='skip the python backend above, 0 for no limit')
+    parser.add_argument('--in-process', action='store_true', help='run all cases in this process, memory is cumulative')
+    parser.add_argument('-o', '--output', default=None, help='write the results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument(
+        '--max-ratio', type=float, default=None, help='exit with an error if a case is slower than the baseline by more')
+    args = parser.parse_args(argv)
+
+    print("{:>10} {:>5} {:>12} {:>7} {:>9} {:>12} {:>12} {:>6} {:>6}".format(
+        'mesh', 'res', 'engine', 'backend', 'seconds', 'triangles/s', 'voxels/s', 'tests', 'MB'))
+    cases = iter_cases(args.meshes, args.resolutions, args.engines, args.backends, args.python_max_resolution)
+    report = run_benchmarks(cases, args.repeat, not args.in_process, log=lambda result: print(format_result(result)))
+    if args.output:
+        with open(args.output, 'w') as file_handler:
+            json.dump(report, file_handler, indent=1)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file_handler:
+        ratios = compare(report, json.load(file_handler))
+    failed = False
+    for result, ratio in ratios:
+        is_slower = args.max_ratio is not None and ratio > args.max_ratio
+        failed |= is_slower
+        print("{:>10} {:>5} {:>12} {:>7} {:>8.2f}x{}".format(
+            result['mesh'], result['resolution'], result['engine'], result['backend'], ratio,
+            ' slower' if is_slower else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
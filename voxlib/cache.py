@@ -0,0 +1,193 @@
+import os
+import time
+import hashlib
+import tempfile
+
+from . import __version__
+from .grid import VoxelGrid
+
+
+class VoxelCache(object):
+    """
+    On-disk cache of voxel grid files.
+    Entries are addressed by a hash of the mesh file content, the voxelization parameters and the library version,
+    so a changed mesh or a new version never returns a stale grid.
+    Entries are written to a temporary file and renamed, several processes can share a cache directory.
+    The least recently used entries are removed once the cache grows larger than 'max_size' bytes.
+    Temporary files older than 'temporary_age' seconds were left by processes that died while creating an entry,
+    they are removed as well.
+
+    @type directory: str
+    @type max_size: int
+    """
+
+    suffix = '.grid'
+    temporary_suffix = '.tmp'
+    temporary_age = 24 * 60 * 60
+
+    def __init__(self, directory, max_size=2**30):
+        """
+        @param directory: cache directory, created if missing
+        @type directory: str
+        @param max_size: total size of all entries in bytes
+        @type max_size: int
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(file_path, **parameters):
+        """
+        Hash of the content of a mesh file, the parameters and the library version
+
+        @type file_path: str
+        @param parameters: voxelization parameters, for example resolution and mode
+        @type parameters: any
+
+        @rtype: str
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file_handler:
+            for block in iter(lambda: file_handler.read(2**20), b''):
+                digest.update(block)
+        digest.update(repr(sorted(parameters.items()) + [('version', __version__)]).encode())
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        """
+        @type key: str
+        @rtype: str
+        """
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """
+        Memory mapped grid of an entry, nothing is read until voxels are accessed
+
+        @type key: str
+        @return: the grid, None if there is no entry
+        @rtype: VoxelGrid | None
+        """
+        file_path = self.get_path(key)
+        try:
+            grid = VoxelGrid.load(file_path)
+        except (IOError, OSError):
+            # missing, or removed by another process in the meantime
+            return None
+        try:
+            # the modification time orders entries for eviction
+            os.utime(file_path)
+        except OSError:
+            # entries of other users can be read, but not touched
+            pass
+        return grid
+
+    def get_or_create(self, key, create):
+        """
+        Grid of an entry, created first if there is none
+
+        @type key: str
+        @param create: function writing the grid file to the path it is given, see 'voxelize_grid'
+        @type create: callable
+
+        @rtype: VoxelGrid
+        """
+        grid = self.get(key)
+        if grid is not None:
+            return grid
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix=self.temporary_suffix, dir=self.directory)
+        os.close(file_descriptor)
+        # temporary files are private, entries are read by other processes sharing the cache
+        os.chmod(temporary_path, 0o644)
+        try:
+            create(temporary_path)
+            # mapped before the rename, the mapping stays valid if another process evicts the entry
+            grid = VoxelGrid.load(temporary_path)
+            os.replace(temporary_path, self.get_path(key))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self.evict(keep=key)
+        return grid
+
+    def get_entries(self):
+        """
+        Entries with their last use and size, least recently used first
+
+        @rtype: list[(str, float, int)]
+        """
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except OSError:
+                continue
+            entries.append((file_name[:-len(self.suffix)], stat.st_mtime, stat.st_size))
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def remove_temporary_files(self, max_age=None):
+        """
+        Remove temporary files left by processes that died while creating an entry.
+        Younger files may belong to a process still creating an entry.
+
+        @param max_age: age in seconds, default is 'temporary_age'
+        @type max_age: float | None
+        """
+        if max_age is None:
+            max_age = self.temporary_age
+        now = time.time()
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(self.temporary_suffix):
+                continue
+            file_path = os.path.join(self.directory, file_name)
+            try:
+                if now - os.stat(file_path).st_mtime > max_age:
+                    os.remove(file_path)
+            except OSError:
+                continue
+
+    def get_size(self):
+        """
+        Total size of all entries in bytes
+
+        @rtype: int
+        """
+        return sum(size for key, last_use, size in self.get_entries())
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits into 'max_size'
+
+        @param keep: entry never removed, for example the one just created
+        @type keep: str | None
+        """
+        self.remove_temporary_files()
+        entries = self.get_entries()
+        total_size = sum(size for key, last_use, size in entries)
+        for key, last_use, size in entries:
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.get_path(key))
+            except OSError:
+                continue
+            total_size -= size
+
+    def clear(self):
+        """
+        Remove all entries and stale temporary files
+        """
+        self.remove_temporary_files()
+        for key, last_use, size in self.get_entries():
+            try:
+                os.remove(self.get_path(key))
+            except OSError:
+                pass
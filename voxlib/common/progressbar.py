@@ -1,6 +1,8 @@
 # Print iterations progress
 # https://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
 import sys
+import threading
+import time
 
 
 def print_progress_bar(iteration, total, prefix='', suffix='', decimals=1, length=20, fill='='):
@@ -22,3 +24,89 @@ def print_progress_bar(iteration, total, prefix='', suffix='', decimals=1, lengt
     # Print New Line on Complete
     if iteration == total: 
         sys.stderr.write('\n')
+
+
+class Progress(object):
+    """
+    Throttled progress of a known number of items.
+    The callback is called like 'print_progress_bar', at most every 'interval' seconds and once all items are done.
+    Callers compare their count with 'due' and only call 'update' once it is reached,
+    so counting an item costs an integer comparison, and nothing at all if there is no callback.
+    Worker processes never call the callback: the process owning the Progress adds their finished items with 'add',
+    which may be called from several threads.
+
+    @type due: int | float
+    """
+
+    def __init__(self, callback=print_progress_bar, interval=.1, prefix=''):
+        """
+        @param callback: called with (iteration, total, prefix=prefix), None to be silent
+        @type callback: callable | None
+        @param interval: seconds between two calls of the callback
+        @type interval: float
+        @type prefix: str
+        """
+        self.callback = callback
+        self.interval = interval
+        self.prefix = prefix
+        self.total = 0
+        self.done = 0
+        self.due = float('inf')
+        self._step = 1
+        self._last_report = 0.
+        self._lock = threading.Lock()
+
+    def start(self, total):
+        """
+        @param total: number of items
+        @type total: int
+        """
+        self.total = total
+        self.done = 0
+        # about a thousand checks of the clock at most
+        self._step = max(1, total // 1000)
+        self._last_report = time.monotonic()
+        self.due = self._step if self.callback is not None and total > 0 else float('inf')
+
+    def update(self, done):
+        """
+        Report the number of finished items if 'interval' has passed since the last report, or all are done
+
+        @type done: int
+        """
+        self.done = done
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if done >= self.total or now - self._last_report >= self.interval:
+            self._last_report = now
+            self.callback(done, self.total, prefix=self.prefix)
+        self.due = min(done + self._step, self.total) if done < self.total else float('inf')
+
+    def add(self, count):
+        """
+        Add finished items, for example those of a worker process
+
+        @type count: int
+        """
+        with self._lock:
+            self.update(self.done + count)
+
+
+def get_progress(progress_bar=None, prefix=''):
+    """
+    Progress of a 'progress_bar' argument
+
+    @param progress_bar: None for 'print_progress_bar', False to be silent, a callback or a Progress
+    @type progress_bar: Progress | callable | bool | None
+    @type prefix: str
+
+    @rtype: Progress
+    """
+    if isinstance(progress_bar, Progress):
+        return progress_bar
+    if progress_bar is None:
+        return Progress(print_progress_bar, prefix=prefix)
+    if progress_bar is False:
+        return Progress(None, prefix=prefix)
+    return Progress(progress_bar, prefix=prefix)
@@ -0,0 +1,200 @@
+import numpy as np
+
+from .grid import grid_header_type, grid_file_magic, grid_file_version
+
+
+def write_text(positions, file_handler, chunk_size=2**16):
+    """
+    Tab separated voxel positions, one voxel per line
+
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+    @param file_handler: binary file handler
+    @type file_handler: io.BufferedWriter
+    @type chunk_size: int
+    """
+    for start in range(0, len(positions), chunk_size):
+        chunk = positions[start:start + chunk_size].tolist()
+        file_handler.write("".join("{}\t{}\t{}\n".format(x, y, z) for x, y, z in chunk).encode())
+
+
+def write_npy(positions, file_handler):
+    """
+    Voxel positions as little-endian int32 array of shape (K, 3) in numpy '.npy' format
+
+    @type positions: numpy.ndarray
+    @type file_handler: io.BufferedWriter
+    """
+    np.save(file_handler, np.ascontiguousarray(positions, dtype='<i4'), allow_pickle=False)
+
+
+def write_grid(grid, file_handler):
+    """
+    Bit packed dense grid in the file format of 'VoxelGrid.create_file'
+
+    @type grid: VoxelGrid
+    @type file_handler: io.BufferedWriter
+    """
+    header = np.zeros(1, dtype=grid_header_type)
+    header['magic'] = grid_file_magic
+    header['version'] = grid_file_version
+    header['packed'] = True
+    header['shape'] = grid.shape
+    header['offset'] = grid.offset
+    header['scale'] = np.nan if grid.scale is None else grid.scale
+    header['shift'] = np.nan if grid.shift is None else grid.shift
+    header['resolution'] = -1 if grid.resolution is None else grid.resolution
+    file_handler.write(header.tobytes())
+    for x in range(grid.shape[0]):
+        if grid.packed:
+            file_handler.write(np.ascontiguousarray(grid.data[x]).tobytes())
+        else:
+            file_handler.write(np.packbits(grid.data[x], axis=1).tobytes())
+
+
+def get_runs(grid):
+    """
+    Runs of occupied voxels along the z axis
+
+    @type grid: VoxelGrid
+
+    @return: array of shape (M, 4) with x, y, first z and length of each run
+    @rtype: numpy.ndarray
+    """
+    runs = []
+    for x in range(grid.shape[0]):
+        if grid.packed:
+            slab = np.unpackbits(grid.data[x], axis=1, count=grid.shape[2])
+        else:
+            slab = np.asarray(grid.data[x], dtype=np.uint8)
+        padded = np.zeros((slab.shape[0], slab.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = slab
+        change = np.diff(padded, axis=1)
+        starts = np.argwhere(change == 1)
+        stops = np.argwhere(change == -1)
+        run = np.empty((len(starts), 4), dtype=np.int64)
+        run[:, 0] = x
+        run[:, 1] = starts[:, 0]
+        run[:, 2] = starts[:, 1]
+        run[:, 3] = stops[:, 1] - starts[:, 1]
+        runs.append(run)
+    if not runs:
+        return np.empty((0, 4), dtype=np.int64)
+    return np.concatenate(runs)
+
+
+def write_rle(grid, file_handler):
+    """
+    Run-length encoded z columns as little-endian int32 array of shape (M, 4) in numpy '.npy' format.
+    Each row holds x, y, first z and length of a run of occupied voxels, in grid indices.
+
+    @type grid: VoxelGrid
+    @type file_handler: io.BufferedWriter
+    """
+    np.save(file_handler, get_runs(grid).astype('<i4'), allow_pickle=False)
+
+
+def write_binvox(grid, file_handler):
+    """
+    BINVOX format, see 'https://www.patrickmin.com/binvox/binvox.html'.
+    The grid is padded to a cube, voxels are stored as run-length encoded (value, count) byte pairs,
+    with the x index changing slowest and the y index fastest.
+
+    @type grid: VoxelGrid
+    @type file_handler: io.BufferedWriter
+    """
+    dimension = max(grid.shape)
+    translate = [0.0, 0.0, 0.0]
+    scale = float(dimension)
+    if grid.scale is not None and grid.shift is not None:
+        # the mesh is shifted to the origin before scaling, so grid index 0 starts at the mesh minimum
+        translate = -grid.shift
+        scale = dimension / grid.scale
+    file_handler.write("#binvox 1\ndim {0} {0} {0}\n".format(dimension).encode())
+    file_handler.write("translate {} {} {}\n".format(*[float(value) for value in translate]).encode())
+    file_handler.write("scale {}\ndata\n".format(scale).encode())
+
+    values = []
+    counts = []
+    for x in range(dimension):
+        if x < grid.shape[0]:
+            if grid.packed:
+                slab = np.unpackbits(grid.data[x], axis=1, count=grid.shape[2])
+            else:
+                slab = np.asarray(grid.data[x], dtype=np.uint8)
+            column = np.zeros((dimension, dimension), dtype=np.uint8)
+            column[:grid.shape[2], :grid.shape[1]] = slab.T
+            column = column.ravel()
+        else:
+            column = np.zeros(dimension * dimension, dtype=np.uint8)
+        change = np.flatnonzero(np.diff(column)) + 1
+        starts = np.concatenate(([0], change))
+        lengths = np.diff(np.concatenate((starts, [len(column)])))
+        values.append(column[starts])
+        counts.append(lengths)
+    values = np.concatenate(values)
+    counts = np.concatenate(counts)
+    # merge runs across slab borders, then split runs longer than 255
+    merge = np.concatenate(([True], values[1:] != values[:-1]))
+    group = np.cumsum(merge) - 1
+    values = values[merge]
+    counts = np.bincount(group, weights=counts).astype(np.int64)
+    pieces = -(-counts // 255)
+    values = np.repeat(values, pieces)
+    split_counts = np.full(len(values), 255, dtype=np.int64)
+    last = np.cumsum(pieces) - 1
+    split_counts[last] = counts - (pieces - 1) * 255
+    pairs = np.empty((len(values), 2), dtype=np.uint8)
+    pairs[:, 0] = values
+    pairs[:, 1] = split_counts
+    file_handler.write(pairs.tobytes())
+
+
+def read_binvox(file_handler):
+    """
+    Read a BINVOX file as written by 'write_binvox'
+
+    @type file_handler: io.BufferedReader
+
+    @return: boolean array indexed [x, y, z]
+    @rtype: numpy.ndarray
+    """
+    line = file_handler.readline().strip()
+    assert line.startswith(b'#binvox'), "Not a binvox file"
+    dimensions = None
+    while True:
+        line = file_handler.readline().strip()
+        if line.startswith(b'dim'):
+            dimensions = [int(value) for value in line.split()[1:]]
+        elif line == b'data':
+            break
+    pairs = np.frombuffer(file_handler.read(), dtype=np.uint8).reshape(-1, 2)
+    voxels = np.repeat(pairs[:, 0], pairs[:, 1]).astype(bool)
+    # stored as [x, z, y]
+    return voxels.reshape(dimensions[0], dimensions[2], dimensions[1]).transpose(0, 2, 1)
+
+
+def write_voxels(file_handler, file_format, positions=None, grid=None):
+    """
+    Write voxels in one of the export formats
+
+    @type file_handler: io.BufferedWriter
+    @param file_format: 'txt', 'npy', 'grid', 'rle' or 'binvox'
+    @type file_format: str
+    @param positions: voxel positions, required for 'txt' and 'npy'
+    @type positions: numpy.ndarray | None
+    @param grid: voxel grid, required for 'grid', 'rle' and 'binvox'
+    @type grid: VoxelGrid | None
+    """
+    if file_format == 'txt':
+        write_text(positions, file_handler)
+    elif file_format == 'npy':
+        write_npy(positions, file_handler)
+    elif file_format == 'grid':
+        write_grid(grid, file_handler)
+    elif file_format == 'rle':
+        write_rle(grid, file_handler)
+    elif file_format == 'binvox':
+        write_binvox(grid, file_handler)
+    else:
+        raise ValueError("Unknown format: {}".format(file_format))
@@ -0,0 +1,212 @@
+import numpy as np
+
+# rays are cast slightly off the voxel centers, so they do not run exactly through
+# the edges and vertexes of meshes aligned to the grid
+ray_offset = (1.1e-4 * np.sqrt(2), 1.3e-4 * np.sqrt(3))
+
+
+# the rule of 'get_interior'
+fill_rules = ('parity', 'winding')
+
+
+def iter_ray_hits(vertices, minimum, shape, max_candidates=2**20, axis=2):
+    """
+    Intersect rays along an axis through the voxel columns of a grid with triangles.
+    Columns are indexed by the two axes following the ray axis, x and y for rays along z,
+    y and z for rays along x, z and x for rays along y.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param minimum: voxel position of grid index (0, 0, 0)
+    @type minimum: numpy.ndarray
+    @param shape: grid shape
+    @type shape: (int, int, int)
+    @type max_candidates: int
+    @param axis: axis of the rays
+    @type axis: int
+
+    @return: grid indexes of the column, first grid index along the ray above the hit and
+        orientation (+1 or -1) of each hit
+    @rtype: collections.Iterable[(numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)]
+    """
+    # a cyclic permutation of the axes keeps the orientation of the triangles
+    order = [(axis + 1) % 3, (axis + 2) % 3, axis]
+    vertices = vertices[:, :, order]
+    minimum = np.asarray(minimum)[order]
+    shape = [shape[index] for index in order]
+    a, b, c = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+    # twice the signed area of the triangle projected onto the xy plane
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    is_valid = area != 0
+    # columns with a ray inside the projected bounding box, ray of column i runs at i + 0.5 + offset
+    lower = np.ceil(vertices[:, :, :2].min(axis=1) - 0.5 - ray_offset).astype(np.int64)
+    upper = np.floor(vertices[:, :, :2].max(axis=1) - 0.5 - ray_offset).astype(np.int64)
+    lower = np.maximum(lower, minimum[:2])
+    upper = np.minimum(upper, minimum[:2] + np.array(shape[:2]) - 1)
+    extent = np.maximum(upper - lower + 1, 0)
+    extent[~is_valid] = 0
+    counts = extent.prod(axis=1)
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    for start in range(0, total, max_candidates):
+        candidates = np.arange(start, min(start + max_candidates, total), dtype=np.int64)
+        index = np.searchsorted(ends, candidates, side='right')
+        offset = candidates - (ends[index] - counts[index])
+        column_x = lower[index, 0] + offset // extent[index, 1]
+        column_y = lower[index, 1] + offset % extent[index, 1]
+        point_x = column_x + 0.5 + ray_offset[0]
+        point_y = column_y + 0.5 + ray_offset[1]
+
+        vertex_a, vertex_b, vertex_c = a[index], b[index], c[index]
+        weight_a = (vertex_c[:, 0] - vertex_b[:, 0]) * (point_y - vertex_b[:, 1]) - \
+            (vertex_c[:, 1] - vertex_b[:, 1]) * (point_x - vertex_b[:, 0])
+        weight_b = (vertex_a[:, 0] - vertex_c[:, 0]) * (point_y - vertex_c[:, 1]) - \
+            (vertex_a[:, 1] - vertex_c[:, 1]) * (point_x - vertex_c[:, 0])
+        weight_c = (vertex_b[:, 0] - vertex_a[:, 0]) * (point_y - vertex_a[:, 1]) - \
+            (vertex_b[:, 1] - vertex_a[:, 1]) * (point_x - vertex_a[:, 0])
+        is_hit = ((weight_a > 0) & (weight_b > 0) & (weight_c > 0)) | \
+            ((weight_a < 0) & (weight_b < 0) & (weight_c < 0))
+        if not is_hit.any():
+            continue
+        triangle_area = area[index][is_hit]
+        hit_z = (
+            weight_a[is_hit] * vertex_a[is_hit, 2] +
+            weight_b[is_hit] * vertex_b[is_hit, 2] +
+            weight_c[is_hit] * vertex_c[is_hit, 2]) / triangle_area
+        first_z = np.ceil(hit_z - 0.5).astype(np.int64) - minimum[2]
+        yield (
+            column_x[is_hit] - minimum[0],
+            column_y[is_hit] - minimum[1],
+            np.clip(first_z, 0, shape[2]),
+            np.sign(triangle_area).astype(np.int32))
+
+
+def _sort_hits(hits, slab_index, slab_count, orientation=None):
+    """
+    Hits in the order of their slab along the x axis
+
+    @type hits: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    @param slab_index: grid index x of each hit
+    @type slab_index: numpy.ndarray
+    @type slab_count: int
+    @param orientation: replaces the orientation of the hits
+    @type orientation: numpy.ndarray | None
+
+    @return: sorted hits and the end of the hits of each slab
+    @rtype: (list[numpy.ndarray], numpy.ndarray)
+    """
+    if orientation is not None:
+        hits = hits[:3] + (orientation, )
+    order = np.argsort(slab_index, kind='stable')
+    return [values[order] for values in hits], np.searchsorted(slab_index[order], np.arange(slab_count), side='right')
+
+
+def _get_slab_winding(column, first, orientation, size, length):
+    """
+    Winding number of the voxels of a slab crossed by the rays lying in it
+
+    @param column: column of each hit within the slab
+    @type column: numpy.ndarray
+    @param first: first grid index along the ray above each hit
+    @type first: numpy.ndarray
+    @type orientation: numpy.ndarray
+    @param size: number of columns
+    @type size: int
+    @param length: number of voxels along the rays
+    @type length: int
+
+    @return: winding number of shape (size, length)
+    @rtype: numpy.ndarray
+    """
+    crossings = np.zeros((size, length + 1), dtype=np.int32)
+    np.add.at(crossings, (column, first), orientation)
+    return np.cumsum(crossings[:, :-1], axis=1)
+
+
+def get_interior(hits, shape, rule='parity'):
+    """
+    Voxels inside a mesh, slab by slab along the x axis.
+    With 'parity' a voxel is inside if its center lies behind an odd number of crossings along z,
+    which needs a watertight mesh.
+    With 'winding' the signed crossings give a winding number along each axis, a voxel is inside if it is non zero
+    along at least two axes. A hole or an overlapping part of the mesh only misleads the rays along one axis.
+
+    @param hits: ray hits along the x, y and z axis, see 'iter_ray_hits', 'parity' only needs those along z
+    @type hits: list[(numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray) | None]
+    @type shape: (int, int, int)
+    @param rule: 'parity' for watertight meshes, 'winding' for meshes with small holes or overlapping parts
+    @type rule: str
+
+    @return: grid index x and boolean mask of shape (Y, Z) of each slab with interior voxels
+    @rtype: collections.Iterable[(int, numpy.ndarray)]
+    """
+    assert rule in fill_rules, "Unknown fill rule: {}".format(rule)
+    # rays along z and y lie in a slab, rays along x cross all slabs
+    hits_z, ends_z = _sort_hits(
+        hits[2], hits[2][0], shape[0], np.ones_like(hits[2][3]) if rule == 'parity' else None)
+    if rule == 'parity':
+        slab_start = 0
+        for x in range(shape[0]):
+            selected = slice(slab_start, ends_z[x])
+            slab_start = ends_z[x]
+            if selected.stop == selected.start:
+                continue
+            winding = _get_slab_winding(
+                hits_z[1][selected], hits_z[2][selected], hits_z[3][selected], shape[1], shape[2])
+            yield x, (winding & 1) == 1
+        return
+
+    hits_y, ends_y = _sort_hits(hits[1], hits[1][1], shape[0])
+    hits_x, ends_x = _sort_hits(hits[0], hits[0][2], shape[0])
+    winding_x = np.zeros(shape[1:], dtype=np.int32)
+    start_z = start_y = start_x = 0
+    for x in range(shape[0]):
+        selected_z = slice(start_z, ends_z[x])
+        selected_y = slice(start_y, ends_y[x])
+        selected_x = slice(start_x, ends_x[x])
+        start_z, start_y, start_x = ends_z[x], ends_y[x], ends_x[x]
+        # crossings along x below this slab accumulate
+        np.add.at(winding_x, (hits_x[0][selected_x], hits_x[1][selected_x]), hits_x[3][selected_x])
+        votes = (winding_x != 0).astype(np.int8)
+        votes += _get_slab_winding(
+            hits_z[1][selected_z], hits_z[2][selected_z], hits_z[3][selected_z], shape[1], shape[2]) != 0
+        votes += (_get_slab_winding(
+            hits_y[0][selected_y], hits_y[2][selected_y], hits_y[3][selected_y], shape[2], shape[1]) != 0).T
+        inside = votes >= 2
+        if inside.any():
+            yield x, inside
+
+
+def fill_grid(grid, vertex_chunks, minimum, rule='parity'):
+    """
+    Mark all voxels inside a closed mesh as occupied, the surface is expected to be in the grid already.
+    Rays through the voxel centers are intersected with the triangles, along z for 'parity',
+    along all three axes for 'winding', see 'get_interior'.
+
+    @type grid: VoxelGrid
+    @param vertex_chunks: arrays of shape (N, 3, 3), already scaled and shifted
+    @type vertex_chunks: collections.Iterable[numpy.ndarray]
+    @param minimum: voxel position of grid index (0, 0, 0)
+    @type minimum: numpy.ndarray
+    @param rule: 'parity' or 'winding', see 'get_interior'
+    @type rule: str
+    """
+    assert rule in fill_rules, "Unknown fill rule: {}".format(rule)
+    axes = (2, ) if rule == 'parity' else (0, 1, 2)
+    hits = [None, None, None]
+    for axis in axes:
+        # an empty first chunk keeps the types of axes without hits
+        hits[axis] = [[np.empty(0, dtype=np.int64)] * 3 + [np.empty(0, dtype=np.int32)]]
+    for vertices in vertex_chunks:
+        for axis in axes:
+            for chunk in iter_ray_hits(vertices, minimum, grid.shape, axis=axis):
+                hits[axis].append(chunk)
+    if all(len(hits[axis]) == 1 for axis in axes):
+        return
+    for axis in axes:
+        hits[axis] = tuple(np.concatenate(values) for values in zip(*hits[axis]))
+    for x, inside in get_interior(hits, grid.shape, rule):
+        if grid.packed:
+            grid.data[x] |= np.packbits(inside, axis=1)
+        else:
+            grid.data[x] |= inside
@@ -0,0 +1,244 @@
+import numpy as np
+
+# header of a grid file, the grid data follows directly after it
+grid_file_magic = b'VOXGRID'
+grid_file_version = 1
+grid_header_type = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('packed', '<u4'),
+    ('shape', '<i8', (3, )),
+    ('offset', '<i8', (3, )),
+    ('scale', '<f8'),
+    ('shift', '<f8', (3, )),
+    ('resolution', '<i8'),
+    ('reserved', 'u1', (24, )),
+    ])
+
+# number of set bits of each byte value
+bit_counts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def count_bits(data):
+    """
+    Number of set bits of bytes, without unpacking them
+
+    @type data: numpy.ndarray
+    @rtype: int
+    """
+    if hasattr(np, 'bitwise_count'):
+        # numpy 2.0 and later
+        return int(np.bitwise_count(data).sum(dtype=np.int64))
+    return int(bit_counts[data].sum(dtype=np.int64))
+
+
+class VoxelGrid(object):
+    """
+    Dense occupancy grid of voxels.
+    If packed, eight voxels along the z axis share one byte (see numpy.packbits).
+    Scale, shift and resolution, if known, map grid positions back to mesh coordinates.
+
+    @type shape: (int, int, int)
+    @type offset: numpy.ndarray
+    @type packed: bool
+    @type data: numpy.ndarray
+    @type scale: float | None
+    @type shift: numpy.ndarray | None
+    @type resolution: int | None
+    """
+
+    def __init__(self, shape, offset=(0, 0, 0), packed=False, data=None, scale=None, shift=None, resolution=None):
+        """
+        @param shape: number of voxels along each axis
+        @type shape: (int, int, int)
+        @param offset: position of the voxel at grid index (0, 0, 0)
+        @type offset: (int, int, int) | numpy.ndarray
+        @type packed: bool
+        @param data: existing buffer to use, for example a numpy.memmap
+        @type data: numpy.ndarray | None
+        @type scale: float | None
+        @type shift: numpy.ndarray | list[float] | None
+        @type resolution: int | None
+        """
+        self.shape = tuple(int(value) for value in shape)
+        self.offset = np.array(offset, dtype=np.int64)
+        self.packed = packed
+        self.scale = scale
+        self.shift = None if shift is None else np.array(shift, dtype=np.float64)
+        self.resolution = resolution
+        if data is None:
+            if packed:
+                data = np.zeros(self.get_data_shape(self.shape, packed), dtype=np.uint8)
+            else:
+                data = np.zeros(self.shape, dtype=bool)
+        assert data.shape == self.get_data_shape(self.shape, packed), "Buffer does not match grid shape"
+        self.data = data
+
+    @staticmethod
+    def get_data_shape(shape, packed):
+        """
+        Shape of the underlying buffer
+
+        @type shape: (int, int, int)
+        @type packed: bool
+        @rtype: (int, int, int)
+        """
+        if packed:
+            return shape[0], shape[1], (shape[2] + 7) // 8
+        return tuple(shape)
+
+    def add(self, indices):
+        """
+        Mark voxels as occupied
+
+        @param indices: grid indices of shape (K, 3)
+        @type indices: numpy.ndarray
+        """
+        if len(indices) == 0:
+            return
+        x, y, z = indices[:, 0], indices[:, 1], indices[:, 2]
+        if self.packed:
+            np.bitwise_or.at(self.data, (x, y, z >> 3), (0x80 >> (z & 7)).astype(np.uint8))
+        else:
+            self.data[x, y, z] = True
+
+    def add_positions(self, positions):
+        """
+        Mark voxels as occupied
+
+        @param positions: voxel positions of shape (K, 3)
+        @type positions: numpy.ndarray
+        """
+        self.add(positions - self.offset)
+
+    def contains(self, indices):
+        """
+        @param indices: grid indices of shape (K, 3)
+        @type indices: numpy.ndarray
+
+        @rtype: numpy.ndarray
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        is_inside = np.all((indices >= 0) & (indices < self.shape), axis=1)
+        result = np.zeros(len(indices), dtype=bool)
+        x, y, z = indices[is_inside].T
+        if self.packed:
+            result[is_inside] = (self.data[x, y, z >> 3] & (0x80 >> (z & 7))) != 0
+        else:
+            result[is_inside] = self.data[x, y, z]
+        return result
+
+    def to_dense(self):
+        """
+        @rtype: numpy.ndarray
+        """
+        if self.packed:
+            return np.unpackbits(self.data, axis=2, count=self.shape[2]).astype(bool)
+        return np.asarray(self.data, dtype=bool)
+
+    def get_indices(self):
+        """
+        Grid indices of all occupied voxels
+
+        @rtype: numpy.ndarray
+        """
+        if not self.packed:
+            return np.argwhere(self.data)
+        # unpack one slab at a time to keep memory bounded
+        indices = []
+        for x in range(self.shape[0]):
+            slab = np.unpackbits(self.data[x], axis=1, count=self.shape[2])
+            yz = np.argwhere(slab)
+            indices.append(np.column_stack((np.full(len(yz), x, dtype=yz.dtype), yz)))
+        if not indices:
+            return np.empty((0, 3), dtype=np.int64)
+        return np.concatenate(indices)
+
+    def get_positions(self):
+        """
+        Positions of all occupied voxels
+
+        @rtype: numpy.ndarray
+        """
+        return self.get_indices() + self.offset
+
+    def count(self):
+        """
+        Number of occupied voxels
+
+        @rtype: int
+        """
+        if self.packed:
+            # one slab at a time, a memory mapped grid is never read as a whole
+            return sum(count_bits(self.data[x]) for x in range(self.shape[0]))
+        return int(np.count_nonzero(self.data))
+
+    @staticmethod
+    def create_file(file_path, shape, offset=(0, 0, 0), packed=True, scale=None, shift=None, resolution=None):
+        """
+        New grid backed by a memory mapped file, voxels are written to disk instead of memory.
+
+        @type file_path: str
+        @type shape: (int, int, int)
+        @type offset: (int, int, int) | numpy.ndarray
+        @type packed: bool
+        @type scale: float | None
+        @type shift: numpy.ndarray | list[float] | None
+        @type resolution: int | None
+
+        @rtype: VoxelGrid
+        """
+        header = np.zeros(1, dtype=grid_header_type)
+        header['magic'] = grid_file_magic
+        header['version'] = grid_file_version
+        header['packed'] = packed
+        header['shape'] = shape
+        header['offset'] = offset
+        header['scale'] = np.nan if scale is None else scale
+        header['shift'] = np.nan if shift is None else shift
+        header['resolution'] = -1 if resolution is None else resolution
+        data_shape = VoxelGrid.get_data_shape(tuple(int(value) for value in shape), packed)
+        with open(file_path, 'wb') as file_handler:
+            file_handler.write(header.tobytes())
+            # sparse file of the final size, pages are only allocated when written
+            file_handler.truncate(grid_header_type.itemsize + int(np.prod(data_shape)))
+        return VoxelGrid.load(file_path, mode='r+')
+
+    @staticmethod
+    def load(file_path, mode='r'):
+        """
+        Memory map a grid file, nothing is read until voxels are accessed.
+
+        @type file_path: str
+        @param mode: 'r' for read only, 'r+' to modify the file, 'c' for copy on write
+        @type mode: str
+
+        @rtype: VoxelGrid
+        """
+        header = np.fromfile(file_path, dtype=grid_header_type, count=1)
+        if len(header) == 0 or header['magic'][0] != grid_file_magic:
+            raise IOError("Not a voxel grid file: {}".format(file_path))
+        if header['version'][0] != grid_file_version:
+            raise IOError("Unsupported voxel grid file version: {}".format(header['version'][0]))
+        header = header[0]
+        packed = bool(header['packed'])
+        shape = tuple(int(value) for value in header['shape'])
+        data_shape = VoxelGrid.get_data_shape(shape, packed)
+        if int(np.prod(data_shape)) == 0:
+            data = np.zeros(data_shape, dtype=np.uint8 if packed else bool)
+        else:
+            data = np.memmap(
+                file_path, dtype=np.uint8 if packed else bool, mode=mode,
+                offset=grid_header_type.itemsize, shape=data_shape)
+        scale = None if np.isnan(header['scale']) else float(header['scale'])
+        shift = None if np.isnan(header['shift']).any() else header['shift']
+        resolution = None if header['resolution'] < 0 else int(header['resolution'])
+        return VoxelGrid(
+            shape, offset=header['offset'], packed=packed, data=data, scale=scale, shift=shift, resolution=resolution)
+
+    def flush(self):
+        """
+        Write pending changes of a file backed grid to disk
+        """
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
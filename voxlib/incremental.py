@@ -0,0 +1,271 @@
+import numpy as np
+
+from .voxelintersect.triangle import get_backend
+from .mesh import get_scale_and_shift, scale_and_shift_vertices
+from .voxelize import BoundaryBox, iter_triangle_voxels, voxelization_modes
+
+# voxel positions are packed into one int64 key, 21 bits per axis
+_key_bits = 21
+_key_offset = 1 << (_key_bits - 1)
+_key_mask = (1 << _key_bits) - 1
+
+
+def encode_positions(positions):
+    """
+    @param positions: voxel positions of shape (K, 3), between -2**20 and 2**20
+    @type positions: numpy.ndarray
+    @rtype: numpy.ndarray
+    """
+    positions = positions + _key_offset
+    return (positions[:, 0] << (2 * _key_bits)) | (positions[:, 1] << _key_bits) | positions[:, 2]
+
+
+def decode_keys(keys):
+    """
+    @type keys: numpy.ndarray
+    @rtype: numpy.ndarray
+    """
+    positions = np.column_stack((keys >> (2 * _key_bits), (keys >> _key_bits) & _key_mask, keys & _key_mask))
+    return positions - _key_offset
+
+
+class ReferenceCounts(object):
+    """
+    Number of triangles intersecting each voxel.
+    Counts are kept in a sorted key array, voxels not in it yet are collected in a dictionary
+    and merged into the array once the dictionary grows past an eighth of it,
+    so an update costs in proportion to its own size.
+
+    @type keys: numpy.ndarray
+    @type counts: numpy.ndarray
+    """
+
+    def __init__(self, keys=None):
+        """
+        @param keys: initial voxel keys, a key repeats once for every triangle intersecting the voxel
+        @type keys: numpy.ndarray | None
+        """
+        if keys is None:
+            keys = np.empty(0, dtype=np.int64)
+        self.keys, self.counts = np.unique(keys, return_counts=True)
+        self.counts = self.counts.astype(np.int64)
+        self._pending = {}
+
+    def _merge(self):
+        """
+        Move the pending counts into the arrays and drop voxels no longer intersected
+        """
+        if self._pending:
+            keys = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+            counts = np.fromiter(self._pending.values(), dtype=np.int64, count=len(self._pending))
+            self._pending = {}
+            keys = np.concatenate((self.keys, keys))
+            counts = np.concatenate((self.counts, counts))
+            order = np.argsort(keys, kind='stable')
+            self.keys, self.counts = keys[order], counts[order]
+        is_used = self.counts > 0
+        if not is_used.all():
+            self.keys, self.counts = self.keys[is_used], self.counts[is_used]
+
+    def update(self, keys, sign):
+        """
+        Add or subtract one triangle for each key
+
+        @param keys: voxel keys, a key repeats once for every triangle
+        @type keys: numpy.ndarray
+        @param sign: 1 to add, -1 to subtract
+        @type sign: int
+
+        @return: keys of voxels now intersected by a triangle, and of voxels no longer intersected by any
+        @rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        keys, counts = np.unique(keys, return_counts=True)
+        counts = counts.astype(np.int64) * sign
+        before = np.zeros(len(keys), dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        is_stored = np.zeros(len(keys), dtype=bool)
+        if len(self.keys):
+            is_stored = self.keys[index] == keys
+        before[is_stored] = self.counts[index[is_stored]]
+        self.counts[index[is_stored]] += counts[is_stored]
+        for position in np.flatnonzero(~is_stored).tolist():
+            key = int(keys[position])
+            before[position] = self._pending.get(key, 0)
+            count = before[position] + counts[position]
+            if count:
+                self._pending[key] = count
+            else:
+                self._pending.pop(key, None)
+        after = before + counts
+        assert (after >= 0).all(), "Removed triangles were never added"
+        if len(self._pending) > max(2**12, len(self.keys) // 8):
+            self._merge()
+        return keys[(before == 0) & (after > 0)], keys[(before > 0) & (after == 0)]
+
+    def get_keys(self):
+        """
+        Keys of all voxels intersected by at least one triangle, sorted
+
+        @rtype: numpy.ndarray
+        """
+        self._merge()
+        return self.keys
+
+    def __len__(self):
+        return int(np.count_nonzero(self.counts)) + len(self._pending)
+
+
+class IncrementalVoxelizer(object):
+    """
+    Voxels of a mesh that is edited a few triangles at a time.
+    Each voxel counts the triangles intersecting it, see 'ReferenceCounts'.
+    An edit only tests the removed and added triangles: the voxels of removed triangles are subtracted again,
+    those of added triangles are added, so an update costs in proportion to the size of the edit.
+    Scale and shift are those of the first mesh, voxels of later edits are on the same grid
+    and centered the same way, even if the edits change the bounds of the mesh.
+
+    @type scale: float
+    @type shift: numpy.ndarray
+    @type center: list[int]
+    """
+
+    def __init__(self, vertices, resolution, mode='conservative', backend=None):
+        """
+        @param vertices: array of shape (N, 3, 3)
+        @type vertices: numpy.ndarray
+        @type resolution: int
+        @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+        @type mode: str
+        @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+        @type backend: str | None
+        """
+        assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+        self.mode = mode
+        self.backend = get_backend(backend)
+        self.scale, self.shift, triangle_count = get_scale_and_shift(vertices, resolution)
+        self._vertices = scale_and_shift_vertices(vertices, self.scale, self.shift)
+        self._is_removed = np.zeros(triangle_count, dtype=bool)
+        self._triangle_count = triangle_count
+        bounding_box = BoundaryBox()
+        bounding_box.from_vertex_array(self._vertices)
+        self.center = bounding_box.get_center()
+        self.counts = ReferenceCounts(self._get_keys(self._vertices))
+
+    def _get_keys(self, vertices):
+        """
+        Voxel keys of scaled triangles, once for every triangle intersecting a voxel
+
+        @type vertices: numpy.ndarray
+        @rtype: numpy.ndarray
+        """
+        chunks = [
+            encode_positions(positions)
+            for triangle_index, positions in iter_triangle_voxels(vertices, mode=self.mode, backend=self.backend)]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _append(self, vertices):
+        """
+        Store scaled triangles, the buffer doubles in size when it is full
+
+        @type vertices: numpy.ndarray
+        @return: indexes of the triangles
+        @rtype: numpy.ndarray
+        """
+        start = self._triangle_count
+        stop = start + len(vertices)
+        if stop > len(self._vertices):
+            capacity = max(stop, 2 * len(self._vertices))
+            buffer = np.empty((capacity, 3, 3), dtype=np.float64)
+            buffer[:start] = self._vertices[:start]
+            is_removed = np.ones(capacity, dtype=bool)
+            is_removed[:start] = self._is_removed[:start]
+            self._vertices, self._is_removed = buffer, is_removed
+        self._vertices[start:stop] = vertices
+        self._is_removed[start:stop] = False
+        self._triangle_count = stop
+        return np.arange(start, stop)
+
+    def update(self, removed=None, added=None):
+        """
+        Remove and add triangles.
+        Indexes of the remaining triangles stay the same, added triangles get new indexes.
+
+        @param removed: indexes of triangles to remove
+        @type removed: numpy.ndarray | list[int] | None
+        @param added: new triangles of shape (K, 3, 3), in mesh coordinates
+        @type added: numpy.ndarray | None
+
+        @return: indexes of the added triangles, positions of voxels that appeared and of voxels that disappeared
+        @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        appeared = []
+        disappeared = []
+        if removed is not None and len(removed):
+            removed = np.unique(np.asarray(removed, dtype=np.int64))
+            assert removed.min() >= 0 and removed.max() < self._triangle_count, "Unknown triangle index"
+            assert not self._is_removed[removed].any(), "Triangle removed twice"
+            self._is_removed[removed] = True
+            new, gone = self.counts.update(self._get_keys(self._vertices[removed]), -1)
+            appeared.append(new)
+            disappeared.append(gone)
+        indexes = np.empty(0, dtype=np.int64)
+        if added is not None and len(added):
+            added = scale_and_shift_vertices(np.asarray(added).reshape(-1, 3, 3), self.scale, self.shift)
+            indexes = self._append(added)
+            new, gone = self.counts.update(self._get_keys(added), 1)
+            appeared.append(new)
+            disappeared.append(gone)
+        # a voxel may disappear with the removed triangles and appear again with the added ones
+        appeared = np.concatenate(appeared) if appeared else np.empty(0, dtype=np.int64)
+        disappeared = np.concatenate(disappeared) if disappeared else np.empty(0, dtype=np.int64)
+        appeared, disappeared = np.setdiff1d(appeared, disappeared), np.setdiff1d(disappeared, appeared)
+        return indexes, decode_keys(appeared) - self.center, decode_keys(disappeared) - self.center
+
+    def replace(self, indexes, vertices):
+        """
+        Move triangles, they keep their indexes
+
+        @param indexes: indexes of the triangles
+        @type indexes: numpy.ndarray | list[int]
+        @param vertices: new triangles of shape (K, 3, 3), in mesh coordinates
+        @type vertices: numpy.ndarray
+
+        @return: positions of voxels that appeared and of voxels that disappeared
+        @rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        assert len(np.unique(indexes)) == len(indexes), "Triangle index given twice"
+        vertices = scale_and_shift_vertices(np.asarray(vertices).reshape(-1, 3, 3), self.scale, self.shift)
+        assert len(vertices) == len(indexes), "One triangle for each index expected"
+        assert not self._is_removed[indexes].any(), "Triangle was removed"
+        new_removed, gone_removed = self.counts.update(self._get_keys(self._vertices[indexes]), -1)
+        self._vertices[indexes] = vertices
+        new_added, gone_added = self.counts.update(self._get_keys(vertices), 1)
+        appeared = np.concatenate((new_removed, new_added))
+        disappeared = np.concatenate((gone_removed, gone_added))
+        appeared, disappeared = np.setdiff1d(appeared, disappeared), np.setdiff1d(disappeared, appeared)
+        return decode_keys(appeared) - self.center, decode_keys(disappeared) - self.center
+
+    def get_vertices(self):
+        """
+        Remaining triangles, scaled and shifted
+
+        @return: array of shape (N, 3, 3)
+        @rtype: numpy.ndarray
+        """
+        return self._vertices[:self._triangle_count][~self._is_removed[:self._triangle_count]]
+
+    def get_positions(self):
+        """
+        Voxels of the current mesh, centered the same way as by 'voxelize'
+
+        @return: sorted voxel positions of shape (K, 3)
+        @rtype: numpy.ndarray
+        """
+        return decode_keys(self.counts.get_keys()) - self.center
+
+    def __len__(self):
+        return len(self.counts)
@@ -1,44 +1,95 @@
+import os
 import numpy as np
 
 # functions are loosly based
 
 
-def get_scale_and_shift(mesh, resolution):
+def get_bounds(vertices):
     """
+    Smallest and largest coordinates of a mesh
 
-    @type mesh: list[((float, float, float), (float, float, float), (float, float, float))]
+    @type vertices: numpy.ndarray
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    return vertices.min(axis=(0, 1)).astype(np.float64), vertices.max(axis=(0, 1)).astype(np.float64)
+
+
+def get_scale_and_shift(vertices, resolution, bounds=None):
+    """
+    Scale and shift fitting a mesh into a grid of 'resolution' voxels along its longest side
+
+    @param vertices: array of shape (N, 3, 3)
+    @type vertices: numpy.ndarray
     @type resolution: int
-    @rtype: (float, list[float], int)
+    @param bounds: precomputed result of 'get_bounds'
+    @type bounds: (numpy.ndarray, numpy.ndarray) | None
+    @rtype: (float, numpy.ndarray, int)
     """
-    triangle_count = 0
-    mins = list(mesh[0][0])
-    maxs = list(mesh[0][0])
-    for triangle in mesh:
-        triangle_count += 1
-        for index, point in enumerate(triangle):
-            if point[index] < mins[index]:
-                mins[index] = point[index]
-            if point[index] > maxs[index]:
-                maxs[index] = point[index]
-    shift = [-minimum for minimum in mins]
-    scale = float(resolution - 1) / (max(maxs[0] - mins[0], maxs[1] - mins[1], maxs[2] - mins[2]))
-    return scale, shift, triangle_count
+    if bounds is None:
+        bounds = get_bounds(vertices)
+    mins, maxs = bounds
+    shift = -mins
+    scale = float(resolution - 1) / float((maxs - mins).max())
+    return scale, shift, len(vertices)
 
 
-def scale_and_shift_triangle(triangle, scale, shift):
+def scale_and_shift_vertices(vertices, scale, shift, copy=True):
     """
+    Scale and shift a whole mesh with one broadcasted transform
 
-    @type triangle: ((float, float, float), (float, float, float), (float, float, float))
+    @type vertices: numpy.ndarray
     @type scale: float
-    @type shift: list[float
-
-    @rtype: list[(float, float, float)] | None
-    """
-    shifted_triangle = []
-    for point in triangle:
-        new_point = np.array([.0, .0, .0])
-        for i in range(3):
-            new_point[i] = (point[i] + shift[i]) * scale
-        shifted_triangle.append(new_point)
-    del triangle
-    return shifted_triangle
+    @type shift: numpy.ndarray | list[float]
+    @param copy: if False, a writable float64 array is transformed in place instead of copied
+    @type copy: bool
+
+    @rtype: numpy.ndarray
+    """
+    if copy or not isinstance(vertices, np.ndarray) or vertices.dtype != np.float64 or not vertices.flags.writeable:
+        vertices = np.array(vertices, dtype=np.float64)
+    vertices += np.asarray(shift, dtype=np.float64)
+    vertices *= scale
+    return vertices
+
+
+# binary stl: 80 byte header, uint32 triangle count, then one 50 byte record per triangle
+stl_header_size = 84
+stl_record_type = np.dtype([
+    ('normal', '<f4', (3, )),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+    ])
+
+
+def is_binary_stl(file_path):
+    """
+    Binary stl files are recognised by their size matching the triangle count in the header
+
+    @type file_path: str
+    @rtype: bool
+    """
+    if not file_path.lower().endswith('.stl'):
+        return False
+    file_size = os.path.getsize(file_path)
+    if file_size < stl_header_size:
+        return False
+    with open(file_path, 'rb') as file_handler:
+        file_handler.seek(80)
+        triangle_count = int(np.frombuffer(file_handler.read(4), dtype='<u4')[0])
+    return file_size == stl_header_size + triangle_count * stl_record_type.itemsize
+
+
+def read_binary_stl(file_path):
+    """
+    Memory map the triangles of a binary stl file, nothing is copied into memory
+
+    @type file_path: str
+
+    @return: read only array of shape (N, 3, 3)
+    @rtype: numpy.ndarray
+    """
+    triangle_count = (os.path.getsize(file_path) - stl_header_size) // stl_record_type.itemsize
+    if triangle_count == 0:
+        return np.empty((0, 3, 3), dtype=np.float32)
+    records = np.memmap(file_path, dtype=stl_record_type, mode='r', offset=stl_header_size, shape=(triangle_count, ))
+    return records['vertices']
@@ -0,0 +1,350 @@
+import os
+import multiprocessing
+import weakref
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+
+from .grid import VoxelGrid
+from .stats import VoxelizeStats
+
+
+def get_worker_count(workers):
+    """
+    Number of worker processes, 0 or None stands for all available cores
+
+    @type workers: int | None
+    @rtype: int
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return workers
+
+
+def get_executor(workers):
+    """
+    Pool of worker processes, started from a clean server process instead of forked from this one.
+    A process forked after the numba backend started its threads hangs at exit.
+
+    @type workers: int
+    @rtype: ProcessPoolExecutor
+    """
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+
+
+def get_chunk_ranges(item_count, workers, chunks_per_worker=4):
+    """
+    Split items into ranges, a few per worker to balance the load
+
+    @type item_count: int
+    @type workers: int
+    @type chunks_per_worker: int
+
+    @rtype: list[(int, int)]
+    """
+    chunk_size = max(1, -(-item_count // (workers * chunks_per_worker)))
+    return [(start, min(start + chunk_size, item_count)) for start in range(0, item_count, chunk_size)]
+
+
+def _run_chunk(function, name, shape, start, stop, profile=False):
+    """
+    Apply a function to a range of triangles in shared memory, runs in a worker process
+
+    @type function: callable
+    @type name: str
+    @type shape: (int, int, int)
+    @type start: int
+    @type stop: int
+    @param profile: pass a VoxelizeStats to the function and return it with the result
+    @type profile: bool
+    """
+    shared_memory = SharedMemory(name=name)
+    try:
+        vertices = np.ndarray(shape, dtype=np.float64, buffer=shared_memory.buf)
+        if profile:
+            stats = VoxelizeStats()
+            result = function(vertices[start:stop], stats=stats), stats
+        else:
+            result = function(vertices[start:stop])
+        del vertices
+    finally:
+        shared_memory.close()
+    return result
+
+
+def iter_triangle_chunks(function, vertices, workers, progress=None, stats=None, chunk_size=None):
+    """
+    Apply a function to chunks of triangles in a pool of worker processes, results are yielded as chunks finish.
+    Vertexes are placed in shared memory once instead of being pickled for every chunk.
+    Chunks not started yet are cancelled if the caller stops iterating.
+
+    @param function: picklable function taking an (K, 3, 3) array
+    @type function: callable
+    @param vertices: array of shape (N, 3, 3)
+    @type vertices: numpy.ndarray
+    @type workers: int
+    @param progress: started with the number of triangles, finished chunks are added to it
+    @type progress: Progress | None
+    @param stats: profile the counters of the workers are added to, the function then needs a 'stats' argument
+    @type stats: VoxelizeStats | None
+    @param chunk_size: number of triangles of a chunk, by default a few chunks per worker
+    @type chunk_size: int | None
+
+    @return: index of the chunk and function result, in the order chunks finish
+    @rtype: collections.Iterable[(int, any)]
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+    triangle_count = len(vertices)
+    if triangle_count == 0:
+        return
+    if chunk_size:
+        chunk_ranges = [
+            (start, min(start + chunk_size, triangle_count)) for start in range(0, triangle_count, chunk_size)]
+    else:
+        chunk_ranges = get_chunk_ranges(triangle_count, workers)
+    if progress is not None:
+        progress.start(triangle_count)
+    shared_memory = SharedMemory(create=True, size=vertices.nbytes)
+    try:
+        shared_vertices = np.ndarray(vertices.shape, dtype=np.float64, buffer=shared_memory.buf)
+        shared_vertices[:] = vertices
+        del shared_vertices
+        with get_executor(workers) as executor:
+            futures = {
+                executor.submit(
+                    _run_chunk, function, shared_memory.name, vertices.shape, start, stop, stats is not None): index
+                for index, (start, stop) in enumerate(chunk_ranges)}
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    result = future.result()
+                    if stats is not None:
+                        result, worker_stats = result
+                        stats.add(**worker_stats.counts)
+                    if progress is not None:
+                        progress.add(chunk_ranges[index][1] - chunk_ranges[index][0])
+                    yield index, result
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+
+def map_triangle_chunks(function, vertices, workers, progress=None, stats=None):
+    """
+    Apply a function to chunks of triangles in a pool of worker processes, see 'iter_triangle_chunks'
+
+    @param function: picklable function taking an (K, 3, 3) array
+    @type function: callable
+    @param vertices: array of shape (N, 3, 3)
+    @type vertices: numpy.ndarray
+    @type workers: int
+    @param progress: started with the number of triangles, finished chunks are added to it
+    @type progress: Progress | None
+    @param stats: profile the counters of the workers are added to, the function then needs a 'stats' argument
+    @type stats: VoxelizeStats | None
+
+    @return: function results in chunk order
+    @rtype: list
+    """
+    results = dict(iter_triangle_chunks(function, vertices, workers, progress, stats))
+    return [results[index] for index in range(len(results))]
+
+
+def get_slab_triangles(vertices, minimum, slab_width, slab_count):
+    """
+    Bucket triangles by the slabs along the x axis their bounding boxes overlap
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param minimum: voxel position of the first slab
+    @type minimum: int
+    @type slab_width: int
+    @type slab_count: int
+
+    @return: triangle indexes of each slab
+    @rtype: list[numpy.ndarray]
+    """
+    first = (np.floor(vertices[:, :, 0].min(axis=1)).astype(np.int64) - minimum) // slab_width
+    last = (np.floor(vertices[:, :, 0].max(axis=1)).astype(np.int64) - minimum) // slab_width
+    first = np.clip(first, 0, slab_count - 1)
+    last = np.clip(last, 0, slab_count - 1)
+    counts = last - first + 1
+    triangle_index = np.repeat(np.arange(len(vertices)), counts)
+    slab_index = first[triangle_index] + np.arange(len(triangle_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    order = np.argsort(slab_index, kind='stable')
+    ends = np.searchsorted(slab_index[order], np.arange(slab_count), side='right')
+    return np.split(triangle_index[order], ends[:-1])
+
+
+# shared memory blocks of the grids created by 'create_shared_grid'
+_shared_grids = weakref.WeakKeyDictionary()
+
+
+def _release_shared_memory(shared_memory):
+    """
+    @type shared_memory: SharedMemory
+    """
+    shared_memory.close()
+    shared_memory.unlink()
+
+
+def create_shared_grid(shape, offset=(0, 0, 0), packed=False, scale=None, shift=None, resolution=None):
+    """
+    New grid in a shared memory block, the workers of 'fill_grid_slabs' write into it without any copies.
+    The block is released once the grid data and all views of it are gone.
+
+    @type shape: (int, int, int)
+    @type offset: (int, int, int) | numpy.ndarray
+    @type packed: bool
+    @type scale: float | None
+    @type shift: numpy.ndarray | list[float] | None
+    @type resolution: int | None
+
+    @rtype: VoxelGrid
+    """
+    data_shape = VoxelGrid.get_data_shape(tuple(int(value) for value in shape), packed)
+    # a new block is zeroed
+    shared_memory = SharedMemory(create=True, size=max(1, int(np.prod(data_shape))))
+    data = np.ndarray(data_shape, dtype=np.uint8 if packed else bool, buffer=shared_memory.buf)
+    # closing the block unmaps the data, so it waits until nothing uses the data anymore
+    weakref.finalize(data, _release_shared_memory, shared_memory)
+    grid = VoxelGrid(shape, offset=offset, packed=packed, data=data, scale=scale, shift=shift, resolution=resolution)
+    _shared_grids[grid] = shared_memory.name
+    return grid
+
+
+def _open_grid(grid_buffer, grid_shape, packed):
+    """
+    Grid on a shared buffer, either a shared memory block or a grid file
+
+    @param grid_buffer: ('memory', name) or ('file', file path, offset)
+    @type grid_buffer: tuple
+    @type grid_shape: (int, int, int)
+    @type packed: bool
+
+    @return: the grid and the shared memory block to close, if any
+    @rtype: (VoxelGrid, SharedMemory | None)
+    """
+    data_shape = VoxelGrid.get_data_shape(grid_shape, packed)
+    dtype = np.uint8 if packed else bool
+    if grid_buffer[0] == 'file':
+        data = np.memmap(grid_buffer[1], dtype=dtype, mode='r+', offset=grid_buffer[2], shape=data_shape)
+        return VoxelGrid(grid_shape, packed=packed, data=data), None
+    grid_memory = SharedMemory(name=grid_buffer[1])
+    data = np.ndarray(data_shape, dtype=dtype, buffer=grid_memory.buf)
+    return VoxelGrid(grid_shape, packed=packed, data=data), grid_memory
+
+
+def _run_slab(
+        function, vertices_name, vertices_shape, grid_buffer, grid_shape, packed, minimum, triangle_index, x_range,
+        profile=False):
+    """
+    Write the voxels of one slab into a shared grid, runs in a worker process
+
+    @type function: callable
+    @type vertices_name: str
+    @type vertices_shape: (int, int, int)
+    @type grid_buffer: tuple
+    @type grid_shape: (int, int, int)
+    @type packed: bool
+    @type minimum: numpy.ndarray
+    @type triangle_index: numpy.ndarray
+    @type x_range: (int, int)
+    @param profile: pass a VoxelizeStats to the function and return it
+    @type profile: bool
+
+    @return: number of triangles, and the profile if asked for
+    @rtype: int | (int, VoxelizeStats)
+    """
+    stats = VoxelizeStats() if profile else None
+    vertices_memory = SharedMemory(name=vertices_name)
+    grid_memory = None
+    try:
+        vertices = np.ndarray(vertices_shape, dtype=np.float64, buffer=vertices_memory.buf)
+        slab_vertices = vertices[triangle_index]
+        del vertices
+        grid, grid_memory = _open_grid(grid_buffer, grid_shape, packed)
+        chunks = function(slab_vertices, x_range=x_range, stats=stats) if profile else function(
+            slab_vertices, x_range=x_range)
+        for positions in chunks:
+            grid.add(positions - minimum)
+        grid.flush()
+        del grid
+    finally:
+        vertices_memory.close()
+        if grid_memory is not None:
+            grid_memory.close()
+    if profile:
+        return len(triangle_index), stats
+    return len(triangle_index)
+
+
+def fill_grid_slabs(function, vertices, grid, minimum, workers, progress=None, stats=None):
+    """
+    Voxelize into a grid with a pool of worker processes.
+    The grid is split into slabs along the x axis, each slab is written by exactly one task
+    into a shared buffer, triangles crossing slab boundaries are clipped to the slab.
+    No results have to be merged.
+    Workers write directly into the grid, it has to be created by 'create_shared_grid' or backed by a file.
+
+    @param function: picklable function taking an (K, 3, 3) array and a 'x_range', yielding voxel positions
+    @type function: callable
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param grid: grid created by 'create_shared_grid' or 'VoxelGrid.create_file'
+    @type grid: VoxelGrid
+    @param minimum: voxel position of grid index (0, 0, 0)
+    @type minimum: numpy.ndarray
+    @type workers: int
+    @param progress: started with the number of triangles of all slabs, finished slabs are added to it
+    @type progress: Progress | None
+    @param stats: profile the counters of the workers are added to, the function then needs a 'stats' argument
+    @type stats: VoxelizeStats | None
+    """
+    if isinstance(grid.data, np.memmap) and grid.data.filename:
+        grid.data.flush()
+        grid_buffer = ('file', grid.data.filename, grid.data.offset)
+    else:
+        assert grid in _shared_grids, "Workers can only write into shared or file backed grids"
+        grid_buffer = ('memory', _shared_grids[grid])
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+    triangle_count = len(vertices)
+    if triangle_count == 0:
+        return
+    slab_count = min(grid.shape[0], workers * 4)
+    slab_width = -(-grid.shape[0] // slab_count)
+    slab_count = -(-grid.shape[0] // slab_width)
+    slab_triangles = get_slab_triangles(vertices, minimum[0], slab_width, slab_count)
+
+    vertices_memory = SharedMemory(create=True, size=vertices.nbytes)
+    try:
+        shared_vertices = np.ndarray(vertices.shape, dtype=np.float64, buffer=vertices_memory.buf)
+        shared_vertices[:] = vertices
+        del shared_vertices
+        with get_executor(workers) as executor:
+            futures = []
+            for index, triangle_index in enumerate(slab_triangles):
+                if len(triangle_index) == 0:
+                    continue
+                x_range = (
+                    int(minimum[0]) + index * slab_width,
+                    int(minimum[0]) + min((index + 1) * slab_width, grid.shape[0]))
+                futures.append(executor.submit(
+                    _run_slab, function, vertices_memory.name, vertices.shape, grid_buffer, grid.shape,
+                    grid.packed, minimum, triangle_index, x_range, stats is not None))
+            if progress is not None:
+                progress.start(sum(len(triangle_index) for triangle_index in slab_triangles))
+            for future in as_completed(futures):
+                result = future.result()
+                if stats is not None:
+                    result, worker_stats = result
+                    stats.add(**worker_stats.counts)
+                if progress is not None:
+                    progress.add(result)
+    finally:
+        vertices_memory.close()
+        vertices_memory.unlink()
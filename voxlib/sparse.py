@@ -0,0 +1,334 @@
+import numpy as np
+
+from .grid import VoxelGrid, count_bits
+
+# brick coordinates are stored in 21 bits per axis, packed into one int64 key
+_key_bits = 21
+_key_offset = 1 << (_key_bits - 1)
+_key_mask = (1 << _key_bits) - 1
+
+
+def _merge_runs(first, second):
+    """
+    Merge two sorted runs of bricks without common keys
+
+    @type first: (numpy.ndarray, numpy.ndarray)
+    @type second: (numpy.ndarray, numpy.ndarray)
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    (keys_1, masks_1), (keys_2, masks_2) = first, second
+    # final index of each key of the second run
+    index = np.searchsorted(keys_1, keys_2) + np.arange(len(keys_2))
+    is_first = np.ones(len(keys_1) + len(keys_2), dtype=bool)
+    is_first[index] = False
+    keys = np.empty(len(is_first), dtype=np.int64)
+    masks = np.empty((len(is_first), masks_1.shape[1]), dtype=np.uint8)
+    keys[index], masks[index] = keys_2, masks_2
+    keys[is_first], masks[is_first] = keys_1, masks_1
+    return keys, masks
+
+
+class BrickMap(object):
+    """
+    Sparse voxel store.
+    Voxels are grouped into cubic bricks of 'brick_size'^3 voxels, each brick is a bitmask.
+    Only bricks containing at least one voxel are stored, in two arrays:
+    sorted brick keys and the matching bitmasks, so memory scales with the surface of a mesh.
+    New bricks wait in smaller sorted runs until all bricks are read, see '_flush' and '_compact'.
+
+    @type brick_size: int
+    @type keys: numpy.ndarray
+    @type masks: numpy.ndarray
+    """
+
+    def __init__(self, brick_size=8, buffer_size=2**16):
+        """
+        @param brick_size: edge length of a brick, a power of two of at least 2
+        @type brick_size: int
+        @param buffer_size: number of added voxels collected before they are merged into the bricks
+        @type buffer_size: int
+        """
+        assert brick_size >= 2 and brick_size & (brick_size - 1) == 0, "Brick size must be a power of two"
+        self.brick_size = brick_size
+        self._brick_shift = brick_size.bit_length() - 1
+        self._brick_bytes = brick_size ** 3 // 8
+        self.keys = np.empty(0, dtype=np.int64)
+        self.masks = np.empty((0, self._brick_bytes), dtype=np.uint8)
+        # sorted runs of new bricks, from the largest to the smallest, no brick is in more than one run
+        self._runs = []
+        self._buffer = []
+        self._buffer_count = 0
+        self._buffer_size = buffer_size
+
+    def _encode(self, bricks):
+        """
+        @type bricks: numpy.ndarray
+        @rtype: numpy.ndarray
+        """
+        bricks = bricks + _key_offset
+        return (bricks[:, 0] << (2 * _key_bits)) | (bricks[:, 1] << _key_bits) | bricks[:, 2]
+
+    def _decode(self, keys):
+        """
+        @type keys: numpy.ndarray
+        @rtype: numpy.ndarray
+        """
+        bricks = np.column_stack((keys >> (2 * _key_bits), (keys >> _key_bits) & _key_mask, keys & _key_mask))
+        return bricks - _key_offset
+
+    def _split(self, positions):
+        """
+        Brick key, byte and bit of voxel positions
+
+        @type positions: numpy.ndarray
+        @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        local = positions & (self.brick_size - 1)
+        index = (local[:, 0] * self.brick_size + local[:, 1]) * self.brick_size + local[:, 2]
+        keys = self._encode(positions >> self._brick_shift)
+        return keys, index >> 3, (0x80 >> (index & 7)).astype(np.uint8)
+
+    def _flush(self):
+        """
+        Merge buffered voxels into the bricks.
+        Voxels of stored bricks are set in place. New bricks form a sorted run, which is merged with the runs
+        before it while they are less than twice as large, like in a log-structured merge tree.
+        So every brick is copied a logarithmic number of times instead of on every flush.
+        """
+        if not self._buffer:
+            return
+        positions = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffer_count = 0
+        keys, byte_index, bits = self._split(positions)
+        remaining = np.arange(len(keys))
+        for run_keys, run_masks in [(self.keys, self.masks)] + self._runs:
+            if len(remaining) == 0 or len(run_keys) == 0:
+                continue
+            brick_index = np.minimum(np.searchsorted(run_keys, keys[remaining]), len(run_keys) - 1)
+            is_stored = run_keys[brick_index] == keys[remaining]
+            stored = remaining[is_stored]
+            np.bitwise_or.at(run_masks, (brick_index[is_stored], byte_index[stored]), bits[stored])
+            remaining = remaining[~is_stored]
+        if len(remaining) == 0:
+            return
+        new_keys, brick_index = np.unique(keys[remaining], return_inverse=True)
+        new_masks = np.zeros((len(new_keys), self._brick_bytes), dtype=np.uint8)
+        np.bitwise_or.at(new_masks, (brick_index, byte_index[remaining]), bits[remaining])
+        run = new_keys, new_masks
+        while self._runs and len(self._runs[-1][0]) < 2 * len(run[0]):
+            run = _merge_runs(self._runs.pop(), run)
+        if len(self.keys) < 2 * len(run[0]):
+            self.keys, self.masks = _merge_runs((self.keys, self.masks), run)
+        else:
+            self._runs.append(run)
+
+    def _compact(self):
+        """
+        Merge buffered voxels and all runs into 'keys' and 'masks'
+        """
+        self._flush()
+        while self._runs:
+            self.keys, self.masks = _merge_runs((self.keys, self.masks), self._runs.pop())
+
+    def add(self, positions):
+        """
+        Insert a batch of voxels
+
+        @param positions: voxel positions of shape (K, 3)
+        @type positions: numpy.ndarray | list[(int, int, int)]
+        """
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        if len(positions) == 0:
+            return
+        self._buffer.append(positions)
+        self._buffer_count += len(positions)
+        if self._buffer_count >= self._buffer_size:
+            self._flush()
+
+    def add_positions(self, positions):
+        """
+        Same as 'add', for compatibility with VoxelGrid
+
+        @type positions: numpy.ndarray
+        """
+        self.add(positions)
+
+    def contains(self, positions):
+        """
+        @param positions: voxel positions of shape (K, 3)
+        @type positions: numpy.ndarray
+
+        @rtype: numpy.ndarray
+        """
+        self._flush()
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        keys, byte_index, bits = self._split(positions)
+        result = np.zeros(len(positions), dtype=bool)
+        for run_keys, run_masks in [(self.keys, self.masks)] + self._runs:
+            brick_index = np.searchsorted(run_keys, keys)
+            is_stored = brick_index < len(run_keys)
+            is_stored[is_stored] = run_keys[brick_index[is_stored]] == keys[is_stored]
+            result[is_stored] = (run_masks[brick_index[is_stored], byte_index[is_stored]] & bits[is_stored]) != 0
+        return result
+
+    def __contains__(self, position):
+        """
+        @type position: (int, int, int)
+        @rtype: bool
+        """
+        return bool(self.contains([position])[0])
+
+    def __len__(self):
+        self._compact()
+        return count_bits(self.masks)
+
+    def iter_positions(self, bricks_per_chunk=4096):
+        """
+        Voxel positions, brick by brick
+
+        @type bricks_per_chunk: int
+        @rtype: collections.Iterable[numpy.ndarray]
+        """
+        self._compact()
+        size = self.brick_size
+        for start in range(0, len(self.keys), bricks_per_chunk):
+            masks = np.unpackbits(self.masks[start:start + bricks_per_chunk], axis=1)
+            brick_index, index = np.nonzero(masks)
+            origins = self._decode(self.keys[start:start + bricks_per_chunk]) << self._brick_shift
+            local = np.column_stack((index // (size * size), (index // size) % size, index % size))
+            yield origins[brick_index] + local
+
+    def get_positions(self):
+        """
+        @rtype: numpy.ndarray
+        """
+        chunks = list(self.iter_positions())
+        if not chunks:
+            return np.empty((0, 3), dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def __iter__(self):
+        for positions in self.iter_positions():
+            for position in positions.tolist():
+                yield tuple(position)
+
+    def update(self, other):
+        """
+        Add all voxels of another brick map
+
+        @type other: BrickMap
+        """
+        if other.brick_size != self.brick_size:
+            for positions in other.iter_positions():
+                self.add(positions)
+            return
+        self._compact()
+        other._compact()
+        keys = np.union1d(self.keys, other.keys)
+        masks = np.zeros((len(keys), self._brick_bytes), dtype=np.uint8)
+        masks[np.searchsorted(keys, self.keys)] = self.masks
+        masks[np.searchsorted(keys, other.keys)] |= other.masks
+        self.keys, self.masks = keys, masks
+
+    def union(self, other):
+        """
+        @type other: BrickMap
+        @rtype: BrickMap
+        """
+        result = BrickMap(self.brick_size, self._buffer_size)
+        result.update(self)
+        result.update(other)
+        return result
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def downsample(self):
+        """
+        Brick map at half the resolution, a voxel is set if any voxel of its 2x2x2 block is set.
+        Bricks are reduced as a whole, voxel (x, y, z) becomes voxel (x >> 1, y >> 1, z >> 1).
+
+        @rtype: BrickMap
+        """
+        self._compact()
+        size = self.brick_size
+        half = size // 2
+        result = BrickMap(size, self._buffer_size)
+        for start in range(0, len(self.keys), 4096):
+            masks = np.unpackbits(self.masks[start:start + 4096], axis=1).reshape(-1, half, 2, half, 2, half, 2)
+            brick_index, x, y, z = np.nonzero(masks.any(axis=(2, 4, 6)))
+            bricks = self._decode(self.keys[start:start + 4096])
+            origins = (bricks >> 1 << self._brick_shift) + (bricks & 1) * half
+            result.add(origins[brick_index] + np.column_stack((x, y, z)))
+        result._compact()
+        return result
+
+    def get_bounds(self):
+        """
+        Smallest and largest voxel position
+
+        @rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        self._compact()
+        assert len(self.keys) > 0, "BrickMap is empty"
+        minimum = None
+        maximum = None
+        for positions in self.iter_positions():
+            if minimum is None:
+                minimum, maximum = positions.min(axis=0), positions.max(axis=0)
+            else:
+                minimum = np.minimum(minimum, positions.min(axis=0))
+                maximum = np.maximum(maximum, positions.max(axis=0))
+        return minimum, maximum
+
+    def to_grid(self, packed=False):
+        """
+        Dense grid covering all voxels
+
+        @type packed: bool
+        @rtype: VoxelGrid
+        """
+        minimum, maximum = self.get_bounds()
+        grid = VoxelGrid(maximum - minimum + 1, offset=minimum, packed=packed)
+        for positions in self.iter_positions():
+            grid.add_positions(positions)
+        return grid
+
+    def to_dense(self):
+        """
+        Dense boolean array covering all voxels and the position of its first element
+
+        @rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        grid = self.to_grid()
+        return grid.data, grid.offset
+
+    @staticmethod
+    def from_dense(dense, offset=(0, 0, 0), brick_size=8):
+        """
+        @param dense: boolean array of shape (X, Y, Z)
+        @type dense: numpy.ndarray
+        @param offset: position of the first element
+        @type offset: (int, int, int) | numpy.ndarray
+        @type brick_size: int
+
+        @rtype: BrickMap
+        """
+        brick_map = BrickMap(brick_size)
+        brick_map.add(np.argwhere(dense) + np.asarray(offset, dtype=np.int64))
+        brick_map._compact()
+        return brick_map
+
+    @staticmethod
+    def from_grid(grid, brick_size=8):
+        """
+        @type grid: VoxelGrid
+        @type brick_size: int
+
+        @rtype: BrickMap
+        """
+        brick_map = BrickMap(brick_size)
+        brick_map.add(grid.get_positions())
+        brick_map._compact()
+        return brick_map
@@ -0,0 +1,99 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class VoxelizeStats(object):
+    """
+    Profile of a voxelization: wall time of each stage and counters of the triangle cube tests.
+    Nothing is measured unless an instance is passed as 'stats', for example to 'voxelize' or 'voxelize_file'.
+    Counters of worker processes are added to those of the calling process.
+
+    Stages:
+        read: parsing the mesh file
+        bounds: bounds, scale and shift of the mesh
+        scale: scaling and shifting the vertexes
+        intersect: flood fills and triangle cube tests
+        fill: marking the voxels inside the mesh
+        output: collecting the voxels, for the 'voxelize' generator including the time of the caller between voxels
+
+    Counters:
+        candidates: voxels tested against a triangle
+        hits: tested voxels intersecting their triangle, and voxels of triangles inside a single voxel
+        expansions: neighbours queued by the flood fills
+        fallbacks: voxels tested by the python implementation instead of the compiled library
+
+    @type seconds: dict[str, float]
+    @type counts: dict[str, int]
+    """
+
+    stages = ('read', 'bounds', 'scale', 'intersect', 'fill', 'output')
+    counters = ('candidates', 'hits', 'expansions', 'fallbacks')
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.stages, 0.)
+        self.counts = dict.fromkeys(self.counters, 0)
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        Add the wall time of a block to a stage
+
+        @type stage: str
+        """
+        assert stage in self.seconds, "Unknown stage: {}".format(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+    def add(self, **counts):
+        """
+        Increase counters, for example add(candidates=10, hits=2)
+
+        @type counts: int
+        """
+        for name, count in counts.items():
+            assert name in self.counts, "Unknown counter: {}".format(name)
+            self.counts[name] += int(count)
+
+    def update(self, other):
+        """
+        Add the times and counters of another profile, for example of a worker process
+
+        @type other: VoxelizeStats
+        """
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] += seconds
+        self.add(**other.counts)
+
+    def format(self):
+        """
+        Summary with one line per stage and counter
+
+        @rtype: str
+        """
+        total = sum(self.seconds.values())
+        lines = []
+        for stage in self.stages:
+            share = 100. * self.seconds[stage] / total if total else 0.
+            lines.append("{:<11} {:>10.3f} s {:>5.1f}%".format(stage, self.seconds[stage], share))
+        for name in self.counters:
+            lines.append("{:<11} {:>12d}".format(name, self.counts[name]))
+        return "\n".join(lines)
+
+
+# shared by all stages while not profiling
+_no_measure = nullcontext()
+
+
+def measure(stats, stage):
+    """
+    Time a block if profiling, see 'VoxelizeStats.measure'
+
+    @type stats: VoxelizeStats | None
+    @type stage: str
+    """
+    if stats is None:
+        return _no_measure
+    return stats.measure(stage)
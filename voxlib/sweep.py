@@ -0,0 +1,162 @@
+import numpy as np
+
+from .voxelintersect.batch import t_c_intersection_cells
+
+# slack of the analytic row intervals, only widens the cells that are tested anyway
+_tolerance = 1e-9
+
+
+def _cross_2d(origin, a, b):
+    """
+    Signed area spanned by two points relative to an origin, in the yz plane
+
+    @type origin: numpy.ndarray
+    @type a: numpy.ndarray
+    @type b: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    return (a[..., 1] - origin[..., 1]) * (b[..., 2] - origin[..., 2]) - \
+        (a[..., 2] - origin[..., 2]) * (b[..., 1] - origin[..., 1])
+
+
+def get_row_intervals(vertices, row_y, row_z):
+    """
+    Exact extent of the part of a triangle inside the voxel row y <= Y <= y + 1, z <= Z <= z + 1.
+    That part is a convex polygon, its corners are the triangle vertexes inside the row,
+    the crossings of the triangle edges with the four row planes
+    and the crossings of the four row edges with the triangle plane.
+
+    @param vertices: one triangle per row, array of shape (R, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param row_y: y position of each row
+    @type row_y: numpy.ndarray
+    @param row_z: z position of each row
+    @type row_z: numpy.ndarray
+
+    @return: minimum and maximum corner of the polygon of each row, of shape (R, 3), NaN if the row is missed
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    row_count = len(vertices)
+    lower = np.column_stack((row_y, row_z)).astype(np.float64)[:, None, :]
+    upper = lower + 1
+    corners = [vertices]
+
+    # triangle edges crossing the planes of the row
+    start = vertices
+    direction = np.roll(vertices, -1, axis=1) - vertices
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for axis in (1, 2):
+            for bound in (lower, upper):
+                factor = (bound[..., axis - 1] - start[..., axis]) / direction[..., axis]
+                factor[(factor < 0) | (factor > 1)] = np.nan
+                corners.append(start + factor[..., None] * direction)
+
+        # row edges crossing the triangle plane, if they pass through the triangle seen along the x axis
+        vertex_a, vertex_b, vertex_c = vertices[:, 0], vertices[:, 1], vertices[:, 2]
+        normal = np.cross(vertex_b - vertex_a, vertex_c - vertex_a)
+        offset = np.einsum('ij,ij->i', normal, vertex_a)
+        area = _cross_2d(vertex_a, vertex_b, vertex_c)
+        for y in (lower[:, 0, 0], upper[:, 0, 0]):
+            for z in (lower[:, 0, 1], upper[:, 0, 1]):
+                corner = np.column_stack(((offset - normal[:, 1] * y - normal[:, 2] * z) / normal[:, 0], y, z))
+                weight_a = _cross_2d(corner, vertex_b, vertex_c) * area
+                weight_b = _cross_2d(corner, vertex_c, vertex_a) * area
+                weight_c = _cross_2d(corner, vertex_a, vertex_b) * area
+                is_outside = (weight_a < 0) | (weight_b < 0) | (weight_c < 0) | (area == 0)
+                corner[is_outside] = np.nan
+                corners.append(corner[:, None, :])
+
+    corners = np.concatenate(corners, axis=1)
+    is_outside = np.any(corners[:, :, 1:] < lower - _tolerance, axis=2)
+    is_outside |= np.any(corners[:, :, 1:] > upper + _tolerance, axis=2)
+    corners[is_outside] = np.nan
+    minimum = np.full((row_count, 3), np.nan)
+    maximum = np.full((row_count, 3), np.nan)
+    is_hit = ~np.all(np.isnan(corners[:, :, 0]), axis=1)
+    minimum[is_hit] = np.nanmin(corners[is_hit], axis=1)
+    maximum[is_hit] = np.nanmax(corners[is_hit], axis=1)
+    return minimum, maximum
+
+
+def _expand_ranges(starts, counts):
+    """
+    Concatenated integer ranges
+
+    @type starts: numpy.ndarray
+    @type counts: numpy.ndarray
+
+    @return: index of the range and value of each element
+    @rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    counts = np.maximum(counts, 0)
+    index = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return index, starts[index] + np.arange(len(index)) - first[index]
+
+
+def iter_row_voxels(vertices, max_rows=2**16, x_range=None, backend=None):
+    """
+    Intersect triangles with voxels row by row instead of testing every voxel of their bounding boxes.
+    For every row of voxels along the x axis inside the integer bounding box of a triangle,
+    the x interval of the triangle is computed from the plane and edge equations.
+    Voxels strictly inside the interval intersect the triangle, only the voxels at both ends of it,
+    and all voxels of rows the triangle only touches, go through the triangle cube test.
+    Positions may repeat, within a chunk as well as across chunks.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param max_rows: number of rows handled at a time
+    @type max_rows: int
+    @param x_range: only voxels with start <= x < stop are tested
+    @type x_range: (int, int) | None
+    @param backend: implementation of the triangle cube test, see 'get_backend'
+    @type backend: str | None
+
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    lower = np.floor(vertices.min(axis=1)).astype(np.int64)
+    upper = np.floor(vertices.max(axis=1)).astype(np.int64)
+    if x_range is not None:
+        np.maximum(lower[:, 0], x_range[0], out=lower[:, 0])
+        np.minimum(upper[:, 0], x_range[1] - 1, out=upper[:, 0])
+    extent = np.maximum(upper - lower + 1, 0)
+    extent[extent[:, 0] == 0] = 0
+    counts = extent[:, 1] * extent[:, 2]
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    for start in range(0, total, max_rows):
+        rows = np.arange(start, min(start + max_rows, total), dtype=np.int64)
+        triangle_index = np.searchsorted(ends, rows, side='right')
+        offset = rows - (ends[triangle_index] - counts[triangle_index])
+        row_y = lower[triangle_index, 1] + offset // extent[triangle_index, 2]
+        row_z = lower[triangle_index, 2] + offset % extent[triangle_index, 2]
+        minimum, maximum = get_row_intervals(vertices[triangle_index], row_y, row_z)
+
+        is_hit = ~np.isnan(minimum[:, 0])
+        triangle_index, row_y, row_z = triangle_index[is_hit], row_y[is_hit], row_z[is_hit]
+        minimum, maximum = minimum[is_hit], maximum[is_hit]
+        first = np.floor(minimum[:, 0]).astype(np.int64)
+        last = np.floor(maximum[:, 0]).astype(np.int64)
+        is_flat = np.any(maximum[:, 1:] - minimum[:, 1:] <= _tolerance, axis=1)
+
+        x_lower = lower[triangle_index, 0]
+        x_upper = upper[triangle_index, 0]
+
+        # voxels between the two ends of an interval contain a point of the triangle
+        inner_first = np.maximum(first + 1, x_lower)
+        inner_last = np.minimum(np.where(is_flat, first, last - 1), x_upper)
+        row_index, inner_x = _expand_ranges(inner_first, inner_last - inner_first + 1)
+        inner = np.column_stack((inner_x, row_y[row_index], row_z[row_index]))
+
+        # the ends of an interval and their neighbours go through the cube test,
+        # all voxels of a row do if the triangle only touches it
+        row_index, tested_x = _expand_ranges(first - 1, np.where(is_flat, last - first + 3, 2))
+        end_index, end_x = _expand_ranges(last, np.where(is_flat, 0, 2))
+        row_index = np.concatenate((row_index, end_index))
+        tested_x = np.concatenate((tested_x, end_x))
+        is_in_box = (tested_x >= x_lower[row_index]) & (tested_x <= x_upper[row_index])
+        row_index, tested_x = row_index[is_in_box], tested_x[is_in_box]
+        tested = np.column_stack((tested_x, row_y[row_index], row_z[row_index]))
+        is_inside = t_c_intersection_cells(vertices, triangle_index[row_index], tested, backend)
+        yield np.concatenate((inner, tested[is_inside]))
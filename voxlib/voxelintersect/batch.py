@@ -0,0 +1,288 @@
+import numpy as np
+
+from .triangle import EPS, get_backend, t_c_intersection_cells_c
+
+"""
+    Vectorized version of the triangle cube intersection test in 'triangle.py'.
+    Every function works on whole arrays of points or triangles at once and
+    mirrors the logic of its scalar counterpart, so results are identical.
+"""
+
+
+def _sign3(points):
+    """
+    Vectorized 'sign3'
+
+    @type points: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    sign_code = np.zeros(points.shape[:-1], dtype=np.uint32)
+    sign_code |= (points[..., 0] < EPS) * np.uint32(4)
+    sign_code |= (points[..., 0] > -EPS) * np.uint32(32)
+    sign_code |= (points[..., 1] < EPS) * np.uint32(2)
+    sign_code |= (points[..., 1] > -EPS) * np.uint32(16)
+    sign_code |= (points[..., 2] < EPS) * np.uint32(1)
+    sign_code |= (points[..., 2] > -EPS) * np.uint32(8)
+    return sign_code
+
+
+def _cross_product(a, b):
+    """
+    Vectorized 'cross_product', same order of operations
+
+    @type a: numpy.ndarray
+    @type b: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    result = np.empty(np.broadcast(a, b).shape, dtype=np.float64)
+    result[..., 0] = a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1]
+    result[..., 1] = -a[..., 0] * b[..., 2] + a[..., 2] * b[..., 0]
+    result[..., 2] = a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+    return result
+
+
+def face_plane_batch(points):
+    """
+    Which of the six face-plane(s) are points outside of?
+
+    @type points: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    code = np.zeros(points.shape[:-1], dtype=np.uint32)
+    code |= (x >= .5) * np.uint32(0x01)
+    code |= (x < -.5) * np.uint32(0x02)
+    code |= (y >= .5) * np.uint32(0x04)
+    code |= (y < -.5) * np.uint32(0x08)
+    code |= (z >= .5) * np.uint32(0x10)
+    code |= (z < -.5) * np.uint32(0x20)
+    return code
+
+
+def bevel_2d_batch(points):
+    """
+    Which of the twelve edge plane(s) are points outside of?
+
+    @type points: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    code = np.zeros(points.shape[:-1], dtype=np.uint32)
+    code |= (x + y >= 1.0) * np.uint32(0x001)
+    code |= (x - y >= 1.0) * np.uint32(0x002)
+    code |= (-x + y > 1.0) * np.uint32(0x004)
+    code |= (-x - y > 1.0) * np.uint32(0x008)
+
+    code |= (x + z >= 1.0) * np.uint32(0x010)
+    code |= (x - z >= 1.0) * np.uint32(0x020)
+    code |= (-x + z > 1.0) * np.uint32(0x040)
+    code |= (-x - z > 1.0) * np.uint32(0x080)
+
+    code |= (y + z >= 1.0) * np.uint32(0x100)
+    code |= (y - z >= 1.0) * np.uint32(0x200)
+    code |= (-y + z > 1.0) * np.uint32(0x400)
+    code |= (-y - z > 1.0) * np.uint32(0x800)
+    return code
+
+
+def bevel_3d_batch(points):
+    """
+    Which of the eight corner plane(s) are points outside of?
+
+    @type points: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    code = np.zeros(points.shape[:-1], dtype=np.uint32)
+    code |= ((x + y + z) >= 1.5) * np.uint32(0x01)
+    code |= ((x + y - z) >= 1.5) * np.uint32(0x02)
+    code |= ((x - y + z) >= 1.5) * np.uint32(0x04)
+    code |= ((x - y - z) >= 1.5) * np.uint32(0x08)
+    code |= ((-x + y + z) > 1.5) * np.uint32(0x10)
+    code |= ((-x + y - z) > 1.5) * np.uint32(0x20)
+    code |= ((-x - y + z) > 1.5) * np.uint32(0x40)
+    code |= ((-x - y - z) > 1.5) * np.uint32(0x80)
+    return code
+
+
+_check_line_planes = (
+    # (outcode bit, axis, plane, face mask)
+    (0x01, 0, 0.5, 0x3e),
+    (0x02, 0, -0.5, 0x3d),
+    (0x04, 1, 0.5, 0x3b),
+    (0x08, 1, -0.5, 0x37),
+    (0x10, 2, 0.5, 0x2f),
+    (0x20, 2, -0.5, 0x1f),
+    )
+
+
+def check_line_batch(points_a, points_b, outcode_diff):
+    """
+    Vectorized 'check_line'.
+    Returns True where the line segment a --> b intersects a cube face.
+
+    @param points_a: array of shape (N, 3)
+    @type points_a: numpy.ndarray
+    @param points_b: array of shape (N, 3)
+    @type points_b: numpy.ndarray
+    @type outcode_diff: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    is_inside = np.zeros(outcode_diff.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for bit, axis, plane, mask in _check_line_planes:
+            selected = np.flatnonzero(~is_inside & ((outcode_diff & bit) != 0))
+            if len(selected) == 0:
+                continue
+            point_a, point_b = points_a[selected], points_b[selected]
+            alpha = (plane - point_a[:, axis]) / (point_b[:, axis] - point_a[:, axis])
+            plane_points = point_a + alpha[:, None] * (point_b - point_a)
+            is_inside[selected] = (face_plane_batch(plane_points) & mask) == 0
+    return is_inside
+
+
+def point_triangle_intersection_batch(points, triangles):
+    """
+    Vectorized 'point_triangle_intersection'.
+    Returns True where a 3D point is inside its 3D triangle.
+
+    @type points: numpy.ndarray
+    @type triangles: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    is_inside = np.all(points <= triangles.max(axis=-2) + EPS, axis=-1)
+    is_inside &= np.all(points >= triangles.min(axis=-2) - EPS, axis=-1)
+
+    v1, v2, v3 = triangles[..., 0, :], triangles[..., 1, :], triangles[..., 2, :]
+    sign12 = _sign3(_cross_product(v1 - v2, v1 - points))
+    sign23 = _sign3(_cross_product(v2 - v3, v2 - points))
+    sign31 = _sign3(_cross_product(v3 - v1, v3 - points))
+    is_inside &= (sign12 & sign23 & sign31) != 0
+    return is_inside
+
+
+_diagonals = np.array([
+    [1., 1., 1.],
+    [1., 1., -1.],
+    [1., -1., 1.],
+    [1., -1., -1.],
+    ])
+
+
+def t_c_intersection_batch(triangles):
+    """
+    Vectorized 't_c_intersection'.
+    Each triangle is compared with a unit cube centered on the origin.
+
+    @param triangles: array of shape (N, 3, 3), vertexes relative to the cube center
+    @type triangles: numpy.ndarray
+
+    @return: boolean mask of shape (N, ), True where a triangle intersects the cube
+    @rtype: numpy.ndarray
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    v1, v2, v3 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+
+    # vertex inside the cube
+    v1_test = face_plane_batch(v1)
+    v2_test = face_plane_batch(v2)
+    v3_test = face_plane_batch(v3)
+    is_inside = (v1_test == 0) | (v2_test == 0) | (v3_test == 0)
+
+    # trivial rejection against the face planes,
+    # continue with the triangles not decided yet
+    index = np.flatnonzero(~is_inside & ((v1_test & v2_test & v3_test) == 0))
+    if len(index) == 0:
+        return is_inside
+    triangles = triangles[index]
+    v1, v2, v3 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    v1_test, v2_test, v3_test = v1_test[index], v2_test[index], v3_test[index]
+
+    # trivial rejections against edge and corner planes
+    v1_test |= bevel_2d_batch(v1) << 8
+    v2_test |= bevel_2d_batch(v2) << 8
+    v3_test |= bevel_2d_batch(v3) << 8
+    v1_test |= bevel_3d_batch(v1) << 24
+    v2_test |= bevel_3d_batch(v2) << 24
+    v3_test |= bevel_3d_batch(v3) << 24
+    is_candidate = (v1_test & v2_test & v3_test) == 0
+    if not is_candidate.any():
+        return is_inside
+    index = index[is_candidate]
+    triangles = triangles[is_candidate]
+    v1, v2, v3 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    v1_test, v2_test, v3_test = v1_test[is_candidate], v2_test[is_candidate], v3_test[is_candidate]
+
+    # triangle edges penetrating the cube
+    is_hit = check_line_batch(v1, v2, np.where((v1_test & v2_test) == 0, v1_test | v2_test, 0))
+    is_hit |= check_line_batch(v1, v3, np.where((v1_test & v3_test) == 0, v1_test | v3_test, 0))
+    is_hit |= check_line_batch(v2, v3, np.where((v2_test & v3_test) == 0, v2_test | v3_test, 0))
+
+    # cube diagonals penetrating the triangle
+    norm = _cross_product(v1 - v2, v1 - v3)
+    d = norm[:, 0] * v1[:, 0] + norm[:, 1] * v1[:, 1] + norm[:, 2] * v1[:, 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for diagonal in _diagonals:
+            denom = norm[:, 0] + diagonal[1] * norm[:, 1] + diagonal[2] * norm[:, 2]
+            distance = d / denom
+            selected = ~is_hit & (np.abs(denom) > EPS) & (np.abs(distance) <= 0.5)
+            if not selected.any():
+                continue
+            hit_points = distance[selected, None] * diagonal
+            is_hit[selected] = point_triangle_intersection_batch(hit_points, triangles[selected])
+
+    is_inside[index] = is_hit
+    return is_inside
+
+
+def t_c_intersection_centers(triangle, centers):
+    """
+    Test one triangle against many unit cubes.
+
+    @param triangle: array of shape (3, 3)
+    @type triangle: numpy.ndarray
+    @param centers: array of shape (M, 3), cube centers
+    @type centers: numpy.ndarray
+
+    @return: boolean mask of shape (M, ), True where the triangle intersects a cube
+    @rtype: numpy.ndarray
+    """
+    triangle = np.asarray(triangle, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    return t_c_intersection_batch(triangle[None, :, :] - centers[:, None, :])
+
+
+def t_c_intersection_cells(vertices, triangle_index, positions, backend=None):
+    """
+    Test voxels against triangles with the implementation of 'backend'.
+    The library and numba compute in single precision, results can differ from 'python' for voxels touching a triangle.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param triangle_index: triangle of each voxel
+    @type triangle_index: numpy.ndarray
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+    @param backend: 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+
+    @return: boolean mask of shape (K, ), True where a voxel intersects its triangle
+    @rtype: numpy.ndarray
+    """
+    backend = get_backend(backend)
+    if backend == 'c':
+        return t_c_intersection_cells_c(vertices, triangle_index, positions)
+    if backend == 'numba':
+        from . import jit
+        return jit.t_c_intersection_cells(
+            np.ascontiguousarray(vertices, dtype=np.float64),
+            np.ascontiguousarray(triangle_index, dtype=np.int64),
+            np.ascontiguousarray(positions, dtype=np.int64))
+    return t_c_intersection_batch(vertices[triangle_index] - (positions + 0.5)[:, None, :])
@@ -0,0 +1,394 @@
+import numpy as np
+from numba import njit, prange, get_num_threads
+
+from .triangle import EPS
+
+"""
+    Triangle cube intersection test of 'triangleCube.c' compiled with numba, for setups without a C compiler.
+    Like the library, the test runs in single precision and moves the triangle to the cube center
+    in double precision, so results match the library exactly.
+    Compiled code is cached on disk, only the first import in an environment pays for the compilation.
+
+    Also like the library, 'SIGN3' only compares the sign of the x component of the cross products,
+    its conditional operators take precedence over the '|' meant to combine the components.
+"""
+
+_float = np.float32
+_sign_y = (_float(1), _float(1), _float(-1), _float(-1))
+_sign_z = (_float(1), _float(-1), _float(1), _float(-1))
+
+# voxel positions are hashed into one integer, valid for coordinates between -2**20 and 2**20
+_key_offset = 2**20
+_key_bits = 21
+
+# candidates tested at a time, a triangle is prepared again for each block
+_block_size = 1024
+
+# blocks of triangles flood filled per thread, to balance triangles of different sizes
+_blocks_per_thread = 8
+
+
+@njit(cache=True)
+def _sub(a, b):
+    return _float(a[0] - b[0]), _float(a[1] - b[1]), _float(a[2] - b[2])
+
+
+@njit(cache=True)
+def _cross(a, b):
+    return (
+        a[1] * b[2] - a[2] * b[1],
+        -a[0] * b[2] + a[2] * b[0],
+        a[0] * b[1] - a[1] * b[0])
+
+
+@njit(cache=True)
+def _sign3(point):
+    if point[0] < EPS:
+        return 4
+    return 32
+
+
+@njit(cache=True)
+def _face_plane(point):
+    code = 0
+    if point[0] >= .5:
+        code |= 0x01
+    if point[0] < -.5:
+        code |= 0x02
+    if point[1] >= .5:
+        code |= 0x04
+    if point[1] < -.5:
+        code |= 0x08
+    if point[2] >= .5:
+        code |= 0x10
+    if point[2] < -.5:
+        code |= 0x20
+    return code
+
+
+@njit(cache=True)
+def _bevel_2d(point):
+    x, y, z = point
+    code = 0
+    if x + y >= 1.0:
+        code |= 0x001
+    if x - y >= 1.0:
+        code |= 0x002
+    if -x + y > 1.0:
+        code |= 0x004
+    if -x - y > 1.0:
+        code |= 0x008
+    if x + z >= 1.0:
+        code |= 0x010
+    if x - z >= 1.0:
+        code |= 0x020
+    if -x + z > 1.0:
+        code |= 0x040
+    if -x - z > 1.0:
+        code |= 0x080
+    if y + z >= 1.0:
+        code |= 0x100
+    if y - z >= 1.0:
+        code |= 0x200
+    if -y + z > 1.0:
+        code |= 0x400
+    if -y - z > 1.0:
+        code |= 0x800
+    return code
+
+
+@njit(cache=True)
+def _bevel_3d(point):
+    x, y, z = point
+    code = 0
+    if (x + y + z) >= 1.5:
+        code |= 0x01
+    if (x + y - z) >= 1.5:
+        code |= 0x02
+    if (x - y + z) >= 1.5:
+        code |= 0x04
+    if (x - y - z) >= 1.5:
+        code |= 0x08
+    if (-x + y + z) > 1.5:
+        code |= 0x10
+    if (-x + y - z) > 1.5:
+        code |= 0x20
+    if (-x - y + z) > 1.5:
+        code |= 0x40
+    if (-x - y - z) > 1.5:
+        code |= 0x80
+    return code
+
+
+@njit(cache=True, error_model='numpy')
+def _check_point(point_a, point_b, alpha, mask):
+    plane_point = (
+        point_a[0] + alpha * (point_b[0] - point_a[0]),
+        point_a[1] + alpha * (point_b[1] - point_a[1]),
+        point_a[2] + alpha * (point_b[2] - point_a[2]))
+    return _face_plane(plane_point) & mask
+
+
+@njit(cache=True, error_model='numpy')
+def _check_line(point_a, point_b, outcode_diff):
+    """
+    True if the line segment a --> b intersects a cube face
+    """
+    half = _float(0.5)
+    if (0x01 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (half - point_a[0]) / (point_b[0] - point_a[0]), 0x3e) == 0:
+            return True
+    if (0x02 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (-half - point_a[0]) / (point_b[0] - point_a[0]), 0x3d) == 0:
+            return True
+    if (0x04 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (half - point_a[1]) / (point_b[1] - point_a[1]), 0x3b) == 0:
+            return True
+    if (0x08 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (-half - point_a[1]) / (point_b[1] - point_a[1]), 0x37) == 0:
+            return True
+    if (0x10 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (half - point_a[2]) / (point_b[2] - point_a[2]), 0x2f) == 0:
+            return True
+    if (0x20 & outcode_diff) != 0:
+        if _check_point(point_a, point_b, (-half - point_a[2]) / (point_b[2] - point_a[2]), 0x1f) == 0:
+            return True
+    return False
+
+
+@njit(cache=True)
+def _prepare_triangle(vertices, index):
+    """
+    'prepare_triangle' of the library: vertexes and bounding box in double precision,
+    edges, normal and diagonal denominators in single precision
+    """
+    v1 = (vertices[index, 0, 0], vertices[index, 0, 1], vertices[index, 0, 2])
+    v2 = (vertices[index, 1, 0], vertices[index, 1, 1], vertices[index, 1, 2])
+    v3 = (vertices[index, 2, 0], vertices[index, 2, 1], vertices[index, 2, 2])
+    edges = (_sub(v1, v2), _sub(v2, v3), _sub(v3, v1))
+    norm = _cross(edges[0], _sub(v1, v3))
+    denominators = (
+        norm[0] + norm[1] + norm[2],
+        norm[0] + norm[1] - norm[2],
+        norm[0] - norm[1] + norm[2],
+        norm[0] - norm[1] - norm[2])
+    minimum = (min(v1[0], v2[0], v3[0]), min(v1[1], v2[1], v3[1]), min(v1[2], v2[2], v3[2]))
+    maximum = (max(v1[0], v2[0], v3[0]), max(v1[1], v2[1], v3[1]), max(v1[2], v2[2], v3[2]))
+    return (v1, v2, v3), edges, norm, denominators, minimum, maximum
+
+
+@njit(cache=True, error_model='numpy')
+def _point_triangle_intersection(point, triangle, prepared, center):
+    vertexes, edges, norm, denominators, minimum, maximum = prepared
+    for axis in range(3):
+        if point[axis] > maximum[axis] - center[axis] + EPS:
+            return False
+        if point[axis] < minimum[axis] - center[axis] - EPS:
+            return False
+    sign12 = _sign3(_cross(edges[0], _sub(triangle[0], point)))
+    sign23 = _sign3(_cross(edges[1], _sub(triangle[1], point)))
+    sign31 = _sign3(_cross(edges[2], _sub(triangle[2], point)))
+    return (sign12 & sign23 & sign31) != 0
+
+
+@njit(cache=True, error_model='numpy')
+def _t_c_intersection(prepared, center):
+    """
+    't_c_intersection_prepared' of the library, True if the triangle intersects the unit cube around center
+    """
+    vertexes, edges, norm, denominators, minimum, maximum = prepared
+    v1 = _sub(vertexes[0], center)
+    v2 = _sub(vertexes[1], center)
+    v3 = _sub(vertexes[2], center)
+
+    v1_test = _face_plane(v1)
+    v2_test = _face_plane(v2)
+    v3_test = _face_plane(v3)
+    if v1_test == 0 or v2_test == 0 or v3_test == 0:
+        return True
+    if (v1_test & v2_test & v3_test) != 0:
+        return False
+
+    v1_test |= _bevel_2d(v1) << 8
+    v2_test |= _bevel_2d(v2) << 8
+    v3_test |= _bevel_2d(v3) << 8
+    if (v1_test & v2_test & v3_test) != 0:
+        return False
+
+    v1_test |= _bevel_3d(v1) << 24
+    v2_test |= _bevel_3d(v2) << 24
+    v3_test |= _bevel_3d(v3) << 24
+    if (v1_test & v2_test & v3_test) != 0:
+        return False
+
+    if (v1_test & v2_test) == 0:
+        if _check_line(v1, v2, v1_test | v2_test):
+            return True
+    if (v1_test & v3_test) == 0:
+        if _check_line(v1, v3, v1_test | v3_test):
+            return True
+    if (v2_test & v3_test) == 0:
+        if _check_line(v2, v3, v2_test | v3_test):
+            return True
+
+    d = norm[0] * v1[0] + norm[1] * v1[1] + norm[2] * v1[2]
+    for index in range(4):
+        if abs(denominators[index]) <= EPS:
+            continue
+        distance = d / denominators[index]
+        if abs(distance) > 0.5:
+            continue
+        hit = (distance, _sign_y[index] * distance, _sign_z[index] * distance)
+        if _point_triangle_intersection(hit, (v1, v2, v3), prepared, center):
+            return True
+    return False
+
+
+@njit(parallel=True, cache=True, error_model='numpy')
+def t_c_intersection_cells(vertices, triangle_index, positions):
+    """
+    Same as 't_c_intersection_cells' of the library, blocks of candidates are tested in parallel
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param triangle_index: triangle of each voxel
+    @type triangle_index: numpy.ndarray
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+
+    @return: boolean mask of shape (K, ), True where a voxel intersects its triangle
+    @rtype: numpy.ndarray
+    """
+    count = len(positions)
+    hits = np.zeros(count, dtype=np.bool_)
+    for block in prange((count + _block_size - 1) // _block_size):
+        current = triangle_index[block * _block_size]
+        prepared = _prepare_triangle(vertices, current)
+        for index in range(block * _block_size, min(count, (block + 1) * _block_size)):
+            if triangle_index[index] != current:
+                current = triangle_index[index]
+                prepared = _prepare_triangle(vertices, current)
+            center = (positions[index, 0] + 0.5, positions[index, 1] + 0.5, positions[index, 2] + 0.5)
+            hits[index] = _t_c_intersection(prepared, center)
+    return hits
+
+
+@njit(cache=True)
+def _to_key(x, y, z):
+    return ((x + _key_offset) << (2 * _key_bits)) | ((y + _key_offset) << _key_bits) | (z + _key_offset)
+
+
+@njit(cache=True)
+def _from_key(key):
+    mask = (1 << _key_bits) - 1
+    return (key >> (2 * _key_bits)) - _key_offset, ((key >> _key_bits) & mask) - _key_offset, (key & mask) - _key_offset
+
+
+@njit(cache=True)
+def _append(output, count, x, y, z):
+    """
+    Write a position at 'count', the buffer doubles in size when it is full
+
+    @rtype: numpy.ndarray
+    """
+    if count == len(output):
+        grown = np.empty((2 * len(output), 3), dtype=np.int64)
+        grown[:count] = output
+        output = grown
+    output[count, 0] = x
+    output[count, 1] = y
+    output[count, 2] = z
+    return output
+
+
+@njit(cache=True, error_model='numpy')
+def _flood_fill(vertices, index, output, count):
+    """
+    Depth first search of 'get_intersecting_voxels_depth_first' for one triangle
+
+    @return: buffer with the intersecting voxels appended from 'count' on, and the new count
+    @rtype: (numpy.ndarray, int)
+    """
+    prepared = _prepare_triangle(vertices, index)
+    vertexes = prepared[0]
+    searched = {_to_key(0, 0, 0)}
+    searched.clear()
+    stack = [_to_key(0, 0, 0)]
+    stack.pop()
+    seed_x, seed_y, seed_z = int(vertexes[0][0]), int(vertexes[0][1]), int(vertexes[0][2])
+    for x in range(-1, 2):
+        for y in range(-1, 2):
+            for z in range(-1, 2):
+                stack.append(_to_key(seed_x + x, seed_y + y, seed_z + z))
+
+    while len(stack) > 0:
+        key = stack.pop()
+        if key in searched:
+            continue
+        searched.add(key)
+        x, y, z = _from_key(key)
+        center = (x + 0.5, y + 0.5, z + 0.5)
+        if not _t_c_intersection(prepared, center):
+            continue
+        output = _append(output, count, x, y, z)
+        count += 1
+
+        # neighbours the triangle may continue into, see 'get_neighbours'
+        for axis in range(3):
+            relative_2 = vertexes[1][axis] - center[axis]
+            relative_3 = vertexes[2][axis] - center[axis]
+            if relative_2 < 0:
+                steps = (-1, 1 if relative_3 > 0 else 0)
+            else:
+                steps = (1, -1 if relative_3 < 0 else 0)
+            for step in steps:
+                if step == 0:
+                    continue
+                if axis == 0:
+                    neighbour = _to_key(x + step, y, z)
+                elif axis == 1:
+                    neighbour = _to_key(x, y + step, z)
+                else:
+                    neighbour = _to_key(x, y, z + step)
+                if neighbour not in searched:
+                    stack.append(neighbour)
+    return output, count
+
+
+@njit(parallel=True, cache=True, error_model='numpy')
+def _flood_fill_blocks(vertices, block_count):
+    """
+    Depth first search of every triangle, blocks of triangles are searched in parallel.
+    Each block collects its voxels in its own buffer, the buffers are joined at the end.
+
+    @return: voxel positions of shape (K, 3), positions of different triangles may repeat
+    @rtype: numpy.ndarray
+    """
+    triangle_count = len(vertices)
+    buffers = [np.empty((0, 3), dtype=np.int64) for _ in range(block_count)]
+    counts = np.zeros(block_count, dtype=np.int64)
+    for block in prange(block_count):
+        output = np.empty((64, 3), dtype=np.int64)
+        count = 0
+        for index in range(block * triangle_count // block_count, (block + 1) * triangle_count // block_count):
+            output, count = _flood_fill(vertices, index, output, count)
+        buffers[block] = output
+        counts[block] = count
+    offsets = np.cumsum(counts) - counts
+    positions = np.empty((counts.sum(), 3), dtype=np.int64)
+    for block in prange(block_count):
+        positions[offsets[block]:offsets[block] + counts[block]] = buffers[block][:counts[block]]
+    return positions
+
+
+def get_intersecting_voxels_depth_first(vertices):
+    """
+    Depth first search of every triangle, triangles are searched in parallel
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+
+    @return: voxel positions of shape (K, 3), positions of different triangles may repeat
+    @rtype: numpy.ndarray
+    """
+    return _flood_fill_blocks(vertices, min(len(vertices), get_num_threads() * _blocks_per_thread))
@@ -0,0 +1,134 @@
+import numpy as np
+from .triangle import triangle_lib
+
+"""
+    Triangle voxel overlap tests with a per triangle setup, after
+    Schwarz and Seidel 2010, 'Fast parallel surface and solid voxelization on GPUs'.
+    A voxel at position p covers [p, p + 1) along each axis, like with the cube test.
+
+    '26-separating': the triangle overlaps the voxel, same voxels as the conservative cube test.
+    '6-separating': the triangle overlaps the diamond inside the voxel spanned by its face centers,
+    a thinner surface without holes along the axes.
+"""
+
+separating_modes = ('26-separating', '6-separating')
+
+# the far side of a voxel is open, it ends just before the next voxel starts
+_voxel_size = 1 - 1e-9
+
+# axes of the projections onto the xy, yz and zx planes and the axis each is seen along
+_projections = ((0, 1), (1, 2), (2, 0))
+_view_axes = (2, 0, 1)
+
+
+def _dot_rows(a, b):
+    """
+    Dot products of the rows of two arrays, summed in the same order as the library
+
+    @type a: numpy.ndarray
+    @type b: numpy.ndarray
+    @rtype: numpy.ndarray
+    """
+    return a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1] + a[:, 2] * b[:, 2]
+
+
+def prepare_triangles(vertices, mode='26-separating'):
+    """
+    Everything the overlap test needs that only depends on the triangle
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param mode: '26-separating' or '6-separating'
+    @type mode: str
+
+    @return: integer bounding box (N, 2, 3), plane normals (N, 3), two plane offsets (N, 2),
+        normals (N, 3, 3, 2) and offsets (N, 3, 3) of the edges of each projection
+    @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    assert mode in separating_modes, "Unknown mode: {}".format(mode)
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    # like with the cube test, only voxels of the integer bounding box are candidates
+    bounds = np.floor(np.stack((vertices.min(axis=1), vertices.max(axis=1)), axis=1))
+    edges = np.roll(vertices, -1, axis=1) - vertices
+    normal = np.cross(edges[:, 0], edges[:, 1])
+    if mode == '26-separating':
+        # the plane separates the corners of the voxel closest and farthest along the normal
+        critical = (normal > 0) * _voxel_size
+        plane_offsets = np.column_stack((
+            _dot_rows(normal, critical - vertices[:, 0]),
+            _dot_rows(normal, _voxel_size - critical - vertices[:, 0])))
+    else:
+        # the plane runs closer to the voxel center than the support of the diamond
+        center_distance = _dot_rows(normal, 0.5 - vertices[:, 0])
+        radius = 0.5 * np.abs(normal).max(axis=1)
+        plane_offsets = np.column_stack((center_distance - radius, center_distance + radius))
+
+    edge_normals = np.empty((len(vertices), 3, 3, 2))
+    edge_offsets = np.empty((len(vertices), 3, 3))
+    for index, ((a, b), view_axis) in enumerate(zip(_projections, _view_axes)):
+        orientation = np.where(normal[:, view_axis] < 0, -1.0, 1.0)[:, None]
+        normals = np.stack((-edges[:, :, b] * orientation, edges[:, :, a] * orientation), axis=-1)
+        points = vertices[:, :, (a, b)]
+        if mode == '26-separating':
+            offsets = -np.einsum('ijk,ijk->ij', normals, points) + np.maximum(normals, 0).sum(axis=-1) * _voxel_size
+        else:
+            offsets = np.einsum('ijk,ijk->ij', normals, 0.5 - points) + 0.5 * np.abs(normals).max(axis=-1)
+        edge_normals[:, index] = normals
+        edge_offsets[:, index] = offsets
+    return bounds, normal, plane_offsets, edge_normals, edge_offsets
+
+
+def get_overlaps(setup, triangle_index, positions):
+    """
+    Vectorized overlap test of voxels with prepared triangles
+
+    @param setup: result of 'prepare_triangles'
+    @type setup: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    @param triangle_index: triangle of each voxel
+    @type triangle_index: numpy.ndarray
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+
+    @rtype: numpy.ndarray
+    """
+    bounds, normal, plane_offsets, edge_normals, edge_offsets = setup
+    positions = positions.astype(np.float64)
+    is_inside = np.all((positions >= bounds[triangle_index, 0]) & (positions <= bounds[triangle_index, 1]), axis=1)
+    distance = _dot_rows(normal[triangle_index], positions)
+    offsets = plane_offsets[triangle_index]
+    is_inside &= (distance + offsets[:, 0]) * (distance + offsets[:, 1]) <= 0
+    for index, (a, b) in enumerate(_projections):
+        normals = edge_normals[triangle_index, index]
+        value = normals[:, :, 0] * positions[:, a, None] + normals[:, :, 1] * positions[:, b, None]
+        is_inside &= np.all(value + edge_offsets[triangle_index, index] >= 0, axis=1)
+    return is_inside
+
+
+def get_overlaps_c(vertices, triangle_index, positions, mode='26-separating'):
+    """
+    'prepare_triangles' and 'get_overlaps' with the library in a single call,
+    each triangle is prepared once per run of its voxels.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param triangle_index: triangle of each voxel, best in runs of the same triangle
+    @type triangle_index: numpy.ndarray
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+    @param mode: '26-separating' or '6-separating'
+    @type mode: str
+
+    @rtype: numpy.ndarray
+    """
+    assert mode in separating_modes, "Unknown mode: {}".format(mode)
+    assert len(triangle_index) == len(positions), "Every voxel needs a triangle"
+    hits = np.empty(len(positions), dtype=np.uint8)
+    triangle_lib.separating_cells(
+        np.ascontiguousarray(vertices, dtype=np.float64),
+        np.ascontiguousarray(triangle_index, dtype=np.int64),
+        np.ascontiguousarray(positions, dtype=np.int64),
+        len(positions),
+        26 if mode == '26-separating' else 6,
+        hits)
+    return hits.view(bool)
+
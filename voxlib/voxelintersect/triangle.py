@@ -1,7 +1,11 @@
 import sys
 import os
+import warnings
 import numpy as np
-from ctypes import cdll, Structure, c_float
+from ctypes import cdll, byref, Structure, POINTER, c_float, c_double, c_int64
+from importlib.machinery import EXTENSION_SUFFIXES
+from importlib.util import find_spec
+from numpy.ctypeslib import ndpointer
 
 
 class Point3(Structure):
@@ -20,19 +24,117 @@ class Triangle3(Structure):
         ]
 
 
-triangle_lib = None
-script_dir = os.path.dirname(os.path.realpath(__file__))
-try:
+class Point3d(Structure):
+    _fields_ = [
+        ("x", c_double),
+        ("y", c_double),
+        ("z", c_double)
+        ]
+
+
+class PreparedTriangle3(Structure):
+    """
+    C counterpart of 'PreparedTriangle', filled by 'prepare_triangle' of the library
+    """
+    _fields_ = [
+        ("v1", Point3d),
+        ("v2", Point3d),
+        ("v3", Point3d),
+        ("norm", Point3),
+        ("denom", c_float * 4),
+        ("edge", Point3 * 3),
+        ("min", Point3d),
+        ("max", Point3d)
+        ]
+
+
+# functions a library needs, libraries built by older versions lack some of them
+library_functions = (
+    't_c_intersection', 'prepare_triangle', 't_c_intersection_prepared', 't_c_intersection_cells', 'separating_cells')
+
+
+def get_library_paths():
+    """
+    Candidate paths of the compiled 'triangleCube.c', the extension built by 'setup.py' first,
+    then libraries built by hand
+
+    @rtype: list[str]
+    """
+    file_paths = [os.path.join(script_dir, 'triangleCube' + suffix) for suffix in EXTENSION_SUFFIXES]
     if sys.platform.startswith('linux') and sys.maxsize == 9223372036854775807:
-        file_path_library = os.path.join(script_dir, 'triangleCube_linux64.so')
-        if os.path.exists(file_path_library):
-            triangle_lib = cdll.LoadLibrary(file_path_library)
+        file_paths.append(os.path.join(script_dir, 'triangleCube_linux64.so'))
     elif sys.platform.startswith("win") and sys.maxsize == 2147483647:
-        file_path_library = os.path.join(script_dir, 'triangleCube_win32.so')
-        if os.path.exists(file_path_library):
-            triangle_lib = cdll.LoadLibrary(file_path_library)
-except OSError:
-    triangle_lib = None
+        file_paths.append(os.path.join(script_dir, 'triangleCube_win32.so'))
+    return [file_path for file_path in file_paths if os.path.exists(file_path)]
+
+
+def load_library():
+    """
+    Load the first usable compiled 'triangleCube.c', warn if there is none
+
+    @return: library or None
+    @rtype: ctypes.CDLL | None
+    """
+    for file_path in get_library_paths():
+        try:
+            library = cdll.LoadLibrary(file_path)
+        except OSError as error:
+            warnings.warn("Could not load '{}': {}".format(file_path, error), RuntimeWarning)
+            continue
+        missing = [name for name in library_functions if not hasattr(library, name)]
+        if missing:
+            warnings.warn(
+                "'{}' is outdated, it lacks {}. Rebuild it with 'python setup.py build_ext --inplace'".format(
+                    file_path, ", ".join(missing)), RuntimeWarning)
+            continue
+        library.prepare_triangle.argtypes = [ndpointer(np.float64, flags='C_CONTIGUOUS'), POINTER(PreparedTriangle3)]
+        library.prepare_triangle.restype = None
+        library.t_c_intersection_cells.argtypes = [
+            ndpointer(np.float64, flags='C_CONTIGUOUS'),
+            ndpointer(np.int64, flags='C_CONTIGUOUS'),
+            ndpointer(np.int64, flags='C_CONTIGUOUS'),
+            c_int64,
+            ndpointer(np.uint8, flags='C_CONTIGUOUS')]
+        library.t_c_intersection_cells.restype = c_int64
+        library.separating_cells.argtypes = [
+            ndpointer(np.float64, flags='C_CONTIGUOUS'),
+            ndpointer(np.int64, flags='C_CONTIGUOUS'),
+            ndpointer(np.int64, flags='C_CONTIGUOUS'),
+            c_int64,
+            c_int64,
+            ndpointer(np.uint8, flags='C_CONTIGUOUS')]
+        library.separating_cells.restype = c_int64
+        return library
+    warnings.warn(
+        "No compiled triangle cube test found, falling back to the slower Python implementation. "
+        "Build it with 'python setup.py build_ext --inplace'", RuntimeWarning)
+    return None
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+triangle_lib = load_library()
+
+
+# implementations of the triangle cube test, 'numba' needs the optional numba package, see 'jit.py'
+backends = ('c', 'numba', 'python')
+
+
+def get_backend(backend=None):
+    """
+    Implementation of the triangle cube test to use
+
+    @param backend: 'c', 'numba' or 'python', None for the default
+    @type backend: str | None
+
+    @return: the backend, by default 'c' for the compiled library and 'python' if there is none
+    @rtype: str
+    """
+    if backend is None:
+        return 'python' if triangle_lib is None else 'c'
+    assert backend in backends, "Unknown backend: {}".format(backend)
+    assert backend != 'c' or triangle_lib is not None, "No compiled triangle cube test found"
+    assert backend != 'numba' or find_spec('numba') is not None, "The numba backend needs the numba package"
+    return backend
 
 
 """
@@ -309,30 +411,24 @@ def point_triangle_intersection(p, t):
     return INSIDE
 
 
-def t_c_intersection(triangle):
+def check_vertexes_and_edges(vertex_1, vertex_2, vertex_3):
     """
-    /**********************************************/
-    /* This is the main algorithm procedure.      */
-    /* Triangle t is compared with a unit cube,   */
-    /* centered on the origin.                    */
-    /* It returns INSIDE (0) or OUTSIDE(1) if t   */
-    /* intersects or does not intersect the cube. */
-    /**********************************************/
+    First part of 't_c_intersection', everything but the cube diagonals.
+    Returns INSIDE or OUTSIDE if that already decides the test, None otherwise.
 
-    @type triangle: Triangle
-    """
+    @type vertex_1: numpy.ndarray | (float, float, float)
+    @type vertex_2: numpy.ndarray | (float, float, float)
+    @type vertex_3: numpy.ndarray | (float, float, float)
 
-    # long v1_test,v2_test,v3_test;
-    # float d,denom;
-    # Point3 vect12,vect13,norm;
-    # Point3 hitpp,hitpn,hitnp,hitnn;
+    @rtype: int | None
+    """
 
     # /* First compare all three vertexes with all six face-planes */
     # /* If any vertex is inside the cube, return immediately!     */
 
-    v1_test = face_plane(triangle.v1)
-    v2_test = face_plane(triangle.v2)
-    v3_test = face_plane(triangle.v3)
+    v1_test = face_plane(vertex_1)
+    v2_test = face_plane(vertex_2)
+    v3_test = face_plane(vertex_3)
     if v1_test == INSIDE:
         return INSIDE
     if v2_test == INSIDE:
@@ -348,17 +444,17 @@ def t_c_intersection(triangle):
 
     # /* Now do the same trivial rejection test for the 12 edge planes */
 
-    v1_test |= bevel_2d(triangle.v1) << 8
-    v2_test |= bevel_2d(triangle.v2) << 8
-    v3_test |= bevel_2d(triangle.v3) << 8
+    v1_test |= bevel_2d(vertex_1) << 8
+    v2_test |= bevel_2d(vertex_2) << 8
+    v3_test |= bevel_2d(vertex_3) << 8
     if (v1_test & v2_test & v3_test) != INSIDE:
         return OUTSIDE
 
     # /* Now do the same trivial rejection test for the 8 corner planes */
 
-    v1_test |= bevel_3d(triangle.v1) << 24
-    v2_test |= bevel_3d(triangle.v2) << 24
-    v3_test |= bevel_3d(triangle.v3) << 24
+    v1_test |= bevel_3d(vertex_1) << 24
+    v2_test |= bevel_3d(vertex_2) << 24
+    v3_test |= bevel_3d(vertex_3) << 24
     if (v1_test & v2_test & v3_test) != INSIDE:
         return OUTSIDE
 
@@ -370,14 +466,38 @@ def t_c_intersection(triangle):
     # /* each triangle edge need be tested.                         */
 
     if (v1_test & v2_test) == 0:
-        if check_line(triangle.v1, triangle.v2, v1_test | v2_test) == INSIDE:
+        if check_line(vertex_1, vertex_2, v1_test | v2_test) == INSIDE:
             return INSIDE
     if (v1_test & v3_test) == 0:
-        if check_line(triangle.v1, triangle.v3, v1_test | v3_test) == INSIDE:
+        if check_line(vertex_1, vertex_3, v1_test | v3_test) == INSIDE:
             return INSIDE
     if (v2_test & v3_test) == 0:
-        if check_line(triangle.v2, triangle.v3, v2_test | v3_test) == INSIDE:
+        if check_line(vertex_2, vertex_3, v2_test | v3_test) == INSIDE:
             return INSIDE
+    return None
+
+
+def t_c_intersection(triangle):
+    """
+    /**********************************************/
+    /* This is the main algorithm procedure.      */
+    /* Triangle t is compared with a unit cube,   */
+    /* centered on the origin.                    */
+    /* It returns INSIDE (0) or OUTSIDE(1) if t   */
+    /* intersects or does not intersect the cube. */
+    /**********************************************/
+
+    @type triangle: Triangle
+    """
+
+    # long v1_test,v2_test,v3_test;
+    # float d,denom;
+    # Point3 vect12,vect13,norm;
+    # Point3 hitpp,hitpn,hitnp,hitnn;
+
+    result = check_vertexes_and_edges(triangle.v1, triangle.v2, triangle.v3)
+    if result is not None:
+        return result
 
     # /* By now, we know that the triangle is not off to any side,     */
     # /* and that its sides do not penetrate the cube.  We must now    */
@@ -447,3 +567,138 @@ def t_c_intersection(triangle):
     # /* We're done...there was no intersection.                          */
 
     return OUTSIDE
+
+
+# diagonals of the cube as (y, z) signs, the x component is always positive
+_diagonal_signs = ((1., 1.), (1., -1.), (-1., 1.), (-1., -1.))
+
+
+class PreparedTriangle(object):
+    """
+    Everything 't_c_intersection' computes from the triangle alone, computed once.
+    Testing a cube then only moves the vertexes relative to its center,
+    normal, diagonal denominators, edges and bounding box are reused for every cube.
+
+    @type vertexes: list[(float, float, float)]
+    @type edges: list[(float, float, float)]
+    @type norm: (float, float, float)
+    @type denominators: list[float | None]
+    @type minimum: (float, float, float)
+    @type maximum: (float, float, float)
+    """
+
+    def __init__(self, vertex_1, vertex_2, vertex_3):
+        """
+
+        @type vertex_1: numpy.ndarray | (float, float, float)
+        @type vertex_2: numpy.ndarray | (float, float, float)
+        @type vertex_3: numpy.ndarray | (float, float, float)
+        """
+        self.vertexes = [
+            (float(vertex[0]), float(vertex[1]), float(vertex[2])) for vertex in (vertex_1, vertex_2, vertex_3)]
+        v1, v2, v3 = self.vertexes
+        # edges as used by 'point_triangle_intersection': v1 - v2, v2 - v3, v3 - v1
+        self.edges = [
+            (start[0] - end[0], start[1] - end[1], start[2] - end[2])
+            for start, end in ((v1, v2), (v2, v3), (v3, v1))]
+        self.norm = cross_product(self.edges[0], (v1[0] - v3[0], v1[1] - v3[1], v1[2] - v3[2]))
+        # diagonals parallel to the plane of the triangle are skipped
+        self.denominators = []
+        for sign_y, sign_z in _diagonal_signs:
+            denom = self.norm[0] + sign_y * self.norm[1] + sign_z * self.norm[2]
+            self.denominators.append(denom if abs(denom) > EPS else None)
+        self.minimum = tuple(min(values) for values in zip(*self.vertexes))
+        self.maximum = tuple(max(values) for values in zip(*self.vertexes))
+
+    def t_c_intersection(self, center):
+        """
+        Same as 't_c_intersection' of the triangle moved by -center
+
+        @param center: center of the unit cube
+        @type center: (float, float, float)
+
+        @return: INSIDE or OUTSIDE
+        @rtype: int
+        """
+        c_x, c_y, c_z = center
+        v1, v2, v3 = [(x - c_x, y - c_y, z - c_z) for x, y, z in self.vertexes]
+        result = check_vertexes_and_edges(v1, v2, v3)
+        if result is not None:
+            return result
+
+        norm = self.norm
+        d = norm[0] * v1[0] + norm[1] * v1[1] + norm[2] * v1[2]
+        for denom, (sign_y, sign_z) in zip(self.denominators, _diagonal_signs):
+            if denom is None:
+                continue
+            distance = d / denom
+            if abs(distance) <= 0.5:
+                hit = (distance, sign_y * distance, sign_z * distance)
+                if self._point_intersection(hit, center, (v1, v2, v3)) == INSIDE:
+                    return INSIDE
+        return OUTSIDE
+
+    def _point_intersection(self, point, center, vertexes):
+        """
+        'point_triangle_intersection' with the precomputed edges and bounding box
+
+        @param point: point relative to the cube center
+        @type point: (float, float, float)
+        @type center: (float, float, float)
+        @param vertexes: vertexes relative to the cube center
+        @type vertexes: list[(float, float, float)]
+
+        @rtype: int
+        """
+        for axis in range(3):
+            if point[axis] > self.maximum[axis] - center[axis] + EPS:
+                return OUTSIDE
+            if point[axis] < self.minimum[axis] - center[axis] - EPS:
+                return OUTSIDE
+        sign_code = 0xff
+        for edge, vertex in zip(self.edges, vertexes):
+            sign_code &= sign3(cross_product(edge, (vertex[0] - point[0], vertex[1] - point[1], vertex[2] - point[2])))
+        if sign_code == 0:
+            return OUTSIDE
+        return INSIDE
+
+
+def vertexes_to_c_prepared_triangle(vertex_1, vertex_2, vertex_3):
+    """
+    Prepared triangle for 't_c_intersection_prepared' of the library
+
+    @type vertex_1: numpy.ndarray
+    @type vertex_2: numpy.ndarray
+    @type vertex_3: numpy.ndarray
+
+    @rtype: PreparedTriangle3
+    """
+    prepared = PreparedTriangle3()
+    triangle_lib.prepare_triangle(np.array([vertex_1, vertex_2, vertex_3], dtype=np.float64), byref(prepared))
+    return prepared
+
+
+def t_c_intersection_cells_c(vertices, triangle_index, positions):
+    """
+    Test many voxels with the library in a single call.
+    The GIL is released while the library runs, threads can test chunks concurrently.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param triangle_index: triangle of each voxel, best in runs of the same triangle
+    @type triangle_index: numpy.ndarray
+    @param positions: voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+
+    @return: boolean mask of shape (K, ), True where a voxel intersects its triangle
+    @rtype: numpy.ndarray
+    """
+    assert len(triangle_index) == len(positions), "Every voxel needs a triangle"
+    hits = np.empty(len(positions), dtype=np.uint8)
+    triangle_lib.t_c_intersection_cells(
+        np.ascontiguousarray(vertices, dtype=np.float64),
+        np.ascontiguousarray(triangle_index, dtype=np.int64),
+        np.ascontiguousarray(positions, dtype=np.int64),
+        len(positions),
+        hits)
+    return hits.view(bool)
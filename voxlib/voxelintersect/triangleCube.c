@@ -4,6 +4,14 @@
  */
 
 #include <math.h>
+#include <stdint.h>
+
+/* entry points called from python through ctypes */
+#ifdef _WIN32
+	#define EXPORT __declspec(dllexport)
+#else
+	#define EXPORT
+#endif
 
 /* this version of SIGN3 shows some numerical instability, and is improved
  * by using the uncommented macro that follows, and a different test with it */
@@ -215,7 +223,7 @@ Point3 cross12_1p,cross23_2p,cross31_3p;
 /* intersects or does not intersect the cube. */
 /**********************************************/
 
-long t_c_intersection(Triangle3 t)
+EXPORT long t_c_intersection(Triangle3 t)
 {
 long v1_test,v2_test,v3_test;
 float d,denom;
@@ -322,3 +330,312 @@ Point3 hitpp,hitpn,hitnp,hitnn;
    return(OUTSIDE);
 
 }
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* Everything t_c_intersection computes from the triangle alone,  */
+/* computed once per triangle and reused for every cube tested.   */
+/* Vertexes are kept in double precision, so that moving them to  */
+/* a cube center far from the origin does not lose precision.     */
+
+typedef struct {
+      double          x;
+      double          y;
+      double          z;
+      } Point3d;
+
+typedef struct{
+   Point3d v1;                /* Vertexes, not moved to a cube center */
+   Point3d v2;
+   Point3d v3;
+   Point3 norm;               /* Normal of the triangle plane */
+   float denom[4];            /* Normal projected onto the four diagonals */
+   Point3 edge[3];            /* v1 - v2, v2 - v3, v3 - v1 */
+   Point3d min;               /* Bounding box */
+   Point3d max;
+   } PreparedTriangle3;
+
+/* vertexes: x, y and z of the three vertexes */
+
+EXPORT void prepare_triangle(const double *vertexes, PreparedTriangle3 *p)
+{
+Point3 vect13;
+
+   p->v1.x = vertexes[0]; p->v1.y = vertexes[1]; p->v1.z = vertexes[2];
+   p->v2.x = vertexes[3]; p->v2.y = vertexes[4]; p->v2.z = vertexes[5];
+   p->v3.x = vertexes[6]; p->v3.y = vertexes[7]; p->v3.z = vertexes[8];
+   SUB(p->v1, p->v2, p->edge[0]);
+   SUB(p->v2, p->v3, p->edge[1]);
+   SUB(p->v3, p->v1, p->edge[2]);
+   SUB(p->v1, p->v3, vect13);
+   CROSS(p->edge[0], vect13, p->norm)
+   p->denom[0] = p->norm.x + p->norm.y + p->norm.z;
+   p->denom[1] = p->norm.x + p->norm.y - p->norm.z;
+   p->denom[2] = p->norm.x - p->norm.y + p->norm.z;
+   p->denom[3] = p->norm.x - p->norm.y - p->norm.z;
+   p->min.x = MIN3(p->v1.x, p->v2.x, p->v3.x);
+   p->min.y = MIN3(p->v1.y, p->v2.y, p->v3.y);
+   p->min.z = MIN3(p->v1.z, p->v2.z, p->v3.z);
+   p->max.x = MAX3(p->v1.x, p->v2.x, p->v3.x);
+   p->max.y = MAX3(p->v1.y, p->v2.y, p->v3.y);
+   p->max.z = MAX3(p->v1.z, p->v2.z, p->v3.z);
+}
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* point_triangle_intersection with the prepared edges and bounding box, */
+/* point and vertexes t relative to the cube center c                    */
+
+long point_triangle_intersection_prepared(Point3 p, Triangle3 t, const PreparedTriangle3 *prepared, Point3d c)
+{
+long sign12,sign23,sign31;
+Point3 vect1h,vect2h,vect3h;
+Point3 cross12_1p,cross23_2p,cross31_3p;
+
+   if (p.x > prepared->max.x - c.x + EPS) return(OUTSIDE);
+   if (p.y > prepared->max.y - c.y + EPS) return(OUTSIDE);
+   if (p.z > prepared->max.z - c.z + EPS) return(OUTSIDE);
+   if (p.x < prepared->min.x - c.x - EPS) return(OUTSIDE);
+   if (p.y < prepared->min.y - c.y - EPS) return(OUTSIDE);
+   if (p.z < prepared->min.z - c.z - EPS) return(OUTSIDE);
+
+   SUB(t.v1, p, vect1h);
+   CROSS(prepared->edge[0], vect1h, cross12_1p)
+   sign12 = SIGN3(cross12_1p);
+
+   SUB(t.v2, p, vect2h);
+   CROSS(prepared->edge[1], vect2h, cross23_2p)
+   sign23 = SIGN3(cross23_2p);
+
+   SUB(t.v3, p, vect3h);
+   CROSS(prepared->edge[2], vect3h, cross31_3p)
+   sign31 = SIGN3(cross31_3p);
+
+   return ((sign12 & sign23 & sign31) == 0) ? OUTSIDE : INSIDE;
+}
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* t_c_intersection of a prepared triangle with the unit cube centered on c */
+
+EXPORT long t_c_intersection_prepared(const PreparedTriangle3 *prepared, Point3d c)
+{
+long v1_test,v2_test,v3_test;
+float d,distance;
+Triangle3 t;
+Point3 hit;
+int i;
+static const float sign_y[4] = {1.0f, 1.0f, -1.0f, -1.0f};
+static const float sign_z[4] = {1.0f, -1.0f, 1.0f, -1.0f};
+
+/* Move the triangle to the cube center, then the same tests as t_c_intersection */
+
+   SUB(prepared->v1, c, t.v1);
+   SUB(prepared->v2, c, t.v2);
+   SUB(prepared->v3, c, t.v3);
+
+   if ((v1_test = face_plane(t.v1)) == INSIDE) return(INSIDE);
+   if ((v2_test = face_plane(t.v2)) == INSIDE) return(INSIDE);
+   if ((v3_test = face_plane(t.v3)) == INSIDE) return(INSIDE);
+   if ((v1_test & v2_test & v3_test) != 0) return(OUTSIDE);
+
+   v1_test |= bevel_2d(t.v1) << 8;
+   v2_test |= bevel_2d(t.v2) << 8;
+   v3_test |= bevel_2d(t.v3) << 8;
+   if ((v1_test & v2_test & v3_test) != 0) return(OUTSIDE);
+
+   v1_test |= bevel_3d(t.v1) << 24;
+   v2_test |= bevel_3d(t.v2) << 24;
+   v3_test |= bevel_3d(t.v3) << 24;
+   if ((v1_test & v2_test & v3_test) != 0) return(OUTSIDE);
+
+   if ((v1_test & v2_test) == 0)
+      if (check_line(t.v1,t.v2,v1_test|v2_test) == INSIDE) return(INSIDE);
+   if ((v1_test & v3_test) == 0)
+      if (check_line(t.v1,t.v3,v1_test|v3_test) == INSIDE) return(INSIDE);
+   if ((v2_test & v3_test) == 0)
+      if (check_line(t.v2,t.v3,v2_test|v3_test) == INSIDE) return(INSIDE);
+
+/* Only the plane offset depends on the cube, normal and denominators do not */
+
+   d = prepared->norm.x * t.v1.x + prepared->norm.y * t.v1.y + prepared->norm.z * t.v1.z;
+   for (i = 0; i < 4; i++)
+   {
+      if (fabs(prepared->denom[i]) <= EPS) continue;
+      distance = d / prepared->denom[i];
+      if (fabs(distance) > 0.5) continue;
+      hit.x = distance;
+      hit.y = sign_y[i] * distance;
+      hit.z = sign_z[i] * distance;
+      if (point_triangle_intersection_prepared(hit, t, prepared, c) == INSIDE) return(INSIDE);
+   }
+   return(OUTSIDE);
+}
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* Batch entry point for contiguous arrays.                              */
+/* triangles: N x 3 x 3 vertexes, already scaled and shifted             */
+/* triangle_index, cells: triangle and voxel position of K candidates    */
+/* hits: set to 1 for candidates intersecting their triangle, 0 if not   */
+/* Candidates of the same triangle should follow each other, a triangle  */
+/* is prepared again whenever the triangle index changes.                */
+/* Returns the number of hits.                                           */
+
+EXPORT int64_t t_c_intersection_cells(
+   const double *triangles, const int64_t *triangle_index, const int64_t *cells, int64_t count, uint8_t *hits)
+{
+PreparedTriangle3 prepared;
+Point3d center;
+int64_t k, current = -1, hit_count = 0;
+
+   for (k = 0; k < count; k++)
+   {
+      if (triangle_index[k] != current)
+      {
+         current = triangle_index[k];
+         prepare_triangle(triangles + 9 * current, &prepared);
+      }
+      center.x = cells[3 * k] + 0.5;
+      center.y = cells[3 * k + 1] + 0.5;
+      center.z = cells[3 * k + 2] + 0.5;
+      hits[k] = t_c_intersection_prepared(&prepared, center) == INSIDE;
+      hit_count += hits[k];
+   }
+   return hit_count;
+}
+
+/*___________________________________________________________________________*/
+
+/* Separating axis tests of 'separating.py', after Schwarz and Seidel 2010.  */
+/* A voxel at cell p covers [p, p + 1) along each axis.                   */
+/* Arithmetic follows 'prepare_triangles' and 'get_overlaps' step by step, */
+/* so that both give the same voxels.                                      */
+
+#define VOXEL_SIZE (1.0 - 1e-9)
+
+typedef struct{
+   double min[3];             /* Integer bounding box */
+   double max[3];
+   double norm[3];            /* Normal of the triangle plane */
+   double plane[2];           /* Plane offsets, the cell overlaps the plane between them */
+   double edge_norm[3][3][2]; /* Edge normals of the xy, yz and zx projections */
+   double edge_offset[3][3];
+   } SeparatingTriangle3;
+
+static const int projection_a[3] = {0, 1, 2};
+static const int projection_b[3] = {1, 2, 0};
+static const int view_axis[3] = {2, 0, 1};
+
+/* vertexes: x, y and z of the three vertexes, mode: 26 or 6 separating */
+
+void prepare_separating(const double *vertexes, long mode, SeparatingTriangle3 *s)
+{
+const double *v[3];
+double edge[3][3], critical, center_distance, radius, orientation, norm_a, norm_b;
+int i, j, a, b;
+
+   for (i = 0; i < 3; i++) v[i] = vertexes + 3 * i;
+   for (i = 0; i < 3; i++)
+   {
+      s->min[i] = floor(MIN3(v[0][i], v[1][i], v[2][i]));
+      s->max[i] = floor(MAX3(v[0][i], v[1][i], v[2][i]));
+      for (j = 0; j < 3; j++) edge[j][i] = v[(j + 1) % 3][i] - v[j][i];
+   }
+   s->norm[0] = edge[0][1] * edge[1][2] - edge[0][2] * edge[1][1];
+   s->norm[1] = edge[0][2] * edge[1][0] - edge[0][0] * edge[1][2];
+   s->norm[2] = edge[0][0] * edge[1][1] - edge[0][1] * edge[1][0];
+   if (mode == 26)
+   {
+      s->plane[0] = 0.0;
+      s->plane[1] = 0.0;
+      for (i = 0; i < 3; i++)
+      {
+         critical = (s->norm[i] > 0) ? VOXEL_SIZE : 0.0;
+         s->plane[0] += s->norm[i] * (critical - v[0][i]);
+         s->plane[1] += s->norm[i] * (VOXEL_SIZE - critical - v[0][i]);
+      }
+   }
+   else
+   {
+      center_distance = 0.0;
+      radius = 0.0;
+      for (i = 0; i < 3; i++)
+      {
+         center_distance += s->norm[i] * (0.5 - v[0][i]);
+         if (fabs(s->norm[i]) > radius) radius = fabs(s->norm[i]);
+      }
+      radius *= 0.5;
+      s->plane[0] = center_distance - radius;
+      s->plane[1] = center_distance + radius;
+   }
+
+   for (i = 0; i < 3; i++)
+   {
+      a = projection_a[i];
+      b = projection_b[i];
+      orientation = (s->norm[view_axis[i]] < 0) ? -1.0 : 1.0;
+      for (j = 0; j < 3; j++)
+      {
+         norm_a = -edge[j][b] * orientation;
+         norm_b = edge[j][a] * orientation;
+         s->edge_norm[i][j][0] = norm_a;
+         s->edge_norm[i][j][1] = norm_b;
+         if (mode == 26)
+            s->edge_offset[i][j] = -(norm_a * v[j][a] + norm_b * v[j][b])
+               + ((norm_a > 0 ? norm_a : 0.0) + (norm_b > 0 ? norm_b : 0.0)) * VOXEL_SIZE;
+         else
+            s->edge_offset[i][j] = norm_a * (0.5 - v[j][a]) + norm_b * (0.5 - v[j][b])
+               + 0.5 * (fabs(norm_a) > fabs(norm_b) ? fabs(norm_a) : fabs(norm_b));
+      }
+   }
+}
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* Does the cell overlap the prepared triangle? */
+
+long separating_overlap(const SeparatingTriangle3 *s, const int64_t *cell)
+{
+double p[3], distance;
+int i, j;
+
+   for (i = 0; i < 3; i++)
+   {
+      p[i] = (double) cell[i];
+      if (p[i] < s->min[i] || p[i] > s->max[i]) return(OUTSIDE);
+   }
+   distance = s->norm[0] * p[0] + s->norm[1] * p[1] + s->norm[2] * p[2];
+   if ((distance + s->plane[0]) * (distance + s->plane[1]) > 0) return(OUTSIDE);
+   for (i = 0; i < 3; i++)
+      for (j = 0; j < 3; j++)
+         if (s->edge_norm[i][j][0] * p[projection_a[i]] + s->edge_norm[i][j][1] * p[projection_b[i]]
+               + s->edge_offset[i][j] < 0) return(OUTSIDE);
+   return(INSIDE);
+}
+
+/*. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . */
+
+/* Batch entry point of the separating tests, like t_c_intersection_cells */
+/* mode: 26 or 6 separating                                               */
+/* Returns the number of hits.                                            */
+
+EXPORT int64_t separating_cells(
+   const double *triangles, const int64_t *triangle_index, const int64_t *cells, int64_t count, int64_t mode,
+   uint8_t *hits)
+{
+SeparatingTriangle3 prepared;
+int64_t k, current = -1, hit_count = 0;
+
+   for (k = 0; k < count; k++)
+   {
+      if (triangle_index[k] != current)
+      {
+         current = triangle_index[k];
+         prepare_separating(triangles + 9 * current, mode, &prepared);
+      }
+      hits[k] = separating_overlap(&prepared, cells + 3 * k) == INSIDE;
+      hit_count += hits[k];
+   }
+   return hit_count;
+}
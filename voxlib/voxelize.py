@@ -1,12 +1,26 @@
 import argparse
+from ctypes import byref
+import functools
 import sys
 import math
 import numpy as np
 
-from .common.progressbar import print_progress_bar
+from .common.progressbar import get_progress
 from meshlib.meshreader import MeshReader
-from .voxelintersect.triangle import Triangle, t_c_intersection, INSIDE, vertexes_to_c_triangle, triangle_lib
-from .mesh import get_scale_and_shift, scale_and_shift_triangle
+from .voxelintersect.triangle import INSIDE, Point3d, PreparedTriangle, triangle_lib, get_backend, backends
+from .voxelintersect.triangle import vertexes_to_c_prepared_triangle
+from .voxelintersect.batch import t_c_intersection_cells
+from .voxelintersect.separating import separating_modes, prepare_triangles, get_overlaps, get_overlaps_c
+from .mesh import get_scale_and_shift, scale_and_shift_vertices
+from .mesh import get_bounds, is_binary_stl, read_binary_stl
+from .grid import VoxelGrid
+from .sparse import BrickMap
+from .export import write_text, write_npy, write_voxels
+from .fill import fill_grid
+from .sweep import iter_row_voxels
+from .parallel import get_worker_count, map_triangle_chunks, iter_triangle_chunks, fill_grid_slabs, create_shared_grid
+from .cache import VoxelCache
+from .stats import VoxelizeStats, measure
 
 
 class BoundaryBox(object):
@@ -64,22 +78,102 @@ class BoundaryBox(object):
             self.maximum[1] = math.ceil(max([vertex_1[1], vertex_2[1], vertex_3[1], self.maximum[1]]))
             self.maximum[2] = math.ceil(max([vertex_1[2], vertex_2[2], vertex_3[2], self.maximum[2]]))
 
+    def from_vertex_array(self, vertices):
+        """
+        @type vertices: numpy.ndarray
+        """
+        minimum = np.floor(vertices.min(axis=(0, 1))).astype(int).tolist()
+        maximum = np.ceil(vertices.max(axis=(0, 1))).astype(int).tolist()
+        if self.minimum is None:
+            self.minimum = minimum
+            self.maximum = maximum
+        else:
+            self.minimum = [min(a, b) for a, b in zip(self.minimum, minimum)]
+            self.maximum = [max(a, b) for a, b in zip(self.maximum, maximum)]
+
 
 n_range = {-1, 0, 1}
 
+# 'conservative' marks every voxel touched by a triangle, using the GraphicsGems cube test,
+# the separating modes use the plane and projection tests of 'voxelintersect.separating'
+voxelization_modes = ('conservative', ) + separating_modes
+
+# 'depth_first' flood fills the voxels of each triangle, see 'get_intersecting_voxels_depth_first_batch',
+# 'bbox' tests the candidate voxels of many triangles at once, see 'iter_triangle_voxels',
+# 'sweep' tests only the ends of each row of voxels, faster for large triangles, see 'iter_row_voxels'
+voxelization_methods = ('depth_first', 'bbox', 'sweep')
+
+
+def get_neighbours(position, vertex_2, vertex_3):
+    """
+    Voxels next to an intersecting voxel the triangle may continue into
+
+    @type position: (int, int, int)
+    @param vertex_2: second vertex relative to the voxel center
+    @type vertex_2: numpy.ndarray | list[float]
+    @param vertex_3: third vertex relative to the voxel center
+    @type vertex_3: numpy.ndarray | list[float]
+
+    @rtype: set[(int, int, int)]
+    """
+    neighbours = set()
+    if vertex_2[0] < 0:
+        neighbours.add((position[0] - 1, position[1], position[2]))
+        if vertex_3[0] > 0:
+            neighbours.add((position[0] + 1, position[1], position[2]))
+    else:
+        neighbours.add((position[0] + 1, position[1], position[2]))
+        if vertex_3[0] < 0:
+            neighbours.add((position[0] - 1, position[1], position[2]))
+
+    if vertex_2[1] < 0:
+        neighbours.add((position[0], position[1] - 1, position[2]))
+        if vertex_3[1] > 0:
+            neighbours.add((position[0], position[1] + 1, position[2]))
+    else:
+        neighbours.add((position[0], position[1] + 1, position[2]))
+        if vertex_3[1] < 0:
+            neighbours.add((position[0], position[1] - 1, position[2]))
+
+    if vertex_2[2] < 0:
+        neighbours.add((position[0], position[1], position[2] - 1))
+        if vertex_3[2] > 0:
+            neighbours.add((position[0], position[1], position[2] + 1))
+    else:
+        neighbours.add((position[0], position[1], position[2] + 1))
+        if vertex_3[2] < 0:
+            neighbours.add((position[0], position[1], position[2] - 1))
+    return neighbours
+
 
-def get_intersecting_voxels_depth_first(vertex_1, vertex_2, vertex_3):
+def get_intersecting_voxels_depth_first(
+        vertex_1, vertex_2, vertex_3, voxels=None, mode='conservative', backend=None, stats=None):
     """
 
     @type vertex_1: numpy.ndarray
     @type vertex_2: numpy.ndarray
     @type vertex_3: numpy.ndarray
+    @param voxels: optional store the intersecting voxels are added to
+    @type voxels: BrickMap | VoxelGrid | None
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
 
     @rtype: list[(int, int, int)]
     """
-    c_lib = triangle_lib
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    if mode != 'conservative':
+        return get_intersecting_voxels_separating(vertex_1, vertex_2, vertex_3, voxels, mode, backend, stats)
+    backend = get_backend(backend)
+    if backend == 'numba':
+        positions = get_intersecting_voxels_numba(np.array([vertex_1, vertex_2, vertex_3]), stats)
+        if voxels is not None:
+            voxels.add_positions(positions)
+        return [tuple(position) for position in positions.tolist()]
     result_positions = []
-    tmp_triangle = None
     searched = set()
     stack = set()
 
@@ -91,84 +185,444 @@ def get_intersecting_voxels_depth_first(vertex_1, vertex_2, vertex_3):
                 if neighbour not in searched:
                     stack.add(neighbour)
 
-    tmp = np.array([0.0, 0.0, 0.0])
-    tmp_vertex_1 = np.array([0.0, 0.0, 0.0])
-    tmp_vertex_2 = np.array([0.0, 0.0, 0.0])
-    tmp_vertex_3 = np.array([0.0, 0.0, 0.0])
-    if not c_lib:
-        tmp_triangle = Triangle()
-        tmp_triangle.set(tmp_vertex_1, tmp_vertex_2, tmp_vertex_3)
+    # normal, edges and bounding box of the triangle are computed once, not for every voxel
+    prepared = PreparedTriangle(vertex_1, vertex_2, vertex_3)
+    c_prepared = None
+    if backend == 'c':
+        c_prepared = byref(vertexes_to_c_prepared_triangle(vertex_1, vertex_2, vertex_3))
+    (x_2, y_2, z_2), (x_3, y_3, z_3) = prepared.vertexes[1:]
     while len(stack) > 0:
         position = stack.pop()
         searched.add(position)
-        tmp[0] = 0.5 + position[0]
-        tmp[1] = 0.5 + position[1]
-        tmp[2] = 0.5 + position[2]
-
-        # move raster to origin, test assumed triangle in relation to origin
-        np.subtract(vertex_1, tmp, tmp_vertex_1)
-        np.subtract(vertex_2, tmp, tmp_vertex_2)
-        np.subtract(vertex_3, tmp, tmp_vertex_3)
-
-        try:
-            if c_lib:
-                is_inside = c_lib.t_c_intersection(
-                    vertexes_to_c_triangle(tmp_vertex_1, tmp_vertex_2, tmp_vertex_3)) == INSIDE
-            else:
-                is_inside = t_c_intersection(tmp_triangle) == INSIDE
-        except Exception:
-            c_lib = None
-            tmp_triangle = Triangle()
-            tmp_triangle.set(tmp_vertex_1, tmp_vertex_2, tmp_vertex_3)
-            is_inside = t_c_intersection(tmp_triangle) == INSIDE
+        center = (0.5 + position[0], 0.5 + position[1], 0.5 + position[2])
+
+        # the prepared tests move the triangle to the voxel center themselves
+        if c_prepared is not None:
+            is_inside = triangle_lib.t_c_intersection_prepared(c_prepared, Point3d(*center)) == INSIDE
+        else:
+            is_inside = prepared.t_c_intersection(center) == INSIDE
 
         if is_inside:
             result_positions.append(position)
 
-            neighbours = set()
-            if tmp_vertex_2[0] < 0:
-                neighbours.add((position[0] - 1, position[1], position[2]))
-                if tmp_vertex_3[0] > 0:
-                    neighbours.add((position[0] + 1, position[1], position[2]))
-            else:
-                neighbours.add((position[0] + 1, position[1], position[2]))
-                if tmp_vertex_3[0] < 0:
-                    neighbours.add((position[0] - 1, position[1], position[2]))
-
-            if tmp_vertex_2[1] < 0:
-                neighbours.add((position[0], position[1] - 1, position[2]))
-                if tmp_vertex_3[1] > 0:
-                    neighbours.add((position[0], position[1] + 1, position[2]))
-            else:
-                neighbours.add((position[0], position[1] + 1, position[2]))
-                if tmp_vertex_3[1] < 0:
-                    neighbours.add((position[0], position[1] - 1, position[2]))
-
-            if tmp_vertex_2[2] < 0:
-                neighbours.add((position[0], position[1], position[2] - 1))
-                if tmp_vertex_3[2] > 0:
-                    neighbours.add((position[0], position[1], position[2] + 1))
-            else:
-                neighbours.add((position[0], position[1], position[2] + 1))
-                if tmp_vertex_3[2] < 0:
-                    neighbours.add((position[0], position[1], position[2] - 1))
-
-            for neighbour in neighbours:
+            for neighbour in get_neighbours(
+                    position,
+                    (x_2 - center[0], y_2 - center[1], z_2 - center[2]),
+                    (x_3 - center[0], y_3 - center[1], z_3 - center[2])):
                 if neighbour not in searched:
                     stack.add(neighbour)
+    if stats is not None:
+        # every voxel but the seeds was queued by a neighbour
+        stats.add(
+            candidates=len(searched), hits=len(result_positions), expansions=len(searched) - 27,
+            fallbacks=len(searched) if c_prepared is None else 0)
     del searched, stack
+    if voxels is not None:
+        voxels.add_positions(np.array(result_positions, dtype=np.int64).reshape(-1, 3))
     return result_positions
 
 
-def voxelize(file_path, resolution, progress_bar=None):
+def get_intersecting_voxels_separating(
+        vertex_1, vertex_2, vertex_3, voxels=None, mode='26-separating', backend=None, stats=None):
+    """
+    Voxels of a triangle passing the tests of 'voxelintersect.separating'.
+    The tests are cheap enough to run on all candidates of 'iter_candidate_voxels' without a flood fill.
+
+    @type vertex_1: numpy.ndarray
+    @type vertex_2: numpy.ndarray
+    @type vertex_3: numpy.ndarray
+    @param voxels: optional store the intersecting voxels are added to
+    @type voxels: BrickMap | VoxelGrid | None
+    @param mode: '26-separating' or '6-separating'
+    @type mode: str
+    @param backend: 'c' for the compiled tests, the others use numpy, see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @rtype: list[(int, int, int)]
+    """
+    vertices = np.array([vertex_1, vertex_2, vertex_3], dtype=np.float64).reshape(1, 3, 3)
+    positions = get_intersecting_voxels_batch(vertices, mode=mode, backend=backend, stats=stats)
+    if voxels is not None:
+        voxels.add_positions(positions)
+    return [tuple(position) for position in positions.tolist()]
+
+
+def get_intersecting_voxels_numba(vertices, stats=None):
+    """
+    'get_intersecting_voxels_depth_first' for many triangles, compiled with numba, triangles are searched in parallel
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param stats: profile the voxels are counted in, the compiled flood fill only reports its hits
+    @type stats: VoxelizeStats | None
+
+    @return: unique voxel positions of shape (K, 3)
+    @rtype: numpy.ndarray
+    """
+    from .voxelintersect import jit
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    positions = jit.get_intersecting_voxels_depth_first(vertices)
+    if stats is not None:
+        stats.add(hits=len(positions))
+    return get_unique_positions(positions)
+
+
+def get_plane_slabs(vertices, lower, upper):
+    """
+    Voxels a triangle can intersect are within a few voxels of its plane.
+    Along the axis the plane is steepest to, each column of voxels of the bounding box
+    holds at most 'thickness' candidates, starting two voxels below the plane.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param lower: first voxel of the bounding boxes of shape (N, 3)
+    @type lower: numpy.ndarray
+    @param upper: last voxel of the bounding boxes of shape (N, 3)
+    @type upper: numpy.ndarray
+
+    @return: column axis, normal and plane offset of each triangle, and the number of candidates per column
+    @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    normal = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    axis = np.abs(normal).argmax(axis=1)
+    rows = np.arange(len(vertices))
+    normal_column = np.abs(normal[rows, axis])
+    extent = np.maximum(upper[rows, axis] - lower[rows, axis] + 1, 0)
+    thickness = extent.copy()
+    is_plane = normal_column > 0
+    # the plane crosses at most (|n_a| + |n_b|) / |n_column| <= 2 voxels of a column,
+    # two more voxels on each side cover voxels touching the plane and rounding errors
+    span = (np.abs(normal).sum(axis=1)[is_plane] - normal_column[is_plane]) / normal_column[is_plane]
+    thickness[is_plane] = np.minimum(extent[is_plane], np.ceil(span).astype(np.int64) + 4)
+    plane_offset = (normal * vertices[:, 0]).sum(axis=1)
+    return axis, normal, plane_offset, thickness
+
+
+def iter_candidate_voxels(vertices, max_candidates=2**20, x_range=None):
+    """
+    Expand the integer bounding boxes of many triangles into candidate voxels.
+    Only voxels close to the plane of a triangle are candidates, see 'get_plane_slabs',
+    so their number grows with the area of a triangle instead of the volume of its bounding box.
+    Candidates are produced in chunks of at most 'max_candidates' voxels, a single
+    large triangle may be spread over several chunks.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type max_candidates: int
+    @param x_range: only voxels with start <= x < stop are candidates
+    @type x_range: (int, int) | None
+
+    @return: triangle index (K, ) and voxel position (K, 3) of each candidate
+    @rtype: collections.Iterable[(numpy.ndarray, numpy.ndarray)]
+    """
+    lower = np.floor(vertices.min(axis=1)).astype(np.int64)
+    upper = np.floor(vertices.max(axis=1)).astype(np.int64)
+    if x_range is not None:
+        np.maximum(lower[:, 0], x_range[0], out=lower[:, 0])
+        np.minimum(upper[:, 0], x_range[1] - 1, out=upper[:, 0])
+    axis, normal, plane_offset, thickness = get_plane_slabs(vertices, lower, upper)
+    axis_a = (axis + 1) % 3
+    axis_b = (axis + 2) % 3
+    rows = np.arange(len(vertices))
+    extent = np.maximum(upper - lower + 1, 0)
+    extent_a = extent[rows, axis_a]
+    extent_b = extent[rows, axis_b]
+    counts = extent_a * extent_b * thickness
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    for start in range(0, total, max_candidates):
+        candidates = np.arange(start, min(start + max_candidates, total), dtype=np.int64)
+        triangle_index = np.searchsorted(ends, candidates, side='right')
+        offset = candidates - (ends[triangle_index] - counts[triangle_index])
+        layer = offset % thickness[triangle_index]
+        offset //= thickness[triangle_index]
+        column_b = lower[triangle_index, axis_b[triangle_index]] + offset % extent_b[triangle_index]
+        column_a = lower[triangle_index, axis_a[triangle_index]] + offset // extent_b[triangle_index]
+
+        # plane position at the center of each column
+        triangle_normal = normal[triangle_index]
+        normal_column = triangle_normal[np.arange(len(candidates)), axis[triangle_index]]
+        is_plane = normal_column != 0
+        first = lower[triangle_index, axis[triangle_index]]
+        last = upper[triangle_index, axis[triangle_index]]
+        plane = (
+            plane_offset[triangle_index[is_plane]]
+            - triangle_normal[is_plane, axis_a[triangle_index[is_plane]]] * (column_a[is_plane] + .5)
+            - triangle_normal[is_plane, axis_b[triangle_index[is_plane]]] * (column_b[is_plane] + .5)
+            ) / normal_column[is_plane]
+        first[is_plane] = np.maximum(first[is_plane], np.floor(plane).astype(np.int64) - 2)
+        column = first + layer
+
+        positions = np.empty((len(candidates), 3), dtype=np.int64)
+        rows = np.arange(len(candidates))
+        positions[rows, axis[triangle_index]] = column
+        positions[rows, axis_a[triangle_index]] = column_a
+        positions[rows, axis_b[triangle_index]] = column_b
+        is_candidate = column <= last
+        yield triangle_index[is_candidate], positions[is_candidate]
+
+
+def get_unique_positions(positions):
+    """
+    Remove duplicates from an array of voxel positions
+
+    @type positions: numpy.ndarray
+    @rtype: numpy.ndarray
+    """
+    if len(positions) == 0:
+        return positions.reshape(0, 3)
+    lower = positions.min(axis=0)
+    extent = positions.max(axis=0) - lower + 1
+    keys = np.ravel_multi_index((positions - lower).T, extent)
+    return np.column_stack(np.unravel_index(np.unique(keys), extent)) + lower
+
+
+def iter_intersecting_voxels(
+        vertices, max_candidates=2**20, x_range=None, method='bbox', mode='conservative', backend=None, stats=None):
+    """
+    Test candidate voxels chunk by chunk.
+    Positions are unique within a chunk, but may repeat across chunks.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type max_candidates: int
+    @param x_range: only voxels with start <= x < stop are tested
+    @type x_range: (int, int) | None
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in, the sweep only counts its hits
+    @type stats: VoxelizeStats | None
+
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    assert method in voxelization_methods, "Unknown method: {}".format(method)
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    assert method != 'sweep' or mode == 'conservative', "The sweep only supports the conservative mode"
+    if method == 'depth_first':
+        if x_range is not None:
+            lower = np.floor(vertices[:, :, 0].min(axis=1))
+            upper = np.floor(vertices[:, :, 0].max(axis=1))
+            vertices = vertices[(upper >= x_range[0]) & (lower < x_range[1])]
+        for start in range(0, len(vertices), 2**12):
+            positions = get_intersecting_voxels_depth_first_batch(
+                vertices[start:start + 2**12], mode=mode, backend=backend, stats=stats)
+            if x_range is not None:
+                positions = positions[(positions[:, 0] >= x_range[0]) & (positions[:, 0] < x_range[1])]
+            yield positions
+        return
+    if method == 'sweep':
+        for positions in iter_row_voxels(vertices, x_range=x_range, backend=backend):
+            if stats is not None:
+                stats.add(hits=len(positions))
+            yield get_unique_positions(positions)
+        return
+    for triangle_index, positions in iter_triangle_voxels(vertices, max_candidates, x_range, mode, backend, stats):
+        yield get_unique_positions(positions)
+
+
+def iter_triangle_voxels(
+        vertices, max_candidates=2**20, x_range=None, mode='conservative', backend=None, stats=None):
+    """
+    Test candidate voxels chunk by chunk and keep the triangle of each intersecting voxel.
+    A voxel intersecting several triangles is reported once for each of them.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type max_candidates: int
+    @param x_range: only voxels with start <= x < stop are tested
+    @type x_range: (int, int) | None
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @return: triangle index (K, ) and voxel position (K, 3) of each intersection
+    @rtype: collections.Iterable[(numpy.ndarray, numpy.ndarray)]
+    """
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    backend = get_backend(backend)
+    setup = None
+    if mode != 'conservative' and backend != 'c':
+        setup = prepare_triangles(vertices, mode)
+    for triangle_index, positions in iter_candidate_voxels(vertices, max_candidates, x_range):
+        if mode == 'conservative':
+            is_inside = t_c_intersection_cells(vertices, triangle_index, positions, backend)
+        elif setup is None:
+            is_inside = get_overlaps_c(vertices, triangle_index, positions, mode)
+        else:
+            is_inside = get_overlaps(setup, triangle_index, positions)
+        if stats is not None:
+            stats.add(
+                candidates=len(positions), hits=np.count_nonzero(is_inside),
+                fallbacks=len(positions) if mode == 'conservative' and backend == 'python' else 0)
+        yield triangle_index[is_inside], positions[is_inside]
+
+
+def merge_positions(chunks):
+    """
+    Unique voxel positions of several chunks, sorted, independent of chunk order
+
+    @type chunks: collections.Iterable[numpy.ndarray]
+    @rtype: numpy.ndarray
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return np.empty((0, 3), dtype=np.int64)
+    return get_unique_positions(np.concatenate(chunks))
+
+
+def get_intersecting_voxels_batch(
+        vertices, max_candidates=2**20, method='bbox', mode='conservative', backend=None, stats=None):
+    """
+    Vectorized counterpart of 'get_intersecting_voxels_depth_first' for many triangles at once.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type max_candidates: int
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @return: unique voxel positions of shape (K, 3)
+    @rtype: numpy.ndarray
+    """
+    return merge_positions(
+        iter_intersecting_voxels(vertices, max_candidates, method=method, mode=mode, backend=backend, stats=stats))
+
+
+def classify_triangles(vertices):
+    """
+    Sort triangles by the extent of their integer bounding boxes
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+
+    @return: indexes of triangles inside a single voxel, inside a layer of voxels one voxel thick, and all others
+    @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    is_flat = np.floor(vertices.min(axis=1)) == np.floor(vertices.max(axis=1))
+    flat_axes = np.count_nonzero(is_flat, axis=1)
+    return np.flatnonzero(flat_axes == 3), np.flatnonzero((flat_axes == 1) | (flat_axes == 2)), np.flatnonzero(flat_axes == 0)
+
+
+def get_small_triangle_voxels(vertices, single, thin, mode='conservative', backend=None, stats=None):
+    """
+    Voxels of triangles sorted out by 'classify_triangles', without any flood fill.
+    A triangle inside a single voxel needs no intersection test at all, unless in '6-separating' mode,
+    the few candidates of a triangle inside a layer of voxels are tested at once.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param single: indexes of triangles inside a single voxel
+    @type single: numpy.ndarray
+    @param thin: indexes of triangles inside a layer of voxels
+    @type thin: numpy.ndarray
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @return: unique voxel positions of shape (K, 3)
+    @rtype: numpy.ndarray
+    """
+    if mode == '6-separating':
+        # a small triangle may miss the diamond inside its voxel
+        return get_intersecting_voxels_batch(
+            vertices[np.concatenate((single, thin))], mode=mode, backend=backend, stats=stats)
+    if stats is not None:
+        stats.add(hits=len(single))
+    return merge_positions([
+        np.floor(vertices[single, 0]).astype(np.int64),
+        get_intersecting_voxels_batch(vertices[thin], mode=mode, backend=backend, stats=stats)])
+
+
+def get_intersecting_voxels_depth_first_batch(vertices, mode='conservative', backend=None, stats=None):
     """
+    Run 'get_intersecting_voxels_depth_first' for many triangles,
+    triangles inside a single voxel or a layer of voxels skip the flood fill.
+    The separating modes test the candidates of all triangles in batches instead, see 'iter_triangle_voxels'.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @return: unique voxel positions of shape (K, 3)
+    @rtype: numpy.ndarray
+    """
+    backend = get_backend(backend)
+    single, thin, general = classify_triangles(vertices)
+    small_voxels = get_small_triangle_voxels(vertices, single, thin, mode, backend, stats)
+    if mode != 'conservative':
+        # the separating tests are cheaper than a flood fill of every triangle
+        return merge_positions([
+            small_voxels, get_intersecting_voxels_batch(vertices[general], mode=mode, backend=backend, stats=stats)])
+    if backend == 'numba':
+        return merge_positions([small_voxels, get_intersecting_voxels_numba(vertices[general], stats)])
+    # duplicates of neighbouring triangles are removed at once by 'merge_positions'
+    voxels = []
+    for vertex_1, vertex_2, vertex_3 in vertices[general]:
+        voxels.extend(get_intersecting_voxels_depth_first(
+            vertex_1, vertex_2, vertex_3, mode=mode, backend=backend, stats=stats))
+    return merge_positions([small_voxels, np.array(voxels, dtype=np.int64).reshape(-1, 3)])
+
+
+def get_intersecting_voxels_sweep(vertex_1, vertex_2, vertex_3, voxels=None, backend=None, stats=None):
+    """
+    Alternative to 'get_intersecting_voxels_depth_first' without a flood fill:
+    the bounding box of the triangle is swept row by row and only voxels at the ends of each row are tested.
+    Much faster for triangles covering many voxels.
+    Unlike the triangle cube test, it does not report voxels next to a triangle lying exactly in a voxel face.
+
+    @type vertex_1: numpy.ndarray
+    @type vertex_2: numpy.ndarray
+    @type vertex_3: numpy.ndarray
+    @param voxels: optional store the intersecting voxels are added to
+    @type voxels: BrickMap | VoxelGrid | None
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile the voxels are counted in, the sweep only counts its hits
+    @type stats: VoxelizeStats | None
+
+    @rtype: list[(int, int, int)]
+    """
+    vertices = np.array([vertex_1, vertex_2, vertex_3], dtype=np.float64).reshape(1, 3, 3)
+    positions = merge_positions(iter_row_voxels(vertices, backend=backend))
+    if stats is not None:
+        stats.add(hits=len(positions))
+    if voxels is not None:
+        voxels.add_positions(positions)
+    return [tuple(position) for position in positions.tolist()]
+
+
+def read_vertices(file_path):
+    """
+    Read a mesh file into an array of triangles
 
     @type file_path: str
-    @type resolution: int
-    @type progress_bar: any
+
+    @return: array of shape (N, 3, 3)
+    @rtype: numpy.ndarray
     """
-    if not progress_bar:
-        progress_bar = print_progress_bar
     mesh_reader = MeshReader()
     if file_path.endswith('.zip'):
         mesh_reader.read_archive(file_path)
@@ -176,23 +630,685 @@ def voxelize(file_path, resolution, progress_bar=None):
         mesh_reader.read(file_path)
     if not mesh_reader.has_triangular_facets():
         raise NotImplementedError("Unsupported polygonal face elements. Only triangular facets supported.")
+    return np.array(list(mesh_reader.get_facets()), dtype=np.float64).reshape(-1, 3, 3)
+
+
+def get_grid(bounding_box, packed=False, output_path=None, scale=None, shift=None, resolution=None, shared=False):
+    """
+    Empty occupancy grid covering a bounding box of scaled vertexes.
+    Its offset moves voxel positions to the center, like 'voxelize' does.
+
+    @type bounding_box: BoundaryBox
+    @type packed: bool
+    @param output_path: create the grid as memory mapped file instead of in memory
+    @type output_path: str | None
+    @type scale: float | None
+    @type shift: numpy.ndarray | list[float] | None
+    @type resolution: int | None
+    @param shared: create the grid in shared memory, for worker processes of 'fill_grid_slabs'
+    @type shared: bool
+
+    @rtype: VoxelGrid
+    """
+    minimum = np.array(bounding_box.minimum)
+    shape = np.array(bounding_box.maximum) - minimum + 1
+    offset = minimum - bounding_box.get_center()
+    if output_path:
+        return VoxelGrid.create_file(
+            output_path, shape, offset=offset, packed=packed, scale=scale, shift=shift, resolution=resolution)
+    if shared:
+        return create_shared_grid(shape, offset=offset, packed=packed, scale=scale, shift=shift, resolution=resolution)
+    return VoxelGrid(shape, offset=offset, packed=packed, scale=scale, shift=shift, resolution=resolution)
 
-    list_of_triangles = list(mesh_reader.get_facets())
-    scale, shift, triangle_count = get_scale_and_shift(list_of_triangles, resolution)
-    progress_counter = 0
-    voxels = set()
-    bounding_box = BoundaryBox()
-    for triangle in list_of_triangles:
-        progress_counter += 1
-        progress_bar(progress_counter, triangle_count, prefix="Voxelize: ")
 
-        (vertex_1, vertex_2, vertex_3) = scale_and_shift_triangle(triangle, scale, shift)
-        bounding_box.from_vertexes(vertex_1, vertex_2, vertex_3)
-        voxels.update(get_intersecting_voxels_depth_first(vertex_1, vertex_2, vertex_3))
-    center = bounding_box.get_center()
-    while len(voxels) > 0:
-        (x, y, z) = voxels.pop()
-        yield x-center[0], y-center[1], z-center[2]
+def voxelize(
+        file_path, resolution, progress_bar=None, sparse=False, workers=1, fill=False, method='depth_first',
+        mode='conservative', backend=None, stats=None):
+    """
+    Voxel positions of a mesh file one by one, see 'voxelize_chunks' for arrays of positions
+
+    @type file_path: str
+    @type resolution: int
+    @param progress_bar: None for a progress bar on stderr, False for none, a callback like 'print_progress_bar'
+        or a Progress for another interval. Progress is reported every 0.1 seconds at most, see 'Progress'.
+    @type progress_bar: Progress | callable | bool | None
+    @param sparse: remember yielded voxels in a BrickMap instead of a bit packed grid of the bounding box,
+        memory then scales with the surface
+    @type sparse: bool
+    @param workers: number of processes, 0 or None for all cores
+    @type workers: int | None
+    @param fill: also yield voxels inside the mesh, True or 'parity' for watertight meshes,
+        'winding' for meshes with small holes or overlapping parts
+    @type fill: bool | str
+    @param method: 'depth_first' to flood fill the voxels of each triangle, 'bbox' to test the candidate voxels
+        of many triangles at once, 'sweep' to sweep their bounding boxes row by row, faster for large triangles,
+        see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative' for all voxels touched by the mesh, '26-separating' for the same voxels with a
+        cheaper test, '6-separating' for a thinner surface, see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'.
+        With 'numba' the triangles of a single process are searched in parallel threads.
+    @type backend: str | None
+    @param stats: profile filled in while voxelizing, see 'VoxelizeStats'
+    @type stats: VoxelizeStats | None
+
+    @rtype: collections.Iterable[(int, int, int)]
+    """
+    for positions in voxelize_chunks(
+            file_path, resolution, progress_bar=progress_bar, sparse=sparse, workers=workers, fill=fill,
+            method=method, mode=mode, backend=backend, stats=stats):
+        for x, y, z in positions.tolist():
+            yield x, y, z
+
+
+def get_chunk_function(method='depth_first', mode='conservative', backend=None):
+    """
+    Picklable function voxelizing a chunk of triangles, see 'iter_chunk_voxels'
+
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+
+    @return: function taking an (K, 3, 3) array and returning unique voxel positions
+    @rtype: callable
+    """
+    assert method in voxelization_methods, "Unknown method: {}".format(method)
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    assert method != 'sweep' or mode == 'conservative', "The sweep only supports the conservative mode"
+    if method == 'depth_first':
+        return functools.partial(get_intersecting_voxels_depth_first_batch, mode=mode, backend=backend)
+    return functools.partial(get_intersecting_voxels_batch, method=method, mode=mode, backend=backend)
+
+
+def iter_chunk_voxels(
+        vertices, chunk_size=2**12, workers=1, method='depth_first', mode='conservative', backend=None, progress=None,
+        stats=None):
+    """
+    Voxelize triangles 'chunk_size' at a time, the voxels of a chunk are yielded as soon as it is done.
+    Positions are unique within a chunk, but may repeat across chunks.
+    Worker processes voxelize chunks in parallel, they are yielded in the order they finish.
+
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type chunk_size: int
+    @type workers: int
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param progress: started with the number of triangles, finished chunks are added to it
+    @type progress: Progress | None
+    @param stats: profile the tests are counted in
+    @type stats: VoxelizeStats | None
+
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    function = get_chunk_function(method, mode, backend)
+    if workers > 1:
+        for index, positions in iter_triangle_chunks(function, vertices, workers, progress, stats, chunk_size):
+            yield positions
+        return
+    triangle_count = len(vertices)
+    if progress is not None:
+        progress.start(triangle_count)
+    for start in range(0, triangle_count, chunk_size):
+        stop = min(start + chunk_size, triangle_count)
+        positions = function(vertices[start:stop], stats=stats)
+        if progress is not None and stop >= progress.due:
+            progress.update(stop)
+        yield positions
+
+
+class VoxelChunkFilter(object):
+    """
+    Centers chunks of voxel positions the same way as 'voxelize' and drops voxels of earlier chunks.
+    Voxels passed already are remembered in a bit packed grid of the bounding box, or in a BrickMap.
+
+    @type center: numpy.ndarray
+    @type minimum: numpy.ndarray
+    """
+
+    def __init__(self, bounding_box, sparse=False):
+        """
+        @param bounding_box: bounds of the scaled vertexes
+        @type bounding_box: BoundaryBox
+        @param sparse: remember voxels in a BrickMap, memory then scales with the surface
+        @type sparse: bool
+        """
+        self.center = np.array(bounding_box.get_center())
+        self.minimum = np.array(bounding_box.minimum)
+        self._passed = BrickMap() if sparse else get_grid(bounding_box, packed=True)
+
+    def filter(self, positions):
+        """
+        @param positions: voxel positions of shape (K, 3), unique
+        @type positions: numpy.ndarray
+
+        @return: centered positions of the voxels not passed before
+        @rtype: numpy.ndarray
+        """
+        indices = positions - self.minimum
+        is_new = ~self._passed.contains(indices)
+        self._passed.add(indices[is_new])
+        return (positions[is_new] - self.center).astype(np.int32)
+
+
+def read_scaled_mesh(file_path, resolution, stats=None):
+    """
+    Read a mesh file, scale and shift it
+
+    @type file_path: str
+    @type resolution: int
+    @param stats: profile the stages are timed in
+    @type stats: VoxelizeStats | None
+
+    @return: vertexes of shape (N, 3, 3) and their bounds
+    @rtype: (numpy.ndarray, BoundaryBox)
+    """
+    with measure(stats, 'read'):
+        vertices = read_vertices(file_path)
+    with measure(stats, 'bounds'):
+        scale, shift, triangle_count = get_scale_and_shift(vertices, resolution)
+    with measure(stats, 'scale'):
+        # the vertexes were just read, no copy is needed
+        vertices = scale_and_shift_vertices(vertices, scale, shift, copy=False)
+        bounding_box = BoundaryBox()
+        bounding_box.from_vertex_array(vertices)
+    return vertices, bounding_box
+
+
+def voxelize_chunks(
+        file_path, resolution, chunk_size=2**12, progress_bar=False, sparse=False, workers=1, fill=False,
+        method='depth_first', mode='conservative', backend=None, stats=None):
+    """
+    Voxel positions of a mesh file, chunk by chunk as triangles are voxelized.
+    Every voxel is yielded once, positions are centered the same way as by 'voxelize'.
+    With 'fill' the voxels are only known once all triangles are done, they are then yielded 2^20 at a time.
+
+    @type file_path: str
+    @type resolution: int
+    @param chunk_size: number of triangles voxelized at a time
+    @type chunk_size: int
+    @param progress_bar: False for no progress, None for a progress bar on stderr, see 'voxelize'
+    @type progress_bar: Progress | callable | bool | None
+    @param sparse: remember yielded voxels in a BrickMap instead of a bit packed grid of the bounding box
+    @type sparse: bool
+    @param workers: number of processes, 0 or None for all cores
+    @type workers: int | None
+    @param fill: also yield voxels inside the mesh, see 'voxelize'
+    @type fill: bool | str
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelization_modes'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile filled in while voxelizing, the 'output' stage excludes the time of the caller
+    @type stats: VoxelizeStats | None
+
+    @return: voxel positions of shape (K, 3)
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    assert method in voxelization_methods, "Unknown method: {}".format(method)
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    assert method != 'sweep' or mode == 'conservative', "The sweep only supports the conservative mode"
+    backend = get_backend(backend)
+    progress = get_progress(progress_bar, prefix="Voxelize: ")
+    vertices, bounding_box = read_scaled_mesh(file_path, resolution, stats)
+    chunks = iter_chunk_voxels(
+        vertices, chunk_size, get_worker_count(workers), method, mode, backend, progress, stats)
+    if fill:
+        with measure(stats, 'intersect'):
+            positions = merge_positions(chunks)
+        with measure(stats, 'fill'):
+            positions = get_filled_positions(positions, vertices, bounding_box, fill)
+        center = np.array(bounding_box.get_center())
+        for start in range(0, len(positions), 2**20):
+            with measure(stats, 'output'):
+                chunk = (positions[start:start + 2**20] - center).astype(np.int32)
+            yield chunk
+        return
+    chunk_filter = VoxelChunkFilter(bounding_box, sparse)
+    try:
+        while True:
+            with measure(stats, 'intersect'):
+                positions = next(chunks, None)
+            if positions is None:
+                return
+            with measure(stats, 'output'):
+                # voxels of triangles in other chunks may have been yielded already
+                chunk = chunk_filter.filter(positions)
+            if len(chunk):
+                yield chunk
+    finally:
+        # a caller stopping early cancels the chunks of worker processes not started yet
+        chunks.close()
+
+
+def get_fill_rule(fill):
+    """
+    @type fill: bool | str
+    @rtype: str
+    """
+    if fill is True:
+        return 'parity'
+    return fill
+
+
+def get_filled_positions(positions, vertices, bounding_box, fill):
+    """
+    Add the voxels inside a mesh to its surface voxels
+
+    @param positions: surface voxel positions of shape (K, 3)
+    @type positions: numpy.ndarray
+    @param vertices: array of shape (N, 3, 3), already scaled and shifted
+    @type vertices: numpy.ndarray
+    @type bounding_box: BoundaryBox
+    @type fill: bool | str
+
+    @return: positions of the surface and interior voxels
+    @rtype: numpy.ndarray
+    """
+    grid = get_grid(bounding_box, packed=True)
+    minimum = np.array(bounding_box.minimum)
+    grid.add(positions - minimum)
+    fill_grid(grid, [vertices], minimum, get_fill_rule(fill))
+    return grid.get_indices() + minimum
+
+
+def voxelize_array(
+        vertices, resolution, output='positions', workers=1, output_path=None, fill=False, method='bbox',
+        mode='conservative', backend=None, stats=None):
+    """
+    Voxelize a whole mesh with array operations only.
+    Voxel positions are centered the same way as by 'voxelize'.
+
+    @param vertices: array of shape (N, 3, 3)
+    @type vertices: numpy.ndarray
+    @type resolution: int
+    @param output: 'positions' for an (K, 3) array, 'grid' for a VoxelGrid, 'packed' for a bit packed VoxelGrid
+        or 'sparse' for a BrickMap
+    @type output: str
+    @param workers: number of processes, 0 or None for all cores
+    @type workers: int | None
+    @param output_path: write a 'grid' or 'packed' output into a memory mapped file
+    @type output_path: str | None
+    @param fill: also mark voxels inside the mesh, True or 'parity' for watertight meshes,
+        'winding' for meshes with small holes or overlapping parts
+    @type fill: bool | str
+    @param method: 'depth_first', 'bbox' or 'sweep', see 'voxelization_methods'
+    @type method: str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile filled in while voxelizing, see 'VoxelizeStats'
+    @type stats: VoxelizeStats | None
+
+    @rtype: numpy.ndarray | VoxelGrid | BrickMap
+    """
+    assert output in ('positions', 'grid', 'packed', 'sparse'), "Unknown output: {}".format(output)
+    assert output_path is None or output in ('grid', 'packed'), "Only grids can be written to a file"
+    assert method in voxelization_methods, "Unknown method: {}".format(method)
+    assert mode in voxelization_modes, "Unknown mode: {}".format(mode)
+    assert method != 'sweep' or mode == 'conservative', "The sweep only supports the conservative mode"
+    backend = get_backend(backend)
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    with measure(stats, 'bounds'):
+        scale, shift, triangle_count = get_scale_and_shift(vertices, resolution)
+    with measure(stats, 'scale'):
+        vertices = scale_and_shift_vertices(vertices, scale, shift)
+        bounding_box = BoundaryBox()
+        bounding_box.from_vertex_array(vertices)
+    workers = get_worker_count(workers)
+    grid = None
+    if output in ('grid', 'packed') or fill:
+        grid = get_grid(bounding_box, output != 'grid', output_path, scale, shift, resolution, shared=workers > 1)
+    minimum = np.array(bounding_box.minimum)
+    with measure(stats, 'intersect'):
+        if grid is not None and workers > 1:
+            function = functools.partial(iter_intersecting_voxels, method=method, mode=mode, backend=backend)
+            fill_grid_slabs(function, vertices, grid, minimum, workers, stats=stats)
+        else:
+            if workers > 1:
+                chunks = map_triangle_chunks(
+                    functools.partial(get_intersecting_voxels_batch, method=method, mode=mode, backend=backend),
+                    vertices, workers, stats=stats)
+            else:
+                chunks = iter_intersecting_voxels(vertices, method=method, mode=mode, backend=backend, stats=stats)
+            if grid is None:
+                return collect_voxels(chunks, bounding_box, output)
+            for positions in chunks:
+                grid.add(positions - minimum)
+    if fill:
+        with measure(stats, 'fill'):
+            fill_grid(grid, [vertices], minimum, get_fill_rule(fill))
+    with measure(stats, 'output'):
+        return get_grid_output(grid, output)
+
+
+def get_grid_output(grid, output):
+    """
+    Convert a grid into the requested output
+
+    @type grid: VoxelGrid
+    @type output: str
+
+    @rtype: numpy.ndarray | VoxelGrid | BrickMap
+    """
+    if output == 'positions':
+        return grid.get_positions()
+    if output == 'sparse':
+        return BrickMap.from_grid(grid)
+    grid.flush()
+    return grid
+
+
+def collect_voxels(chunks, bounding_box, output, grid=None):
+    """
+    Gather chunks of voxel positions in the requested output,
+    positions are centered the same way as by 'voxelize'.
+
+    @type chunks: collections.Iterable[numpy.ndarray]
+    @type bounding_box: BoundaryBox
+    @type output: str
+    @param grid: grid to fill for 'grid' and 'packed' outputs, created if missing
+    @type grid: VoxelGrid | None
+
+    @rtype: numpy.ndarray | VoxelGrid | BrickMap
+    """
+    assert output in ('positions', 'grid', 'packed', 'sparse'), "Unknown output: {}".format(output)
+    if output == 'positions':
+        return merge_positions(chunks) - bounding_box.get_center()
+    if output == 'sparse':
+        brick_map = BrickMap()
+        center = bounding_box.get_center()
+        for positions in chunks:
+            brick_map.add(positions - center)
+        return brick_map
+    if grid is None:
+        grid = get_grid(bounding_box, packed=output == 'packed')
+    minimum = np.array(bounding_box.minimum)
+    for positions in chunks:
+        grid.add(positions - minimum)
+    grid.flush()
+    return grid
+
+
+def iter_scaled_chunks(vertices, scale, shift, chunk_size=2**16):
+    """
+    Scale and shift a large array of triangles a fixed number of triangles at a time
+
+    @param vertices: array of shape (N, 3, 3), for example memory mapped
+    @type vertices: numpy.ndarray
+    @type scale: float
+    @type shift: numpy.ndarray
+    @type chunk_size: int
+
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    for start in range(0, len(vertices), chunk_size):
+        yield scale_and_shift_vertices(np.asarray(vertices[start:start + chunk_size]), scale, shift)
+
+
+def iter_stl_voxels(vertices, scale, shift, chunk_size=2**16, mode='conservative', backend=None, stats=None):
+    """
+    Scale, shift and voxelize a large array of triangles a fixed number of triangles at a time
+
+    @param vertices: array of shape (N, 3, 3), for example memory mapped
+    @type vertices: numpy.ndarray
+    @type scale: float
+    @type shift: numpy.ndarray
+    @type chunk_size: int
+    @type mode: str
+    @type backend: str | None
+    @type stats: VoxelizeStats | None
+
+    @rtype: collections.Iterable[numpy.ndarray]
+    """
+    for chunk in iter_scaled_chunks(vertices, scale, shift, chunk_size):
+        for positions in iter_intersecting_voxels(chunk, mode=mode, backend=backend, stats=stats):
+            yield positions
+
+
+def voxelize_stl(
+        file_path, resolution, output='packed', chunk_size=2**16, output_path=None, fill=False, mode='conservative',
+        backend=None, stats=None):
+    """
+    Voxelize a binary stl file without loading it into memory.
+    The file is memory mapped, bounds are computed in one vectorized pass
+    and triangles are voxelized 'chunk_size' at a time.
+
+    @type file_path: str
+    @type resolution: int
+    @param output: 'positions', 'grid', 'packed' or 'sparse', see 'voxelize_array'
+    @type output: str
+    @type chunk_size: int
+    @param output_path: write a 'grid' or 'packed' output into a memory mapped file
+    @type output_path: str | None
+    @param fill: also mark voxels inside the mesh, see 'voxelize_array'
+    @type fill: bool | str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile filled in while voxelizing, see 'VoxelizeStats'.
+        Chunks are scaled right before they are voxelized, the time is part of the 'intersect' stage.
+    @type stats: VoxelizeStats | None
+
+    @rtype: numpy.ndarray | VoxelGrid | BrickMap
+    """
+    assert output_path is None or output in ('grid', 'packed'), "Only grids can be written to a file"
+    backend = get_backend(backend)
+    with measure(stats, 'read'):
+        vertices = read_binary_stl(file_path)
+    with measure(stats, 'bounds'):
+        mins, maxs = get_bounds(vertices)
+        scale, shift, triangle_count = get_scale_and_shift(vertices, resolution, bounds=(mins, maxs))
+        bounding_box = BoundaryBox()
+        bounding_box.from_vertex_array(scale_and_shift_vertices(np.array([[mins, maxs]]), scale, shift))
+    chunks = iter_stl_voxels(vertices, scale, shift, chunk_size, mode, backend, stats)
+    if not fill:
+        grid = None
+        if output in ('grid', 'packed'):
+            grid = get_grid(bounding_box, output == 'packed', output_path, scale, shift, resolution)
+        with measure(stats, 'intersect'):
+            return collect_voxels(chunks, bounding_box, output, grid)
+    grid = get_grid(bounding_box, output != 'grid', output_path, scale, shift, resolution)
+    minimum = np.array(bounding_box.minimum)
+    with measure(stats, 'intersect'):
+        for positions in chunks:
+            grid.add(positions - minimum)
+    with measure(stats, 'fill'):
+        fill_grid(grid, iter_scaled_chunks(vertices, scale, shift, chunk_size), minimum, get_fill_rule(fill))
+    with measure(stats, 'output'):
+        return get_grid_output(grid, output)
+
+
+def voxelize_file(
+        file_path, resolution, output='positions', workers=1, output_path=None, fill=False, mode='conservative',
+        backend=None, stats=None):
+    """
+    Voxelize a mesh file with the array engine.
+    Binary stl files are streamed from a memory map if running in a single process.
+
+    @type file_path: str
+    @type resolution: int
+    @param output: 'positions', 'grid', 'packed' or 'sparse', see 'voxelize_array'
+    @type output: str
+    @param workers: number of processes, 0 or None for all cores
+    @type workers: int | None
+    @param output_path: write a 'grid' or 'packed' output into a memory mapped file
+    @type output_path: str | None
+    @param fill: also mark voxels inside the mesh, see 'voxelize_array'
+    @type fill: bool | str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param stats: profile filled in while voxelizing, see 'VoxelizeStats'
+    @type stats: VoxelizeStats | None
+
+    @rtype: numpy.ndarray | VoxelGrid | BrickMap
+    """
+    if is_binary_stl(file_path) and get_worker_count(workers) == 1:
+        return voxelize_stl(
+            file_path, resolution, output=output, output_path=output_path, fill=fill, mode=mode, backend=backend,
+            stats=stats)
+    with measure(stats, 'read'):
+        vertices = read_mesh(file_path)
+    return voxelize_array(
+        vertices, resolution, output=output, workers=workers, output_path=output_path, fill=fill, mode=mode,
+        backend=backend, stats=stats)
+
+
+def voxelize_grid(
+        file_path, resolution, packed=True, output_path=None, workers=1, fill=False, mode='conservative',
+        backend=None, cache=None, stats=None):
+    """
+    Voxelize a mesh file into a dense occupancy grid
+
+    @type file_path: str
+    @type resolution: int
+    @type packed: bool
+    @param output_path: write the grid into a memory mapped file, see 'VoxelGrid.load'
+    @type output_path: str | None
+    @param workers: number of processes, 0 or None for all cores
+    @type workers: int | None
+    @param fill: also mark voxels inside the mesh, see 'voxelize_array'
+    @type fill: bool | str
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+    @param cache: return a memory mapped grid of an earlier call with the same mesh and parameters,
+        or store the grid in the cache, see 'VoxelCache'
+    @type cache: VoxelCache | None
+    @param stats: profile filled in while voxelizing, nothing is measured if the grid is cached, see 'VoxelizeStats'
+    @type stats: VoxelizeStats | None
+
+    @rtype: VoxelGrid
+    """
+    if cache is not None:
+        assert output_path is None, "Cached grids are stored in the cache directory"
+        backend = get_backend(backend)
+        key = cache.get_key(
+            file_path, resolution=resolution, packed=packed, fill=get_fill_rule(fill), mode=mode, backend=backend)
+        return cache.get_or_create(key, functools.partial(
+            voxelize_grid, file_path, resolution, packed, workers=workers, fill=fill, mode=mode, backend=backend,
+            stats=stats))
+    output = 'packed' if packed else 'grid'
+    return voxelize_file(
+        file_path, resolution, output=output, workers=workers, output_path=output_path, fill=fill, mode=mode,
+        backend=backend, stats=stats)
+
+
+def read_mesh(file_path):
+    """
+    Vertexes of a mesh file, binary stl files are memory mapped
+
+    @type file_path: str
+
+    @return: array of shape (N, 3, 3)
+    @rtype: numpy.ndarray
+    """
+    if is_binary_stl(file_path):
+        return read_binary_stl(file_path)
+    return read_vertices(file_path)
+
+
+def get_lod_level_exact(vertices, scale, shift, downsampled, chunk_size=2**16, backend=None):
+    """
+    Coarse level of 'voxelize_lod' as the triangle cube test at that scale gives it.
+    A fine voxel touched by a triangle lies inside the coarse voxel, so every downsampled voxel is touched as well.
+    The test may only add voxels a triangle touches within the tolerance of the test,
+    so only candidates that are not downsampled voxels are tested.
+
+    @param vertices: array of shape (N, 3, 3), for example memory mapped
+    @type vertices: numpy.ndarray
+    @param scale: scale of the coarse level
+    @type scale: float
+    @type shift: numpy.ndarray
+    @param downsampled: downsampled voxels of the level
+    @type downsampled: BrickMap
+    @type chunk_size: int
+    @type backend: str | None
+
+    @rtype: BrickMap
+    """
+    touched = BrickMap()
+    for chunk in iter_scaled_chunks(vertices, scale, shift, chunk_size):
+        for triangle_index, positions in iter_candidate_voxels(chunk):
+            is_new = ~downsampled.contains(positions)
+            triangle_index, positions = triangle_index[is_new], positions[is_new]
+            touched.add(positions[t_c_intersection_cells(chunk, triangle_index, positions, backend)])
+    return downsampled | touched
+
+
+def voxelize_lod(
+        file_path, resolutions=(64, 128, 256, 512, 1024), exact=False, chunk_size=2**16, mode='conservative',
+        backend=None):
+    """
+    Voxelize a mesh file at several levels of detail in one pass.
+    The mesh is read and voxelized once at the finest resolution, each coarser level is derived from
+    the level above by 'BrickMap.downsample', so a voxel of a level covers 2x2x2 voxels of the level above.
+    Resolutions must be the finest resolution divided by powers of two.
+    Positions of each level are centered the same way as by 'voxelize'.
+
+    @type file_path: str
+    @type resolutions: list[int] | tuple[int]
+    @param exact: add the voxels the triangle cube test at a coarse scale finds beyond the downsampled voxels,
+        see 'get_lod_level_exact'
+    @type exact: bool
+    @type chunk_size: int
+    @param mode: 'conservative', '26-separating' or '6-separating', see 'voxelize'
+    @type mode: str
+    @param backend: implementation of the triangle cube test, 'c', 'numba' or 'python', see 'get_backend'
+    @type backend: str | None
+
+    @return: voxels of each resolution
+    @rtype: dict[int, BrickMap]
+    """
+    assert len(resolutions) > 0, "No resolution given"
+    assert not exact or mode == 'conservative', "The exact mode only supports the conservative mode"
+    finest = max(resolutions)
+    for resolution in resolutions:
+        factor = finest // resolution
+        assert finest % resolution == 0 and factor & (factor - 1) == 0, \
+            "Resolution {} is not {} divided by a power of two".format(resolution, finest)
+    backend = get_backend(backend)
+    vertices = read_mesh(file_path)
+    mins, maxs = get_bounds(vertices)
+    scale, shift, triangle_count = get_scale_and_shift(vertices, finest, bounds=(mins, maxs))
+    bounds = scale_and_shift_vertices(np.array([[mins, maxs]]), scale, shift)
+    level = BrickMap()
+    for positions in iter_stl_voxels(vertices, scale, shift, chunk_size, mode, backend):
+        level.add(positions)
+
+    levels = {}
+    factor = 1
+    while True:
+        resolution = finest // factor
+        if resolution in resolutions:
+            result = level
+            if exact and factor > 1:
+                result = get_lod_level_exact(vertices, scale / factor, shift, level, chunk_size, backend)
+            bounding_box = BoundaryBox()
+            bounding_box.from_vertex_array(bounds / factor)
+            levels[resolution] = BrickMap()
+            center = bounding_box.get_center()
+            for positions in result.iter_positions():
+                levels[resolution].add(positions - center)
+        if resolution <= min(resolutions):
+            return levels
+        level = level.downsample()
+        factor *= 2
 
 
 if __name__ == '__main__':
@@ -200,6 +1316,67 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='stl/obj file to voxels converter')
     parser.add_argument('input')
     parser.add_argument('resolution', type=int)
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of processes, 0 for all cores')
+    parser.add_argument(
+        '-f', '--format', default='txt', choices=['txt', 'npy', 'grid', 'rle', 'binvox'],
+        help="txt: tab separated positions, npy: int32 positions, grid: bit packed grid, "
+             "rle: run-length encoded z columns, binvox: BINVOX file")
+    parser.add_argument('-o', '--output', default=None, help='output file, default is stdout')
+    parser.add_argument(
+        '--fill', nargs='?', const='parity', default=False, choices=['parity', 'winding'],
+        help='also output voxels inside the mesh, winding votes over rays along all axes, for meshes with small holes')
+    parser.add_argument(
+        '-m', '--mode', default='conservative', choices=list(voxelization_modes),
+        help='conservative: all voxels touched by the mesh, 26-separating: the same voxels with a faster test, '
+             '6-separating: a thinner surface')
+    parser.add_argument(
+        '-b', '--backend', default=None, choices=list(backends),
+        help="triangle cube test, default is 'c' if compiled, else 'python', see --show-backend. "
+             "numba needs the numba package")
+    parser.add_argument(
+        '--show-backend', action='version', version=get_backend(),
+        help="show the default triangle cube test and exit")
+    parser.add_argument(
+        '--cache', default=None, metavar='DIRECTORY',
+        help='reuse the voxels of earlier runs with the same mesh and options, stored in this directory')
+    parser.add_argument(
+        '--cache-size', type=int, default=1024, metavar='MB', help='size of the cache directory, default is 1024 MB')
+    parser.add_argument(
+        '--profile', action='store_true', help='print the time of each stage and the number of tests to stderr')
     args = parser.parse_args()
-    for pos_x, pos_y, pos_z in voxelize(args.input, args.resolution):
-        sys.stdout.write("{}\t{}\t{}\n".format(pos_x, pos_y, pos_z))
+    stats = VoxelizeStats() if args.profile else None
+    output_handler = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        # every format comes from the same engine, the same input gives the same voxels in any format
+        if args.cache:
+            voxel_grid = voxelize_grid(
+                args.input, args.resolution, workers=args.workers, fill=args.fill, mode=args.mode,
+                backend=args.backend, cache=VoxelCache(args.cache, args.cache_size * 2**20), stats=stats)
+            with measure(stats, 'output'):
+                if args.format == 'txt':
+                    write_text(voxel_grid.get_positions(), output_handler)
+                elif args.format == 'npy':
+                    write_npy(voxel_grid.get_positions(), output_handler)
+                else:
+                    write_voxels(output_handler, args.format, grid=voxel_grid)
+        elif args.format in ('txt', 'npy'):
+            positions = voxelize_file(
+                args.input, args.resolution, workers=args.workers, fill=args.fill, mode=args.mode,
+                backend=args.backend, stats=stats)
+            with measure(stats, 'output'):
+                if args.format == 'txt':
+                    write_text(positions, output_handler)
+                else:
+                    write_npy(positions, output_handler)
+        else:
+            voxel_grid = voxelize_grid(
+                args.input, args.resolution, workers=args.workers, fill=args.fill, mode=args.mode,
+                backend=args.backend, stats=stats)
+            with measure(stats, 'output'):
+                write_voxels(output_handler, args.format, grid=voxel_grid)
+        output_handler.flush()
+        if stats is not None:
+            sys.stderr.write(stats.format() + "\n")
+    finally:
+        if args.output:
+            output_handler.close()